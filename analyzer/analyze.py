@@ -3,7 +3,13 @@ import re
 from analyzer.utils.keyword_utils import (
     classify_enablement,
     get_enablement_score,
+    StreamingKeywordCounter,
+    find_keyword_offsets,
+    lower_keeping_offsets,
+    top_snippets,
 )
+from analyzer.utils.helpers import iter_text_chunks, rewind
+from analyzer.utils.token_index import build_token_index, save_token_index
 
 from analyzer.utils.config_utils import load_config
 
@@ -28,56 +34,224 @@ def safe_count_keywords(text, keywords):
         count += sum(1 for _ in re.finditer(r'\b{}\b'.format(re.escape(kw.lower())), text_lower))
     return count
 
-def analyze_text(identifier, text):
-    try:
-        config = load_config()
+def score_buckets(text, config):
+    """Weighted keyword score per bucket (count * weight)."""
+    bucket_scores = {}
+    for bucket, details in config.items():
+        if bucket.startswith("_"):
+            continue
+        keywords = details.get("keywords", [])
+        weight = details.get("weight", 1.0)
 
-        formula = config.get("_formula", "")
-        custom_vars = config.get("_custom_variables", {})
-        bucket_scores = {}
-        context = {}
+        count = safe_count_keywords(text, keywords)
+        bucket_scores[bucket] = count * weight
+    return bucket_scores
 
-        # Step 1: Calculate score for each keyword bucket
-        for bucket, details in config.items():
-            if bucket.startswith("_"):
-                continue
-            keywords = details.get("keywords", [])
-            weight = details.get("weight", 1.0)
+def score_buckets_with_evidence(text, config, snippets=3, snippet_width=160):
+    """
+    Like score_buckets, but counts by recording hit offsets in the same pass.
+    Returns (bucket_scores, evidence) where evidence[bucket] holds per-keyword hit
+    counts, the offsets as arrays, and the top snippets built from those offsets.
+    """
+    bucket_scores = {}
+    evidence = {}
+    if not isinstance(text, str):
+        text = ""
+    # Offsets slice the original text for snippets, so lowercasing must not shift them
+    text_lower = lower_keeping_offsets(text)
+    for bucket, details in config.items():
+        if bucket.startswith("_"):
+            continue
+        keywords = details.get("keywords", [])
+        weight = details.get("weight", 1.0)
+
+        offsets = find_keyword_offsets(text_lower, keywords)
+        count = sum(len(hits) for hits in offsets.values())
+        bucket_scores[bucket] = count * weight
+        evidence[bucket] = {
+            "hits": {kw: len(hits) for kw, hits in offsets.items()},
+            "offsets": offsets,
+            "snippets": top_snippets(text, offsets, k=snippets, width=snippet_width),
+        }
+    return bucket_scores, evidence
 
-            count = safe_count_keywords(text, keywords)
-            score = count * weight
-            bucket_scores[bucket] = score
-            context[bucket] = score
+def build_result(identifier, config, bucket_scores):
+    """Applies the config formula to bucket scores and returns the analysis result dict."""
+    formula = config.get("_formula", "")
+    custom_vars = config.get("_custom_variables", {})
+    context = dict(bucket_scores)
 
-        # Step 2: Add custom variables to context
-        context.update(custom_vars)
+    # Add custom variables to context
+    context.update(custom_vars)
 
-        # Step 3: Safely evaluate formula
+    # Safely evaluate formula
+    final_score = None
+    try:
+        allowed_names = set(context.keys())
+        # Convert formula like "{AI} + {Enablement}" to safe Python eval string
+        formatted_formula = formula.format(**{k: f"context['{k}']" for k in allowed_names})
+        code = compile(formatted_formula, "<string>", "eval")
+        final_score = eval(code, {"__builtins__": {}}, {"context": context})
+    except Exception as e:
+        logger.warning(f"[FORMULA ERROR] Could not evaluate formula: {e}")
         final_score = None
-        try:
-            allowed_names = set(context.keys())
-            # Convert formula like "{AI} + {Enablement}" to safe Python eval string
-            formatted_formula = formula.format(**{k: f"context['{k}']" for k in allowed_names})
-            code = compile(formatted_formula, "<string>", "eval")
-            final_score = eval(code, {"__builtins__": {}}, {"context": context})
-        except Exception as e:
-            logger.warning(f"[FORMULA ERROR] Could not evaluate formula: {e}")
-            final_score = None
-
-        return {
-            "identifier": identifier,
-            "score": final_score,
-            "buckets": bucket_scores,
-            "custom_variables": custom_vars,
-            "formula_used": formula
-        }
+
+    return {
+        "identifier": identifier,
+        "score": final_score,
+        "buckets": bucket_scores,
+        "custom_variables": custom_vars,
+        "formula_used": formula
+    }
+
+def empty_result(identifier):
+    return {
+        "identifier": identifier,
+        "score": None,
+        "buckets": {},
+        "custom_variables": {},
+        "formula_used": ""
+    }
+
+def score_buckets_from_index(index, config, text=None):
+    """
+    Bucket scores from a TokenIndex instead of the raw text.
+    Keywords the index cannot answer are counted on text when given, otherwise skipped with a warning.
+    """
+    bucket_scores = {}
+    for bucket, details in config.items():
+        if bucket.startswith("_"):
+            continue
+        keywords = details.get("keywords", [])
+        weight = details.get("weight", 1.0)
+
+        count = 0
+        for kw in keywords:
+            kw_count = index.count(kw)
+            if kw_count is None:
+                if text is not None:
+                    kw_count = safe_count_keywords(text, [kw])
+                else:
+                    logger.warning(f"[INDEX] '{kw}' cannot be answered from the index of {index.identifier}; counted as 0")
+                    kw_count = 0
+            count += kw_count
+        bucket_scores[bucket] = count * weight
+    return bucket_scores
+
+def analyze_text(identifier, text, index_path=None, evidence=False, snippets=3, snippet_width=160):
+    """
+    Scores text against the keyword config.
+    If index_path is given, a TokenIndex of the text is also saved there so the
+    document can later be re-scored with rescore_index without re-reading it.
+    With evidence=True the result also carries an "evidence" entry per bucket
+    (keyword hit counts, hit offsets and top snippets), gathered in the counting pass.
+    """
+    try:
+        config = load_config()
+        if evidence:
+            bucket_scores, bucket_evidence = score_buckets_with_evidence(
+                text, config, snippets=snippets, snippet_width=snippet_width
+            )
+        else:
+            bucket_scores = score_buckets(text, config)
+        if index_path:
+            try:
+                save_token_index(build_token_index(text, identifier=identifier), index_path)
+            except Exception as e:
+                logger.warning(f"[INDEX] Could not save index for {identifier}: {e}")
+        result = build_result(identifier, config, bucket_scores)
+        if evidence:
+            result["evidence"] = bucket_evidence
+        return result
 
     except Exception as e:
         logger.error(f"[FAIL] Analysis failed for {identifier}: {e}")
-        return {
-            "identifier": identifier,
-            "score": None,
-            "buckets": {},
-            "custom_variables": {},
-            "formula_used": ""
+        return empty_result(identifier)
+
+def analyze_stream(identifier, source, chunk_size=1 << 20, encodings=("utf-8", "latin-1")):
+    """
+    Streaming counterpart of analyze_text for documents too large to hold in memory.
+    - source: file path, text/binary file object, or iterable of str/bytes chunks.
+    - Reads chunk_size pieces and keeps only a small tail between them.
+    - Tries each encoding in turn for byte input (re-reading paths and seekable files).
+    Returns the same result dict as analyze_text on the full text.
+    """
+    try:
+        config = load_config()
+        buckets = {b: d for b, d in config.items() if not b.startswith("_")}
+
+        for attempt, encoding in enumerate(encodings):
+            counters = {b: StreamingKeywordCounter(d.get("keywords", [])) for b, d in buckets.items()}
+            try:
+                for chunk in iter_text_chunks(source, chunk_size, encoding):
+                    for counter in counters.values():
+                        counter.feed(chunk)
+                break
+            except UnicodeDecodeError:
+                if attempt + 1 >= len(encodings) or not rewind(source):
+                    raise
+                logger.info(f"[DECODE] {identifier}: not valid {encoding}, retrying with {encodings[attempt + 1]}")
+
+        bucket_scores = {
+            b: counters[b].close() * d.get("weight", 1.0) for b, d in buckets.items()
         }
+        return build_result(identifier, config, bucket_scores)
+
+    except Exception as e:
+        logger.error(f"[FAIL] Streaming analysis failed for {identifier}: {e}")
+        return empty_result(identifier)
+
+def unresolved_keywords(index, config):
+    """Keywords of config that index cannot count (e.g. "c++", phrases longer than its n-grams)."""
+    return sorted({
+        kw
+        for bucket, details in config.items() if not bucket.startswith("_")
+        for kw in details.get("keywords", []) if not index.can_resolve(kw)
+    })
+
+def rescore_index(index, config=None):
+    """
+    Re-scores a stored document from its TokenIndex, e.g. after a config edit.
+    Keywords the index cannot answer count as 0; they are listed in the result's
+    "unresolved_keywords" so callers can flag the score as incomplete.
+    """
+    identifier = index.identifier
+    try:
+        config = config if config is not None else load_config()
+        result = build_result(identifier, config, score_buckets_from_index(index, config))
+        result["unresolved_keywords"] = unresolved_keywords(index, config)
+        return result
+    except Exception as e:
+        logger.error(f"[FAIL] Re-scoring failed for {identifier}: {e}")
+        return empty_result(identifier)
+
+class IncrementalAnalysis:
+    """
+    Scores pages one at a time and keeps running bucket totals.
+    Keyword counts are additive across pages, so result() matches analyze_text
+    over the pages joined with blank lines.
+    """
+
+    def __init__(self, identifier, config=None):
+        self.identifier = identifier
+        self.config = config if config is not None else load_config()
+        self.totals = {
+            bucket: 0 for bucket in self.config if not bucket.startswith("_")
+        }
+        self.pages = 0
+
+    def add(self, page_id, text):
+        """Scores one page, folds it into the running totals and returns the page's own result."""
+        try:
+            bucket_scores = score_buckets(text, self.config)
+        except Exception as e:
+            logger.error(f"[FAIL] Analysis failed for {page_id}: {e}")
+            return empty_result(page_id)
+        for bucket, score in bucket_scores.items():
+            self.totals[bucket] += score
+        self.pages += 1
+        return build_result(page_id, self.config, bucket_scores)
+
+    def result(self):
+        """Result dict for everything added so far."""
+        return build_result(self.identifier, self.config, dict(self.totals))
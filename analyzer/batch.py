@@ -0,0 +1,144 @@
+import os
+import logging
+import zipfile
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+
+from analyzer.analyze import analyze_stream, analyze_text, rescore_index, empty_result
+from analyzer.utils.token_index import index_path_for, iter_index_paths, load_token_index
+
+logger = logging.getLogger(__name__)
+
+TEXT_EXTENSIONS = (".txt",)
+MAX_UPLOAD_BYTES = 1 << 30  # uncompressed size allowed per upload (same as the server's maxUploadSize)
+
+def expand_upload(path, name=None, max_bytes=MAX_UPLOAD_BYTES):
+    """
+    Yields (name, source) documents from one upload saved at path.
+    Zip archives are expanded to their .txt members; other files pass through unchanged.
+    A source is (path, zip member or None) and is read with open_document, so nothing is
+    loaded here and worker processes open their own documents.
+    Raises ValueError when an archive's members add up to more than max_bytes uncompressed.
+    """
+    name = name or os.path.basename(path)
+    if name.lower().endswith(".zip"):
+        with zipfile.ZipFile(path) as archive:
+            members = []
+            for member in archive.infolist():
+                base = os.path.basename(member.filename)
+                if member.is_dir() or base.startswith(".") or not base.lower().endswith(TEXT_EXTENSIONS):
+                    continue
+                members.append(member)
+        # zipfile never inflates a member past its declared size, so the header sizes are binding
+        total = sum(member.file_size for member in members)
+        if max_bytes and total > max_bytes:
+            raise ValueError(f"{name} expands to {total / (1 << 20):.0f} MB, over the {max_bytes / (1 << 20):.0f} MB limit")
+        for member in members:
+            yield member.filename, (path, member.filename)
+    else:
+        yield name, (path, None)
+
+@contextmanager
+def open_document(source):
+    """Binary file object for an expand_upload source; zip members are inflated as they are read."""
+    path, member = source
+    if member is None:
+        with open(path, "rb") as f:
+            yield f
+    else:
+        with zipfile.ZipFile(path) as archive, archive.open(member) as f:
+            yield f
+
+def decode_text(data):
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError:
+        return data.decode("latin-1")
+
+def read_document(source):
+    """Whole decoded text of an expand_upload source."""
+    with open_document(source) as f:
+        return decode_text(f.read())
+
+def _analyze_document(args):
+    identifier, source, index_dir, evidence = args
+    try:
+        if index_dir or evidence:
+            # Indexing and evidence need the whole text; only this worker's current document is held
+            index_path = index_path_for(index_dir, identifier) if index_dir else None
+            return analyze_text(identifier, read_document(source), index_path=index_path, evidence=evidence)
+        with open_document(source) as f:
+            return analyze_stream(identifier, f)
+    except Exception as e:
+        logger.error(f"[FAIL] Could not read {identifier}: {e}")
+        return empty_result(identifier)
+
+def _rescore_path(args):
+    path, config = args
+    return rescore_index(load_token_index(path), config)
+
+def analyze_documents(documents, max_workers=None, index_dir=None, evidence=False):
+    """
+    Scores many (identifier, source) documents in parallel with a process pool.
+    Sources come from expand_upload; each worker opens and streams its own documents,
+    so only file names cross the process boundary. Documents are decoded with the same
+    utf-8/latin-1 fallback as analyze_stream.
+    With index_dir, a TokenIndex per document is saved there for later re-scoring.
+    With evidence=True, results include per-bucket hit offsets and snippets.
+    Returns results in input order.
+    """
+    documents = [(identifier, source, index_dir, evidence) for identifier, source in documents]
+    if not documents:
+        return []
+
+    if max_workers is None:
+        max_workers = multiprocessing.cpu_count()
+    max_workers = max(1, min(max_workers, len(documents)))
+
+    if max_workers == 1:
+        return [_analyze_document(doc) for doc in documents]
+
+    logger.info(f"[BATCH] Analyzing {len(documents)} documents with {max_workers} processes")
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            # Small chunks amortize IPC without starving workers on uneven file sizes
+            chunksize = max(1, len(documents) // (max_workers * 4))
+            return list(executor.map(_analyze_document, documents, chunksize=chunksize))
+    except Exception as e:
+        logger.error(f"[BATCH] Process pool failed, falling back to sequential analysis: {e}")
+        results = []
+        for doc in documents:
+            try:
+                results.append(_analyze_document(doc))
+            except Exception:
+                results.append(empty_result(doc[0]))
+        return results
+
+def rescore_indexes(index_dir, config=None, max_workers=None):
+    """
+    Re-scores every stored TokenIndex in index_dir under config (default: the saved config).
+    Only lookups against the indexes; no document text is read.
+    """
+    tasks = [(path, config) for path in iter_index_paths(index_dir)]
+    if not tasks:
+        return []
+    if max_workers is None:
+        # Lookups are cheap; only fan out for large archives
+        max_workers = 1 if len(tasks) < 200 else multiprocessing.cpu_count()
+    if max_workers <= 1:
+        return [_rescore_path(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(_rescore_path, tasks, chunksize=max(1, len(tasks) // (max_workers * 4))))
+
+def results_to_rows(results):
+    """Flattens result dicts into one row per document with a column per bucket."""
+    rows = []
+    for result in results:
+        row = {"identifier": result["identifier"], "score": result["score"]}
+        row.update(result.get("buckets", {}))
+        row["formula_used"] = result.get("formula_used", "")
+        if result.get("unresolved_keywords"):
+            row["unresolved_keywords"] = ", ".join(result["unresolved_keywords"])
+        rows.append(row)
+    return rows
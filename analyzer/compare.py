@@ -0,0 +1,180 @@
+import logging
+import numpy as np
+
+from analyzer.utils.config_utils import load_config, get_buckets
+from analyzer.utils.keyword_utils import find_keyword_offsets
+from analyzer.utils.token_index import TokenIndex
+
+logger = logging.getLogger(__name__)
+
+def config_keywords(config):
+    """All bucket keywords in config order, de-duplicated case-insensitively."""
+    seen = set()
+    keywords = []
+    for details in get_buckets(config).values():
+        for kw in details.get("keywords", []):
+            if kw.lower() not in seen:
+                seen.add(kw.lower())
+                keywords.append(kw)
+    return keywords
+
+def _keyword_counts(document, keywords):
+    """Per-keyword counts from a text, a TokenIndex or an analysis result with evidence."""
+    if isinstance(document, str):
+        offsets = find_keyword_offsets(document.lower(), keywords)
+        return [len(offsets[kw]) for kw in keywords]
+    if isinstance(document, TokenIndex):
+        return [document.count(kw) or 0 for kw in keywords]
+    if isinstance(document, dict) and "evidence" in document:
+        hits = {}
+        for details in document["evidence"].values():
+            for kw, n in details.get("hits", {}).items():
+                hits[kw.lower()] = hits.get(kw.lower(), 0) + n
+        return [hits.get(kw.lower(), 0) for kw in keywords]
+    raise TypeError(f"Unsupported document type: {type(document).__name__}")
+
+def keyword_profiles(documents, config=None):
+    """
+    Builds the raw keyword count matrix for a set of competitors.
+    documents: {name: text | TokenIndex | analysis result with evidence}
+    Returns (names, keywords, counts) with counts shaped (n_competitors, n_keywords).
+    """
+    config = config if config is not None else load_config()
+    keywords = config_keywords(config)
+    names = list(documents)
+    counts = np.zeros((len(names), len(keywords)), dtype=np.float32)
+    for row, name in enumerate(names):
+        counts[row] = _keyword_counts(documents[name], keywords)
+    return names, keywords, counts
+
+def tfidf(counts):
+    """
+    Sublinear TF-IDF weighting with smoothed IDF, rows L2-normalized.
+    Keywords every competitor uses get low weight; distinctive ones dominate.
+    """
+    counts = np.asarray(counts, dtype=np.float32)
+    n_docs = counts.shape[0]
+    df = np.count_nonzero(counts, axis=0).astype(np.float32)
+    idf = np.log((1.0 + n_docs) / (1.0 + df)) + 1.0
+    weights = np.log1p(counts) * idf
+    norms = np.linalg.norm(weights, axis=1, keepdims=True)
+    np.divide(weights, norms, out=weights, where=norms > 0)
+    return weights
+
+def cosine_similarity(vectors, block_size=256):
+    """
+    Pairwise cosine similarity of L2-normalized rows, computed in row blocks
+    so the temporaries stay at block_size x n instead of n x n per step.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    n = vectors.shape[0]
+    similarity = np.empty((n, n), dtype=np.float32)
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        np.matmul(vectors[start:stop], vectors.T, out=similarity[start:stop])
+    np.clip(similarity, -1.0, 1.0, out=similarity)
+    return similarity
+
+def nearest_neighbors(vectors, k=3, block_size=256):
+    """
+    Top-k most similar other competitors per row, without materializing the full matrix.
+    Returns (indices, similarities), both shaped (n, k); -1 pads rows with fewer than k others.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    n = vectors.shape[0]
+    k = max(0, min(k, n - 1))
+    indices = np.full((n, k), -1, dtype=np.int64)
+    scores = np.zeros((n, k), dtype=np.float32)
+    if k == 0:
+        return indices, scores
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        block = vectors[start:stop] @ vectors.T
+        block[np.arange(stop - start), np.arange(start, stop)] = -np.inf  # exclude self
+        top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(block, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        indices[start:stop] = np.take_along_axis(top, order, axis=1)
+        scores[start:stop] = np.take_along_axis(top_scores, order, axis=1)
+    return indices, scores
+
+def cluster(vectors, n_clusters=None, max_iter=50, seed=0, block_size=256):
+    """
+    Spherical k-means on L2-normalized rows with k-means++ seeding.
+    Returns one cluster label per row. Deterministic for a given seed.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    n = vectors.shape[0]
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+    if n_clusters is None:
+        n_clusters = max(1, int(round(np.sqrt(n / 2.0))))
+    n_clusters = max(1, min(n_clusters, n))
+    rng = np.random.default_rng(seed)
+
+    # k-means++ seeding on cosine distance
+    centers = np.empty((n_clusters, vectors.shape[1]), dtype=np.float32)
+    centers[0] = vectors[rng.integers(n)]
+    closest = 1.0 - vectors @ centers[0]
+    for c in range(1, n_clusters):
+        weights = np.clip(closest, 0, None).astype(np.float64) ** 2
+        total = weights.sum()
+        choice = rng.choice(n, p=weights / total) if total > 0 else rng.integers(n)
+        centers[c] = vectors[choice]
+        np.minimum(closest, 1.0 - vectors @ centers[c], out=closest)
+
+    labels = np.full(n, -1, dtype=np.int64)
+    for _ in range(max_iter):
+        new_labels = np.empty(n, dtype=np.int64)
+        for start in range(0, n, block_size):
+            stop = min(start + block_size, n)
+            new_labels[start:stop] = np.argmax(vectors[start:stop] @ centers.T, axis=1)
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        for c in range(n_clusters):
+            members = vectors[labels == c]
+            if len(members) == 0:
+                continue  # keep the previous center for empty clusters
+            center = members.sum(axis=0)
+            norm = np.linalg.norm(center)
+            if norm > 0:
+                centers[c] = center / norm
+    return labels
+
+def compare_competitors(documents, config=None, n_neighbors=3, n_clusters=None, block_size=256):
+    """
+    DataFrame API over the comparison pipeline.
+    Returns a dict of DataFrames:
+    - "profiles": TF-IDF keyword vectors (competitor x keyword)
+    - "similarity": pairwise cosine similarity (competitor x competitor)
+    - "neighbors": nearest competitors with their similarity
+    - "clusters": cluster assignment per competitor
+    """
+    import pandas as pd
+
+    names, keywords, counts = keyword_profiles(documents, config)
+    vectors = tfidf(counts)
+    logger.info(f"[COMPARE] {len(names)} competitors x {len(keywords)} keywords")
+
+    similarity = cosine_similarity(vectors, block_size=block_size)
+    indices, scores = nearest_neighbors(vectors, k=n_neighbors, block_size=block_size)
+    labels = cluster(vectors, n_clusters=n_clusters, block_size=block_size)
+
+    neighbor_rows = []
+    for row, name in enumerate(names):
+        for rank, (idx, score) in enumerate(zip(indices[row], scores[row]), start=1):
+            if idx >= 0:
+                neighbor_rows.append({
+                    "competitor": name,
+                    "rank": rank,
+                    "neighbor": names[idx],
+                    "similarity": float(score),
+                })
+
+    return {
+        "profiles": pd.DataFrame(vectors, index=names, columns=keywords),
+        "similarity": pd.DataFrame(similarity, index=names, columns=names),
+        "neighbors": pd.DataFrame(neighbor_rows, columns=["competitor", "rank", "neighbor", "similarity"]),
+        "clusters": pd.DataFrame({"competitor": names, "cluster": labels}),
+    }
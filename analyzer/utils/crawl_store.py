@@ -0,0 +1,168 @@
+import os
+import time
+import uuid
+import zlib
+import sqlite3
+import hashlib
+import logging
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+STORE_FILENAME = "crawl_store.sqlite"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id      TEXT PRIMARY KEY,
+    base_url    TEXT,
+    domain      TEXT,
+    started_at  REAL
+);
+CREATE TABLE IF NOT EXISTS pages (
+    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id        TEXT NOT NULL,
+    url           TEXT NOT NULL,
+    domain        TEXT NOT NULL,
+    crawled_at    REAL NOT NULL,
+    content_hash  TEXT NOT NULL,
+    length        INTEGER NOT NULL,
+    codec         TEXT NOT NULL,
+    text          BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_pages_domain_run ON pages (domain, run_id);
+CREATE INDEX IF NOT EXISTS idx_pages_run ON pages (run_id);
+CREATE INDEX IF NOT EXISTS idx_pages_hash ON pages (content_hash);
+"""
+
+def _domain_of(url):
+    return urlparse(url).netloc.lower()
+
+def _compress(text):
+    return zlib.compress(text.encode("utf-8"), 6)
+
+def _decompress(blob, codec):
+    if codec != "zlib":
+        raise ValueError(f"Unsupported codec: {codec}")
+    return zlib.decompress(blob).decode("utf-8")
+
+class CrawlStore:
+    """
+    Append-only SQLite store for crawl results.
+    - One row per extracted page: URL, domain, crawl time, content hash and zlib-compressed text.
+    - Indexed by domain and crawl run, so a single competitor or run can be streamed back.
+    - Replaces the one-.txt-file-per-URL layout, whose truncated filenames could collide.
+    """
+
+    def __init__(self, path, mmap_size=256 * 1024 * 1024):
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        # Let SQLite memory-map the file so large sequential reads avoid extra copies
+        self.conn.execute(f"PRAGMA mmap_size={int(mmap_size)}")
+        self.conn.executescript(_SCHEMA)
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        try:
+            self.conn.close()
+        except Exception:
+            pass
+
+    # ---------- Writing ----------
+    def start_run(self, base_url, run_id=None):
+        """Registers a new crawl run and returns its ID."""
+        run_id = run_id or time.strftime("%Y%m%dT%H%M%S") + "-" + uuid.uuid4().hex[:8]
+        self.conn.execute(
+            "INSERT OR IGNORE INTO runs (run_id, base_url, domain, started_at) VALUES (?, ?, ?, ?)",
+            (run_id, base_url, _domain_of(base_url), time.time()),
+        )
+        self.conn.commit()
+        return run_id
+
+    def add_page(self, run_id, url, text, crawled_at=None, commit=True):
+        content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        self.conn.execute(
+            "INSERT INTO pages (run_id, url, domain, crawled_at, content_hash, length, codec, text) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (run_id, url, _domain_of(url), crawled_at or time.time(), content_hash,
+             len(text), "zlib", sqlite3.Binary(_compress(text))),
+        )
+        if commit:
+            self.conn.commit()
+        return content_hash
+
+    def add_pages(self, run_id, url_text_map):
+        """Appends every (url, text) pair of a crawl result in one transaction."""
+        now = time.time()
+        for url, text in url_text_map.items():
+            self.add_page(run_id, url, text, crawled_at=now, commit=False)
+        self.conn.commit()
+        logger.info(f"[STORE] Saved {len(url_text_map)} pages to run {run_id} in {self.path}")
+
+    # ---------- Reading ----------
+    def runs(self, domain=None):
+        """Lists crawl runs, newest first."""
+        query = "SELECT run_id, base_url, domain, started_at FROM runs"
+        params = ()
+        if domain:
+            query += " WHERE domain = ?"
+            params = (domain.lower(),)
+        query += " ORDER BY started_at DESC"
+        return [
+            {"run_id": r[0], "base_url": r[1], "domain": r[2], "started_at": r[3]}
+            for r in self.conn.execute(query, params)
+        ]
+
+    def latest_run(self, domain=None):
+        runs = self.runs(domain)
+        return runs[0]["run_id"] if runs else None
+
+    def iter_pages(self, domain=None, run_id=None, with_text=True):
+        """
+        Streams pages one row at a time, optionally filtered by domain and/or run.
+        Yields dicts; the text is only decompressed when with_text is True.
+        """
+        columns = "url, domain, run_id, crawled_at, content_hash, length, codec"
+        if with_text:
+            columns += ", text"
+        query = f"SELECT {columns} FROM pages"
+        clauses, params = [], []
+        if domain:
+            clauses.append("domain = ?")
+            params.append(domain.lower())
+        if run_id:
+            clauses.append("run_id = ?")
+            params.append(run_id)
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY id"
+
+        for row in self.conn.execute(query, params):
+            page = {
+                "url": row[0],
+                "domain": row[1],
+                "run_id": row[2],
+                "crawled_at": row[3],
+                "content_hash": row[4],
+                "length": row[5],
+            }
+            if with_text:
+                page["text"] = _decompress(row[7], row[6])
+            yield page
+
+    def iter_texts(self, domain=None, run_id=None):
+        """Streams (url, text) pairs, the shape crawl_website returns."""
+        for page in self.iter_pages(domain=domain, run_id=run_id):
+            yield page["url"], page["text"]
+
+    def load_run(self, run_id):
+        return dict(self.iter_texts(run_id=run_id))
@@ -1,4 +1,5 @@
 import os
+import codecs
 import re
 import logging
 
@@ -27,3 +28,44 @@ def save_text_to_file(text: str, filepath: str) -> None:
         logger.info(f"[SAVED] Text written to {filepath}")
     except Exception as e:
         logger.error(f"[SAVE_FAIL] Could not write to {filepath}: {e}")
+
+def iter_text_chunks(source, chunk_size=1 << 20, encoding="utf-8"):
+    """
+    Yields text chunks from a file path, a text or binary file object, or an iterable of str/bytes chunks.
+    Bytes are decoded incrementally, so multi-byte characters split across chunks are handled.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+
+    def _decode(chunk, final=False):
+        return decoder.decode(chunk, final) if isinstance(chunk, (bytes, bytearray)) else chunk
+
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            yield from iter_text_chunks(f, chunk_size, encoding)
+        return
+
+    if hasattr(source, "read"):
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                break
+            yield _decode(chunk)
+    else:
+        for chunk in source:
+            yield _decode(chunk)
+
+    tail = decoder.decode(b"", True)
+    if tail:
+        yield tail
+
+def rewind(source):
+    """
+    Restarts a chunk source for another decoding attempt.
+    Returns False for sources that cannot be re-read (plain iterators).
+    """
+    if isinstance(source, (str, os.PathLike)):
+        return True
+    if hasattr(source, "seek") and getattr(source, "seekable", lambda: True)():
+        source.seek(0)
+        return True
+    return False
@@ -1,4 +1,7 @@
 import re
+import heapq
+from bisect import bisect_left
+from array import array
 from collections import Counter
 # Optional: Uncomment for stemming support
 # from nltk.stem import PorterStemmer
@@ -25,6 +28,79 @@ def count_keywords(text, keywords, use_stemming=False):
     token_counts = Counter(tokens)
     return sum(token_counts[kw] for kw in keywords_set)
 
+def lower_keeping_offsets(text):
+    """
+    text.lower(), except that characters whose lowercase form has a different length
+    (e.g. "İ" -> "i̇") are left as they are, so offsets in the result index the original text.
+    """
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered
+    return "".join(c if len(c.lower()) != 1 else c.lower() for c in text)
+
+def find_keyword_offsets(text_lower, keywords):
+    """
+    Start offsets of every keyword hit in already-lowercased text, as compact arrays.
+    Same matching rules as analyze.safe_count_keywords, so len(offsets[kw]) is the keyword's count.
+    Lowercase with lower_keeping_offsets when the offsets are used to slice the original text.
+    """
+    offsets = {}
+    for kw in keywords:
+        pattern = re.compile(r'\b{}\b'.format(re.escape(kw.lower())))
+        hits = offsets.setdefault(kw, array('L'))
+        hits.extend(m.start() for m in pattern.finditer(text_lower))
+    return offsets
+
+def top_snippets(text, offsets, k=3, width=160):
+    """
+    Picks up to k non-overlapping windows of `width` characters containing the most keyword hits.
+    offsets: {keyword: array of start offsets} as returned by find_keyword_offsets.
+    Work is bounded by the number of hits, not the text length.
+    """
+    hits = sorted(
+        (start, len(kw), kw)
+        for kw, starts in offsets.items()
+        for start in starts
+    )
+    if not hits or k <= 0:
+        return []
+
+    # Score a window anchored at each hit by the hits (and distinct keywords) it covers
+    candidates = []
+    j = 0
+    for i, (start, _, _) in enumerate(hits):
+        if j < i:
+            j = i
+        while j + 1 < len(hits) and hits[j + 1][0] + hits[j + 1][1] <= start + width:
+            j += 1
+        covered = hits[i:j + 1]
+        # Negated for a max-heap: most hits, then most distinct keywords, then earliest
+        candidates.append((-len(covered), -len({kw for _, _, kw in covered}), start, i, j))
+    heapq.heapify(candidates)
+
+    snippets = []
+    taken = []
+    starts = [h[0] for h in hits]
+    while candidates and len(snippets) < k:
+        _, _, start, i, j = heapq.heappop(candidates)
+        # Centre the window on its hits so the snippet has context on both sides
+        last_end = hits[j][0] + hits[j][1]
+        pad = max(0, (width - (last_end - start)) // 2)
+        s_start = max(0, start - pad)
+        s_end = min(len(text), s_start + width)
+        # Overlap is judged on the windows as displayed, padding included
+        if any(s_start < t_end and t_start < s_end for t_start, t_end in taken):
+            continue
+        taken.append((s_start, s_end))
+        shown = [h for h in hits[bisect_left(starts, s_start):bisect_left(starts, s_end)] if h[0] + h[1] <= s_end]
+        snippets.append({
+            "offset": s_start,
+            "text": text[s_start:s_end],
+            "keywords": sorted({kw for _, _, kw in shown}),
+            "hits": [(h_start - s_start, h_len) for h_start, h_len, _ in shown],
+        })
+    return snippets
+
 def classify_enablement(sales, customer, workforce, labels=None):
     """
     Classify enablement type based on highest keyword count.
@@ -64,3 +140,54 @@ def get_enablement_score(enablement_types, score_map=None):
     if not enablement_types:
         return 0
     return max(score_map.get(e, 0) for e in enablement_types)
+
+class StreamingKeywordCounter:
+    """
+    Counts keywords over text fed in chunks, with the same semantics as
+    analyze.safe_count_keywords (case-insensitive, word boundaries, no overlap).
+    - Only the last max(len(keyword)) + 1 characters are kept between chunks,
+      so memory stays bounded regardless of document size.
+    - Words and phrases split across chunk boundaries are still matched once.
+    """
+
+    def __init__(self, keywords):
+        self.keywords = list(keywords)
+        self.patterns = [re.compile(r'\b{}\b'.format(re.escape(kw.lower()))) for kw in self.keywords]
+        # One extra character so the leading word boundary can still be checked after trimming
+        self.keep = max((len(kw.lower()) for kw in self.keywords), default=0) + 1
+        self.counts = [0] * len(self.keywords)
+        self.next_pos = [0] * len(self.keywords)  # absolute offset where each keyword's search resumes
+        self.buffer = ""
+        self.base = 0  # absolute offset of buffer[0]
+
+    def feed(self, chunk):
+        if not chunk:
+            return
+        self.buffer += chunk.lower()
+        self._scan(final=False)
+        if len(self.buffer) > self.keep:
+            cut = len(self.buffer) - self.keep
+            self.buffer = self.buffer[cut:]
+            self.base += cut
+
+    def close(self):
+        """Flushes matches at the very end of the text and returns the total count."""
+        self._scan(final=True)
+        self.buffer = ""
+        return self.total()
+
+    def total(self):
+        return sum(self.counts)
+
+    def _scan(self, final):
+        end = len(self.buffer)
+        # After a trim, buffer[0] is only context for the boundary check; matches there were already counted
+        floor = 1 if self.base > 0 else 0
+        for i, pattern in enumerate(self.patterns):
+            pos = max(self.next_pos[i] - self.base, floor)
+            for m in pattern.finditer(self.buffer, pos):
+                if not final and m.end() >= end:
+                    # The trailing boundary depends on text not seen yet; retry with the next chunk
+                    break
+                self.counts[i] += 1
+                self.next_pos[i] = self.base + m.end()
@@ -1,5 +1,3 @@
-import pdfplumber
-
 import tempfile
 import os
 
@@ -7,6 +5,8 @@ import os
 def extract_text_with_pdfplumber(path):
     """Try to extract text using pdfplumber."""
     try:
+        import pdfplumber
+
         with pdfplumber.open(path) as pdf:
             text = ""
             for page in pdf.pages[:10]:
@@ -0,0 +1,142 @@
+import os
+import re
+import json
+import zlib
+import hashlib
+import struct
+import logging
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+INDEX_EXTENSION = ".idx"
+
+TOKEN_RE = re.compile(r'\w+')
+
+class TokenIndex:
+    """
+    Compact per-document index of lowercase token and n-gram counts.
+    - Terms are the exact lowercase text of 1..max_ngram consecutive tokens whose
+      separators are at most max_gap non-word characters ("machine learning", "follow-up").
+    - Stored as a sorted term list plus an unsigned count array, so lookups are a binary search.
+    - A keyword that is itself such a term can be counted without the original text.
+      Occurrences are counted individually, which differs from the regex matcher only
+      for self-overlapping phrases such as "a a" inside "a a a".
+    """
+
+    def __init__(self, terms, counts, max_ngram, max_gap, identifier=None, length=0):
+        self.terms = terms
+        self.counts = counts
+        self.max_ngram = max_ngram
+        self.max_gap = max_gap
+        self.identifier = identifier
+        self.length = length
+        self._resolvable = re.compile(r'\w+(?:\W{1,%d}\w+){0,%d}' % (max_gap, max_ngram - 1))
+
+    def __len__(self):
+        return len(self.terms)
+
+    def can_resolve(self, keyword):
+        """True if the keyword's count can be answered from this index alone."""
+        return bool(self._resolvable.fullmatch(keyword.lower()))
+
+    def count(self, keyword):
+        """Occurrences of a keyword, or None if the index cannot answer it."""
+        term = keyword.lower()
+        if not self._resolvable.fullmatch(term):
+            return None
+        i = bisect_left(self.terms, term)
+        if i < len(self.terms) and self.terms[i] == term:
+            return self.counts[i]
+        return 0
+
+    # ---------- Serialization ----------
+    def to_bytes(self):
+        header = json.dumps({
+            "version": INDEX_VERSION,
+            "identifier": self.identifier,
+            "length": self.length,
+            "max_ngram": self.max_ngram,
+            "max_gap": self.max_gap,
+            "terms": len(self.terms),
+        }).encode("utf-8")
+        vocab = "\x00".join(self.terms).encode("utf-8")
+        payload = struct.pack("<II", len(header), len(vocab)) + header + vocab + self.counts.tobytes()
+        return zlib.compress(payload, 6)
+
+    @classmethod
+    def from_bytes(cls, blob):
+        payload = zlib.decompress(blob)
+        header_len, vocab_len = struct.unpack_from("<II", payload)
+        offset = 8
+        header = json.loads(payload[offset:offset + header_len])
+        offset += header_len
+        if header.get("version") != INDEX_VERSION:
+            raise ValueError(f"Unsupported token index version: {header.get('version')}")
+        vocab = payload[offset:offset + vocab_len].decode("utf-8")
+        offset += vocab_len
+        counts = array("I")
+        counts.frombytes(payload[offset:])
+        terms = vocab.split("\x00") if header["terms"] else []
+        return cls(terms, counts, header["max_ngram"], header["max_gap"],
+                   identifier=header.get("identifier"), length=header.get("length", 0))
+
+def build_token_index(texts, identifier=None, max_ngram=4, max_gap=3):
+    """
+    Builds a TokenIndex from one text or an iterable of texts (e.g. the pages of a crawl).
+    N-grams never span two texts.
+    """
+    if isinstance(texts, str):
+        texts = [texts]
+
+    counter = Counter()
+    length = 0
+    for text in texts:
+        if not isinstance(text, str):
+            continue
+        length += len(text)
+        lowered = text.lower()
+        spans = [m.span() for m in TOKEN_RE.finditer(lowered)]
+        for i, (start, end) in enumerate(spans):
+            counter[lowered[start:end]] += 1
+            prev_end = end
+            for j in range(i + 1, min(i + max_ngram, len(spans))):
+                next_start, next_end = spans[j]
+                if next_start - prev_end > max_gap:
+                    break
+                prev_end = next_end
+                term = lowered[start:next_end]
+                if "\x00" not in term:  # reserved as the vocabulary separator
+                    counter[term] += 1
+
+    terms = sorted(counter)
+    counts = array("I", (min(counter[t], 0xFFFFFFFF) for t in terms))
+    return TokenIndex(terms, counts, max_ngram, max_gap, identifier=identifier, length=length)
+
+def index_path_for(index_dir, identifier):
+    """Index file for a document; a short hash of the raw identifier keeps e.g. "a/b.txt" and "a_b.txt" apart."""
+    safe = re.sub(r'[^A-Za-z0-9_.-]', '_', str(identifier)) or "document"
+    digest = hashlib.sha1(str(identifier).encode("utf-8")).hexdigest()[:10]
+    return os.path.join(index_dir, f"{safe[:100]}-{digest}{INDEX_EXTENSION}")
+
+def save_token_index(index, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(index.to_bytes())
+    os.replace(tmp, path)
+    logger.info(f"[INDEX] Saved {len(index)} terms to {path}")
+
+def load_token_index(path):
+    with open(path, "rb") as f:
+        return TokenIndex.from_bytes(f.read())
+
+def iter_index_paths(index_dir):
+    if not os.path.isdir(index_dir):
+        return
+    for name in sorted(os.listdir(index_dir)):
+        if name.endswith(INDEX_EXTENSION):
+            yield os.path.join(index_dir, name)
@@ -0,0 +1,97 @@
+"""
+Import-time benchmark and guard for the lightweight entry points.
+
+    python -m benchmarks.bench_import
+    python -m benchmarks.bench_import --repeat 10 --budget-ms 300
+
+Each module is imported in a fresh interpreter, timed with -X importtime, and
+checked for heavy crawler dependencies that must only load when a crawl or PDF
+extraction actually runs. Exits non-zero if a forbidden module is loaded or a
+module exceeds the time budget, so it can run in CI.
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Modules that must stay cheap to import, and what they may not pull in
+GUARDED_MODULES = {
+    "analyzer.analyze": ("selenium", "undetected_chromedriver", "pdfplumber", "langdetect", "requests", "tqdm", "bs4"),
+    "analyzer.batch": ("selenium", "undetected_chromedriver", "pdfplumber", "langdetect", "requests", "tqdm", "bs4"),
+    "analyzer.compare": ("selenium", "undetected_chromedriver", "pdfplumber", "langdetect", "requests", "tqdm", "bs4"),
+    "analyzer.utils.pdf_utils": ("pdfplumber",),
+    "extractor.crawl.core": ("selenium", "undetected_chromedriver", "pdfplumber", "langdetect", "requests", "tqdm", "bs4"),
+    "interface.jobs": ("selenium", "undetected_chromedriver", "pdfplumber", "langdetect", "requests", "tqdm", "bs4"),
+}
+
+_PROBE = (
+    "import sys, json, {module}\n"
+    "print(json.dumps(sorted({{m.split('.')[0] for m in sys.modules}})))\n"
+)
+
+
+def measure_import(module, repeat=5):
+    """
+    Imports module in repeat fresh interpreters.
+    Returns (cumulative import times in ms as reported by -X importtime, top-level modules loaded).
+    """
+    timings = []
+    loaded = []
+    for _ in range(repeat):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", _PROBE.format(module=module)],
+            cwd=ROOT, capture_output=True, text=True, check=True,
+        )
+        for line in proc.stderr.splitlines():
+            # "import time: self [us] | cumulative | imported package"
+            parts = line.split("|")
+            if len(parts) == 3 and parts[2].strip() == module:
+                timings.append(int(parts[1]) / 1000)
+        loaded = json.loads(proc.stdout.strip().splitlines()[-1])
+    return timings, loaded
+
+
+def bench_imports(modules=None, repeat=5, budget_ms=None):
+    """Returns (benchmark records, list of violations)."""
+    results, violations = [], []
+    for module, forbidden in (modules or GUARDED_MODULES).items():
+        timings, loaded = measure_import(module, repeat)
+        heavy = sorted(set(forbidden) & set(loaded))
+        median_ms = statistics.median(timings)
+        results.append({
+            "name": "import",
+            "params": {"module": module},
+            "repeat": len(timings),
+            "min_s": min(timings) / 1000,
+            "median_s": median_ms / 1000,
+            "max_s": max(timings) / 1000,
+            "heavy_modules": heavy,
+        })
+        if heavy:
+            violations.append(f"{module} imports {', '.join(heavy)}")
+        if budget_ms and median_ms > budget_ms:
+            violations.append(f"{module} takes {median_ms:.0f} ms to import (budget {budget_ms:.0f} ms)")
+    return results, violations
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import-time benchmark and regression guard")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=None, help="fail if a module's median import exceeds this")
+    args = parser.parse_args(argv)
+
+    results, violations = bench_imports(repeat=args.repeat, budget_ms=args.budget_ms)
+    for r in results:
+        heavy = f"  loads {', '.join(r['heavy_modules'])}" if r["heavy_modules"] else ""
+        print(f"{r['params']['module']:<28} median {r['median_s'] * 1000:8.1f} ms{heavy}")
+    for v in violations:
+        print(f"[IMPORT_REGRESSION] {v}", file=sys.stderr)
+    return 1 if violations else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
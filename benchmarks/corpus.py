@@ -0,0 +1,89 @@
+import random
+
+# Filler vocabulary: common English words that never collide with generated keywords
+FILLER_WORDS = (
+    "the of and to in is that for it as with was on be by this are at from or an have not "
+    "they which one you were all we can her has there been if more when will would who so "
+    "what their out up into its time only new some could these two may first then do any "
+    "like my now over such our man me even most made after also did many before must "
+    "through back years where much your way well down should because each just those people "
+    "how too little state good very make world still own see men work long get here between "
+    "both life being under never day same another know while last might us great old year off "
+    "come since against go came right used take three"
+).split()
+
+KEYWORD_STEMS = (
+    "ai gpt automation analytics onboarding coaching certification training compliance "
+    "encryption sso platform video webinar personalization interactive quiz survey "
+    "community social pipeline forecast revenue retention loyalty workflow integration"
+).split()
+
+SIZE_UNITS = {"KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3}
+
+
+def parse_size(value):
+    """'64KB' -> 65536; plain integers are bytes."""
+    value = value.strip().upper()
+    for unit, factor in SIZE_UNITS.items():
+        if value.endswith(unit):
+            return int(float(value[:-len(unit)]) * factor)
+    return int(value)
+
+
+def generate_config(n_keywords, n_buckets=3, phrase_ratio=0.25, seed=0):
+    """
+    Keyword config in the keywords_config.json format with n_keywords spread over n_buckets.
+    A share of keywords are two-word phrases to exercise phrase matching.
+    """
+    rng = random.Random(seed)
+    keywords = []
+    i = 0
+    while len(keywords) < n_keywords:
+        stem = KEYWORD_STEMS[i % len(KEYWORD_STEMS)]
+        kw = stem if i < len(KEYWORD_STEMS) else f"{stem}{i // len(KEYWORD_STEMS)}"
+        if rng.random() < phrase_ratio:
+            kw = f"{kw} {rng.choice(KEYWORD_STEMS)}"
+        keywords.append(kw)
+        i += 1
+
+    config = {}
+    for b in range(n_buckets):
+        config[f"Bucket{b}"] = {
+            "keywords": keywords[b::n_buckets],
+            "weight": round(1.0 + b * 0.5, 2),
+        }
+    config["_formula"] = " + ".join(f"{{Bucket{b}}}" for b in range(n_buckets))
+    config["_custom_variables"] = {"bonus": 1}
+    return config
+
+
+def iter_corpus_chunks(size_bytes, keywords, keyword_density=0.01, seed=0, chunk_size=1 << 20):
+    """
+    Yields ~chunk_size str chunks totalling about size_bytes of ASCII text.
+    keyword_density is the share of words drawn from keywords (randomly cased).
+    Deterministic for a given seed.
+    """
+    rng = random.Random(seed)
+    produced = 0
+    while produced < size_bytes:
+        target = min(chunk_size, size_bytes - produced)
+        words = []
+        length = 0
+        while length < target:
+            if keywords and rng.random() < keyword_density:
+                word = rng.choice(keywords)
+                if rng.random() < 0.3:
+                    word = word.upper()
+            else:
+                word = rng.choice(FILLER_WORDS)
+            if rng.random() < 0.08:
+                word += rng.choice((".", ",", "\n"))
+            words.append(word)
+            length += len(word) + 1
+        chunk = " ".join(words)[:target]
+        produced += len(chunk)
+        yield chunk
+
+
+def generate_corpus(size_bytes, keywords, keyword_density=0.01, seed=0):
+    return "".join(iter_corpus_chunks(size_bytes, keywords, keyword_density, seed))
@@ -0,0 +1,162 @@
+import time
+import random
+import threading
+import contextlib
+import urllib.error
+import urllib.request
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class FixtureSite:
+    """
+    Deterministic generated website for discovery benchmarks.
+    - pages: number of content pages (/page/0 ... /page/N-1)
+    - menu_links: links repeated on every page, like a mega-menu
+    - content_links: extra in-body links per page to random other pages
+    - filler_paragraphs: body text per page, to make pages heavy
+    """
+
+    def __init__(self, pages=200, menu_links=150, content_links=20, filler_paragraphs=30, seed=0):
+        self.pages = pages
+        self.menu_links = min(menu_links, pages)
+        self.content_links = content_links
+        self.filler_paragraphs = filler_paragraphs
+        self.seed = seed
+
+    def render(self, index):
+        rng = random.Random(self.seed * 1_000_003 + index)
+        menu = "".join(
+            f'<li><a class="nav-link" href="/page/{i}?utm_source=menu&amp;b=2#top">Section {i}</a></li>'
+            for i in range(self.menu_links)
+        )
+        body_links = "".join(
+            f'<p>See <a href="/page/{rng.randrange(self.pages)}/">related page</a> and '
+            f'<a href="https://external.example.com/{i}">partner</a>.</p>'
+            for i in range(self.content_links)
+        )
+        filler = "".join(
+            "<p>" + " ".join(rng.choice(("lorem", "ipsum", "dolor", "sit", "amet", "platform", "training"))
+                             for _ in range(60)) + "</p>"
+            for _ in range(self.filler_paragraphs)
+        )
+        return (
+            "<!DOCTYPE html><html><head>"
+            f'<title>Page {index}</title><link rel="canonical" href="/page/{index}">'
+            "</head><body>"
+            f"<nav><ul>{menu}</ul></nav><main>{body_links}{filler}"
+            '<a href="mailto:sales@example.com">Mail</a><a href="/brochure.pdf">PDF</a>'
+            "</main></body></html>"
+        )
+
+
+def _make_handler(site, latency, jitter):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if latency or jitter:
+                time.sleep(latency + random.uniform(0, jitter))
+            path = self.path.split("?", 1)[0].split("#", 1)[0].rstrip("/") or "/"
+            if path == "/":
+                index = 0
+            elif path.startswith("/page/") and path[6:].isdigit() and int(path[6:]) < site.pages:
+                index = int(path[6:])
+            elif path.endswith(".pdf"):
+                body = b"%PDF-1.4 fixture"
+                self.send_response(200)
+                self.send_header("Content-Type", "application/pdf")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return
+            else:
+                self.send_error(404)
+                return
+            body = site.render(index).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+
+@contextmanager
+def serve_fixture_site(site=None, latency=0.0, jitter=0.0, host="127.0.0.1"):
+    """Serves a FixtureSite on a free local port; yields its base URL."""
+    site = site or FixtureSite()
+    server = ThreadingHTTPServer((host, 0), _make_handler(site, latency, jitter))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://{host}:{server.server_address[1]}/"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+# Stand-in proxies talk to the target directly, never through proxies from the environment
+_DIRECT = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+
+
+def _make_proxy_handler(latency, slots, block_every, counter):
+    class ProxyHandler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            # Forward proxies receive the absolute target URL as the request path
+            with slots:
+                if latency:
+                    time.sleep(latency)
+                with counter["lock"]:
+                    counter["requests"] += 1
+                    n = counter["requests"]
+                if block_every and n % block_every == 0:
+                    self.send_error(429)
+                    return
+                try:
+                    request = urllib.request.Request(self.path, headers={"User-Agent": self.headers.get("User-Agent", "")})
+                    with _DIRECT.open(request, timeout=10) as upstream:
+                        body = upstream.read()
+                        status = upstream.status
+                        content_type = upstream.headers.get("Content-Type", "")
+                except urllib.error.HTTPError as e:
+                    self.send_error(e.code)
+                    return
+                except Exception:
+                    self.send_error(502)
+                    return
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return ProxyHandler
+
+
+@contextmanager
+def serve_stand_in_proxy(latency=0.0, concurrency=None, block_every=0, host="127.0.0.1"):
+    """
+    Local HTTP forward proxy for exercising proxy rotation without paid exits.
+    - latency: added per request
+    - concurrency: requests served at once (a rate-limited exit); None is unlimited
+    - block_every: answer every n-th request with 429, like a throttled exit
+    Yields (proxy_url, stats) where stats["requests"] counts forwarded requests.
+    """
+    slots = threading.BoundedSemaphore(concurrency) if concurrency else contextlib.nullcontext()
+    stats = {"requests": 0, "lock": threading.Lock()}
+    server = ThreadingHTTPServer((host, 0), _make_proxy_handler(latency, slots, block_every, stats))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://{host}:{server.server_address[1]}", stats
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,258 @@
+"""
+Reproducible benchmarks for the analyzer and crawler hot paths.
+
+    python -m benchmarks.run_benchmarks --suite analyzer --sizes 64KB,1MB,16MB --config-sizes 12,120
+    python -m benchmarks.run_benchmarks --suite crawler --pages 200 --latency 0.02
+    python -m benchmarks.run_benchmarks --suite proxies --proxy-counts 1,2,4 --proxy-concurrency 2
+    python -m benchmarks.run_benchmarks --suite imports
+    python -m benchmarks.run_benchmarks --output bench_results.json
+
+Corpora and the fixture website are generated from --seed, so two runs on the
+same machine measure the same work. Results are written as JSON for comparison
+between versions.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+import contextlib
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.corpus import generate_config, generate_corpus, parse_size
+from benchmarks.fixture_site import FixtureSite, serve_fixture_site, serve_stand_in_proxy
+
+
+def _timeit(fn, repeat):
+    """Runs fn repeat times; returns (timings in seconds, last return value)."""
+    timings = []
+    value = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = fn()
+        timings.append(time.perf_counter() - start)
+    return timings, value
+
+
+def _summary(name, timings, params, units=None, work=None):
+    record = {
+        "name": name,
+        "params": params,
+        "repeat": len(timings),
+        "min_s": min(timings),
+        "median_s": statistics.median(timings),
+        "mean_s": statistics.fmean(timings),
+        "max_s": max(timings),
+    }
+    if units and work:
+        record[f"{units}_per_s"] = work / record["median_s"] if record["median_s"] > 0 else None
+    return record
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL,
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+# ---------- Analyzer ----------
+def bench_analyzer(sizes, config_sizes, repeat, seed, density):
+    from analyzer import analyze
+    from analyzer.utils import config_utils
+    from analyzer.utils.keyword_utils import count_keywords
+
+    results = []
+    original_path = config_utils.CONFIG_PATH
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            for n_keywords in config_sizes:
+                config = generate_config(n_keywords, seed=seed)
+                keywords = [kw for k, v in config.items() if not k.startswith("_") for kw in v["keywords"]]
+                config_utils.CONFIG_PATH = os.path.join(tmp, f"config_{n_keywords}.json")
+                with open(config_utils.CONFIG_PATH, "w") as f:
+                    json.dump(config, f)
+
+                timings, _ = _timeit(config_utils.load_config, max(repeat, 20))
+                results.append(_summary("load_config", timings, {"keywords": n_keywords}))
+
+                for size in sizes:
+                    text = generate_corpus(size, keywords, keyword_density=density, seed=seed)
+                    mb = len(text) / (1024 ** 2)
+                    params = {"bytes": len(text), "keywords": n_keywords, "density": density}
+                    print(f"[BENCH] analyzer: {len(text)} bytes, {n_keywords} keywords", file=sys.stderr)
+
+                    timings, count = _timeit(lambda: analyze.safe_count_keywords(text, keywords), repeat)
+                    results.append(dict(_summary("safe_count_keywords", timings, params, "mb", mb), hits=count))
+
+                    timings, count = _timeit(lambda: count_keywords(text, keywords), repeat)
+                    results.append(dict(_summary("count_keywords", timings, params, "mb", mb), hits=count))
+
+                    timings, result = _timeit(lambda: analyze.analyze_text("bench", text), repeat)
+                    results.append(dict(_summary("analyze_text", timings, params, "mb", mb), score=result["score"]))
+
+                    timings, result = _timeit(
+                        lambda: analyze.analyze_stream("bench", iter([text[i:i + (1 << 20)] for i in range(0, len(text), 1 << 20)])),
+                        repeat,
+                    )
+                    results.append(dict(_summary("analyze_stream", timings, params, "mb", mb), score=result["score"]))
+                    del text
+        finally:
+            config_utils.CONFIG_PATH = original_path
+    return results
+
+
+# ---------- Crawler ----------
+def bench_crawler(pages, menu_links, latency, jitter, max_pages, threads, repeat, seed):
+    from extractor.crawl.link_discovery import discover_internal_links, extract_links_from_page
+
+    results = []
+    site = FixtureSite(pages=pages, menu_links=menu_links, seed=seed)
+    params = {
+        "site_pages": pages,
+        "menu_links": menu_links,
+        "latency_s": latency,
+        "jitter_s": jitter,
+        "page_bytes": len(site.render(0).encode("utf-8")),
+    }
+    with serve_fixture_site(site, latency=latency, jitter=jitter) as base_url:
+        domain = base_url.split("//", 1)[1].rstrip("/")
+        page_urls = [f"{base_url}page/{i}" for i in range(min(pages, 50))]
+        print(f"[BENCH] crawler: fixture at {base_url}", file=sys.stderr)
+
+        def fetch_all():
+            return sum(len(extract_links_from_page(u, domain, delay_range=(0, 0))) for u in page_urls)
+
+        timings, links = _timeit(fetch_all, repeat)
+        per_page = [t / len(page_urls) for t in timings]
+        results.append(dict(
+            _summary("extract_links_from_page", per_page, dict(params, pages_fetched=len(page_urls))),
+            links=links,
+        ))
+
+        def discover():
+            links, errors = discover_internal_links(
+                base_url, max_pages=max_pages, max_threads=threads, delay_range=(0, 0)
+            )
+            return len(links), len(errors)
+
+        timings, (found, errors) = _timeit(discover, repeat)
+        results.append(dict(
+            _summary("discover_internal_links", timings,
+                     dict(params, max_pages=max_pages, threads=threads), "pages", found),
+            pages_found=found,
+            errors=errors,
+        ))
+    return results
+
+
+# ---------- Proxy rotation ----------
+def bench_proxies(pages, proxy_counts, proxy_latency, proxy_concurrency, max_pages, threads, repeat, seed):
+    """Discovery throughput through 1..N rate-limited stand-in proxies behind a ProxyPool."""
+    from extractor.crawl.link_discovery import discover_internal_links
+    from extractor.crawl.proxy_pool import ProxyPool
+
+    results = []
+    site = FixtureSite(pages=pages, seed=seed)
+    with serve_fixture_site(site) as base_url:
+        for n_proxies in proxy_counts:
+            with contextlib.ExitStack() as stack:
+                proxies = [stack.enter_context(serve_stand_in_proxy(proxy_latency, proxy_concurrency))
+                           for _ in range(n_proxies)]
+                print(f"[BENCH] proxies: {n_proxies} stand-in proxies", file=sys.stderr)
+
+                def discover():
+                    pool = ProxyPool([url for url, _ in proxies])
+                    links, errors = discover_internal_links(
+                        base_url, max_pages=max_pages, max_threads=threads, delay_range=(0, 0), proxy_pool=pool
+                    )
+                    return len(links), len(errors)
+
+                timings, (found, errors) = _timeit(discover, repeat)
+                params = {"proxies": n_proxies, "proxy_latency_s": proxy_latency,
+                          "proxy_concurrency": proxy_concurrency, "max_pages": max_pages, "threads": threads}
+                results.append(dict(
+                    _summary("discover_via_proxy_pool", timings, params, "pages", found),
+                    pages_found=found,
+                    errors=errors,
+                    per_proxy_requests=[stats["requests"] for _, stats in proxies],
+                ))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyzer and crawler benchmarks")
+    parser.add_argument("--suite", default="analyzer,crawler", help="comma-separated: analyzer, crawler, proxies, imports")
+    parser.add_argument("--sizes", default="64KB,1MB,16MB", help="corpus sizes, e.g. 64KB,1MB,256MB")
+    parser.add_argument("--config-sizes", default="12,120", help="keyword counts per generated config")
+    parser.add_argument("--density", type=float, default=0.01, help="share of corpus words that are keywords")
+    parser.add_argument("--pages", type=int, default=200, help="fixture site size")
+    parser.add_argument("--menu-links", type=int, default=150, help="links repeated on every fixture page")
+    parser.add_argument("--latency", type=float, default=0.0, help="fixture response latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random latency in seconds")
+    parser.add_argument("--max-pages", type=int, default=100, help="discover_internal_links max_pages")
+    parser.add_argument("--threads", type=int, default=10, help="discover_internal_links max_threads")
+    parser.add_argument("--proxy-counts", default="1,2,4", help="stand-in proxy counts for the proxies suite")
+    parser.add_argument("--proxy-latency", type=float, default=0.2, help="stand-in proxy latency in seconds")
+    parser.add_argument("--proxy-concurrency", type=int, default=2, help="requests each stand-in proxy serves at once")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_results.json")
+    args = parser.parse_args(argv)
+
+    suites = {s.strip() for s in args.suite.split(",") if s.strip()}
+    report = {
+        "revision": _git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "seed": args.seed,
+        "results": [],
+    }
+
+    if "analyzer" in suites:
+        report["results"] += bench_analyzer(
+            [parse_size(s) for s in args.sizes.split(",")],
+            [int(n) for n in args.config_sizes.split(",")],
+            args.repeat, args.seed, args.density,
+        )
+    if "crawler" in suites:
+        report["results"] += bench_crawler(
+            args.pages, args.menu_links, args.latency, args.jitter,
+            args.max_pages, args.threads, args.repeat, args.seed,
+        )
+
+    if "proxies" in suites:
+        report["results"] += bench_proxies(
+            args.pages, [int(n) for n in args.proxy_counts.split(",")], args.proxy_latency,
+            args.proxy_concurrency, args.max_pages, args.threads, args.repeat, args.seed,
+        )
+
+    if "imports" in suites:
+        from benchmarks.bench_import import bench_imports
+        results, violations = bench_imports(repeat=args.repeat)
+        report["results"] += results
+        for v in violations:
+            print(f"[IMPORT_REGRESSION] {v}", file=sys.stderr)
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    for r in report["results"]:
+        rate = next((f" {v:,.2f} {k}" for k, v in r.items() if k.endswith("_per_s") and v), "")
+        print(f"{r['name']:<26} median {r['median_s'] * 1000:10.2f} ms{rate}  {r['params']}")
+    print(f"\n[BENCH] Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
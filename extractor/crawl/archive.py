@@ -0,0 +1,140 @@
+# extractor/crawl/archive.py
+import os
+import gzip
+import json
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+RECORD = "record"
+REPLAY = "replay"
+
+# Record kinds
+RESPONSE = "response"   # raw HTTP response seen by link discovery
+DOM = "dom"             # browser-rendered page: body text + page source
+PDF = "pdf"             # raw PDF bytes
+
+SHARD_SUFFIX = ".warc.gz"
+INDEX_SUFFIX = ".idx.jsonl"
+
+
+class CrawlArchive:
+    """
+    WARC-like record/replay archive for crawls.
+    - A directory of shards, one per writing process, so pool workers never share a file.
+    - Each record is its own gzip member (JSON header line + body), appended to the shard.
+    - A JSON-lines sidecar per shard maps (kind, url) to the member's offset and length,
+      so replay can seek straight to a record without decompressing the rest.
+    """
+
+    def __init__(self, path, mode):
+        if mode not in (RECORD, REPLAY):
+            raise ValueError(f"Unknown archive mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.lock = threading.Lock()
+        self._shard = None
+        self._index = None
+        self._entries = None
+        os.makedirs(path, exist_ok=True)
+
+    # ---------- Recording ----------
+    def _open_shard(self):
+        name = f"shard-{os.getpid()}-{int(time.time())}"
+        self._shard = open(os.path.join(self.path, name + SHARD_SUFFIX), "ab")
+        self._index = open(os.path.join(self.path, name + INDEX_SUFFIX), "a", encoding="utf-8")
+        self._shard_name = name + SHARD_SUFFIX
+
+    def record(self, kind, url, body, meta=None):
+        if self.mode != RECORD:
+            return
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        header = dict(meta or {}, kind=kind, url=url, recorded_at=time.time(), length=len(body))
+        member = gzip.compress(json.dumps(header).encode("utf-8") + b"\n" + body, compresslevel=6)
+        try:
+            with self.lock:
+                if self._shard is None:
+                    self._open_shard()
+                offset = self._shard.tell()
+                self._shard.write(member)
+                self._shard.flush()
+                self._index.write(json.dumps({
+                    "kind": kind, "url": url, "shard": self._shard_name,
+                    "offset": offset, "length": len(member),
+                }) + "\n")
+                self._index.flush()
+        except Exception as e:
+            logger.warning(f"[ARCHIVE_FAIL] Could not record {kind} for {url}: {e}")
+
+    def close(self):
+        """
+        Closes the shard and forgets the replay index, and drops this handle from the
+        per-process cache, so the next get_archive sees recordings made since.
+        """
+        with self.lock:
+            for f in (self._shard, self._index):
+                if f:
+                    f.close()
+            self._shard = self._index = None
+            self._entries = None
+        with _archives_lock:
+            for key in [k for k, archive in _archives.items() if archive is self]:
+                del _archives[key]
+
+    # ---------- Replay ----------
+    def _load_entries(self):
+        entries = {}
+        for name in sorted(os.listdir(self.path)):
+            if not name.endswith(INDEX_SUFFIX):
+                continue
+            with open(os.path.join(self.path, name), "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # torn last line from an interrupted recording
+                    entries[(entry["kind"], entry["url"])] = entry
+        logger.info(f"[ARCHIVE] Loaded {len(entries)} records from {self.path}")
+        return entries
+
+    def get(self, kind, url):
+        """Returns (meta, body_bytes) of the latest record for (kind, url), or None."""
+        with self.lock:
+            if self._entries is None:
+                self._entries = self._load_entries()
+        entry = self._entries.get((kind, url))
+        if not entry:
+            return None
+        with open(os.path.join(self.path, entry["shard"]), "rb") as f:
+            f.seek(entry["offset"])
+            data = gzip.decompress(f.read(entry["length"]))
+        header, _, body = data.partition(b"\n")
+        return json.loads(header), body
+
+    def urls(self, kind):
+        with self.lock:
+            if self._entries is None:
+                self._entries = self._load_entries()
+        return [url for k, url in self._entries if k == kind]
+
+
+_archives = {}
+_archives_lock = threading.Lock()
+
+
+def get_archive(path, mode):
+    """
+    Per-process archive handle, or None when archiving is off.
+    Keyed by directory, mode and PID, so forked pool workers open their own shard.
+    A handle stays cached until it is closed (the crawl that opened it closes it when it ends).
+    """
+    if not path or not mode:
+        return None
+    key = (os.path.abspath(path), mode, os.getpid())
+    with _archives_lock:
+        if key not in _archives:
+            _archives[key] = CrawlArchive(path, mode)
+        return _archives[key]
@@ -0,0 +1,302 @@
+# extractor/crawl/artifacts.py
+import os
+import re
+import gzip
+import json
+import time
+import queue
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DIR = os.path.join("output", "artifacts")
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024   # all runs in the directory together
+DEFAULT_PER_CLASS = 3                   # artifacts kept per (domain, failure class) in one run
+INDEX_NAME = "index.jsonl"
+SLOTS_DIR = "slots"
+USAGE_NAME = ".usage"                   # running byte total of the directory's artifacts
+EVICT_TO = 0.9                          # eviction frees down to this fraction of max_bytes
+CAPTURE_TIMEOUT_S = 5                   # longest a failing task waits for the browser's artifact data
+ARTIFACT_SUFFIXES = (".png", ".json.gz")
+
+
+def _safe(name, max_length=80):
+    return re.sub(r"[^a-zA-Z0-9_.-]", "_", name or "none")[:max_length]
+
+
+@contextmanager
+def _directory_lock(directory):
+    """Serializes index appends and eviction across worker processes (no-op without fcntl)."""
+    try:
+        import fcntl
+    except ImportError:
+        yield
+        return
+    with open(os.path.join(directory, ".lock"), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class FailureArtifacts:
+    """
+    Debugging artifacts for failed page extractions, kept off the hot path.
+    - Sampling: only the first per_class failures per (domain, failure class) in a run are
+      captured at all; the slot is claimed with an exclusive file create, so the limit holds
+      across worker processes and a skipped failure costs one syscall.
+    - capture() takes the screenshot, DOM, console log, final URL and title from the driver and
+      queues them; a background thread compresses and writes them. The queue is bounded and
+      never blocks: when the writer falls behind, artifacts are dropped.
+    - Layout: <directory>/<run_id>/<id>.png and <id>.json.gz, plus index.jsonl with one line per artifact.
+    - Budget: a running byte total of the whole directory (seeded by one scan) is updated on
+      each write. Once it passes max_bytes, the oldest artifacts are evicted down to EVICT_TO of
+      it, so the directory is only scanned again after a tenth of the budget has been written.
+      Evicted artifacts keep their index lines, so load_index reports them as evicted.
+    """
+
+    def __init__(self, directory=DEFAULT_DIR, run_id=None, max_bytes=DEFAULT_MAX_BYTES,
+                 per_class=DEFAULT_PER_CLASS, queue_size=32):
+        self.directory = directory
+        self.run_id = run_id or time.strftime("%Y-%m-%d")
+        self.run_dir = os.path.join(directory, _safe(self.run_id))
+        self.max_bytes = max_bytes
+        self.per_class = per_class
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.thread = None
+        self.lock = threading.Lock()
+        self._created = False
+        self._exhausted = set()
+
+    def config(self):
+        """Picklable settings, so worker processes open the same artifact run."""
+        return {"directory": self.directory, "run_id": self.run_id,
+                "max_bytes": self.max_bytes, "per_class": self.per_class}
+
+    # ---------- Hot path ----------
+    def should_capture(self, url, reason):
+        """Claims one of the run's sampling slots for (domain, reason); False when they are all taken."""
+        key = _safe(f"{urlparse(url).netloc}__{reason}")
+        if key in self._exhausted:
+            return False
+        if not self._created:
+            # Created on the first failure, so clean runs leave no empty directories behind
+            os.makedirs(os.path.join(self.run_dir, SLOTS_DIR), exist_ok=True)
+            self._created = True
+        for n in range(self.per_class):
+            try:
+                os.close(os.open(os.path.join(self.run_dir, SLOTS_DIR, f"{key}.{n}"),
+                                 os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return True
+            except FileExistsError:
+                continue
+            except OSError:
+                return False
+        self._exhausted.add(key)
+        return False
+
+    def capture(self, driver, url, reason, stage=None, timeout=CAPTURE_TIMEOUT_S):
+        """
+        Samples a failure and, if it is kept, queues what the browser still shows. The driver
+        is read in a helper thread, cheap fields first; whatever it has not returned after
+        timeout seconds is left out, so a browser that stopped answering cannot hang the task.
+        """
+        if driver is None or not self.should_capture(url, reason):
+            return False
+
+        grabbed = {}
+
+        def grab_all():
+            for key, fn in (("current_url", lambda: driver.current_url),
+                            ("title", lambda: driver.title),
+                            ("screenshot", lambda: driver.get_screenshot_as_png()),
+                            ("page_source", lambda: driver.page_source),
+                            ("console", lambda: driver.get_log("browser"))):
+                try:
+                    grabbed[key] = fn()
+                except Exception:
+                    grabbed[key] = None
+
+        thread = threading.Thread(target=grab_all, name="artifact-capture", daemon=True)
+        thread.start()
+        thread.join(timeout)
+        if thread.is_alive():
+            logger.warning(f"[ARTIFACTS] {url}: browser did not answer within {timeout}s; keeping a partial artifact")
+        return self.submit(url, reason, stage, **dict(grabbed))
+
+    def submit(self, url, reason, stage=None, screenshot=None, page_source=None, console=None,
+               current_url=None, title=None):
+        """Hands captured data to the writer thread; returns False if it had to be dropped."""
+        self._ensure_writer()
+        try:
+            self.queue.put_nowait({
+                "url": url, "reason": reason, "stage": stage, "time": time.time(),
+                "screenshot": screenshot, "page_source": page_source, "console": console,
+                "current_url": current_url, "title": title,
+            })
+            return True
+        except queue.Full:
+            logger.warning(f"[ARTIFACTS] Writer is behind; dropped artifact for {url}")
+            return False
+
+    # ---------- Writer thread ----------
+    def _ensure_writer(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name="failure-artifacts", daemon=True)
+                self.thread.start()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                self._write(item)
+            except Exception as e:
+                logger.warning(f"[ARTIFACT_FAIL] {item['url']}: {e}")
+            finally:
+                self.queue.task_done()
+
+    def _write(self, item):
+        artifact_id = f"{int(item['time'] * 1000)}-{hashlib.sha1(item['url'].encode('utf-8')).hexdigest()[:10]}"
+        files = []
+        if item["screenshot"]:
+            # PNG is already deflate-compressed; gzipping it again gains nothing
+            files.append(artifact_id + ".png")
+            with open(os.path.join(self.run_dir, files[-1]), "wb") as f:
+                f.write(item["screenshot"])
+        files.append(artifact_id + ".json.gz")
+        details = {k: item[k] for k in ("url", "current_url", "title", "reason", "stage", "console", "page_source")}
+        with gzip.open(os.path.join(self.run_dir, files[-1]), "wt", encoding="utf-8", compresslevel=6) as f:
+            json.dump(details, f)
+
+        entry = {
+            "id": artifact_id,
+            "url": item["url"],
+            "domain": urlparse(item["url"]).netloc,
+            "reason": item["reason"],
+            "stage": item["stage"],
+            "current_url": item["current_url"],
+            "title": item["title"],
+            "time": item["time"],
+            "files": files,
+            "bytes": sum(os.path.getsize(os.path.join(self.run_dir, name)) for name in files),
+        }
+        with _directory_lock(self.directory):
+            with open(os.path.join(self.run_dir, INDEX_NAME), "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+            self._account(entry["bytes"])
+        logger.info(f"[ARTIFACTS] {item['url']}: {item['reason']} -> {os.path.join(self.run_dir, artifact_id)}.*")
+
+    def _account(self, added):
+        """Adds a write to the directory's byte total and evicts when it is over budget (directory lock held)."""
+        path = os.path.join(self.directory, USAGE_NAME)
+        try:
+            with open(path, "r") as f:
+                total = int(f.read()) + added
+        except (OSError, ValueError):
+            total = self._enforce_budget()
+        if total > self.max_bytes:
+            total = self._enforce_budget()
+        with open(path, "w") as f:
+            f.write(str(total))
+
+    def _enforce_budget(self):
+        """
+        Scans the directory and evicts whole artifacts, oldest first, down to EVICT_TO of
+        max_bytes if it is over max_bytes; returns the bytes left.
+        """
+        artifacts = {}
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if not name.endswith(ARTIFACT_SUFFIXES):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                key = os.path.join(root, name.split(".", 1)[0])
+                mtime, size, paths = artifacts.get(key, (stat.st_mtime, 0, []))
+                artifacts[key] = (min(mtime, stat.st_mtime), size + stat.st_size, paths + [path])
+        total = sum(size for _, size, _ in artifacts.values())
+        if total <= self.max_bytes:
+            return total
+        evicted = 0
+        for mtime, size, paths in sorted(artifacts.values()):
+            if total <= self.max_bytes * EVICT_TO:
+                break
+            for path in paths:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
+            evicted += 1
+        if evicted:
+            logger.info(f"[ARTIFACTS] Evicted {evicted} oldest artifacts to stay under "
+                        f"{self.max_bytes / (1024 * 1024):.0f} MB")
+        return total
+
+    def close(self, timeout=10):
+        """Flushes queued artifacts and stops the writer."""
+        with self.lock:
+            thread, self.thread = self.thread, None
+        if thread is None or not thread.is_alive():
+            return
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        thread.join(timeout=timeout)
+
+
+# ---------- Per-process instances, keyed by settings (like metrics and archives) ----------
+_instances = {}
+_instances_lock = threading.Lock()
+
+
+def get_artifacts(config=None):
+    """This process's FailureArtifacts for config (default directory and today's run when None)."""
+    config = config or {}
+    key = (os.path.abspath(config.get("directory") or DEFAULT_DIR), config.get("run_id"), os.getpid())
+    with _instances_lock:
+        if key not in _instances:
+            _instances[key] = FailureArtifacts(
+                config.get("directory") or DEFAULT_DIR,
+                run_id=config.get("run_id"),
+                max_bytes=config.get("max_bytes", DEFAULT_MAX_BYTES),
+                per_class=config.get("per_class", DEFAULT_PER_CLASS),
+            )
+        return _instances[key]
+
+
+def close_artifacts():
+    """Flushes this process's artifact writers; run before a worker process exits."""
+    pid = os.getpid()
+    with _instances_lock:
+        instances = [_instances.pop(k) for k in list(_instances) if k[-1] == pid]
+    for artifacts in instances:
+        artifacts.close()
+
+
+def load_index(directory, run_id):
+    """Index entries of one run; "evicted" is set when the artifact's files are gone."""
+    run_dir = os.path.join(directory, _safe(run_id))
+    entries = []
+    try:
+        with open(os.path.join(run_dir, INDEX_NAME), "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    entry["evicted"] = not all(os.path.exists(os.path.join(run_dir, n)) for n in entry["files"])
+                    entries.append(entry)
+    except FileNotFoundError:
+        pass
+    return entries
@@ -1,48 +1,139 @@
 # extractor/core.py
 import os
+import time
+import uuid
 import logging
+from urllib.parse import urlparse
 from extractor.crawl.link_discovery import discover_internal_links
 from extractor.crawl.multiprocess import extract_texts_from_urls
 from extractor.extractors.cookie_handler import handle_cookie_consent
-from analyzer.utils.helpers import sanitize_filename, save_text_to_file
+from extractor.crawl.archive import get_archive
+from extractor.crawl.artifacts import FailureArtifacts, load_index
+from extractor.crawl.proxy_pool import ProxyPool
+from extractor.crawl.worker_manager import StopRequested
+from extractor.crawl.metrics import CrawlMetrics, NULL_METRICS, load_events, summarize, write_prometheus, format_report
+from analyzer.utils.crawl_store import CrawlStore, STORE_FILENAME
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO)
 
 def crawl_website(
     base_url,
     output_dir="output/text",
     max_pages=20,
     max_threads=10,
-    max_processes=4,
+    max_processes=None,                   # upper bound on browsers; None sizes them from available memory
     respect_robots=False,
     proxy_list=None,
     save_text=True,
     show_progress=False,
-    save_screenshot_on_fail=True,         # enable screenshots on fail
+    save_screenshot_on_fail=True,         # sampled failure artifacts (screenshot, DOM, console) under <output_dir>/artifacts
     lang="en",                             # enforce English content
-    min_content_length=400                # enforce minimum content length
+    min_content_length=400,               # enforce minimum content length
+    store_path=None,                      # defaults to <output_dir>/crawl_store.sqlite
+    run_id=None,
+    on_page=None,                         # called with (url, text) as each page finishes
+    archive_dir=None,                     # record/replay archive directory
+    archive_mode=None,                    # "record" captures responses and DOM snapshots, "replay" uses them offline
+    metrics_dir=None,                     # defaults to <output_dir>/metrics; False disables instrumentation
+    profile_stages=None,                  # stage names to run under cProfile, e.g. {"page_load"}
+    trace_memory=False,                   # record tracemalloc peak allocation per stage
+    browser_memory_mb=None,               # per-browser memory limit (Chrome flags + worker kill above it)
+    pin_proxy_per_domain=False,           # keep one proxy per domain instead of spreading requests
+    frontier_path=None,                   # persist discovery state here; rerunning with it resumes discovery
+    tabs_per_browser=1,                   # pages rendered at once in each browser, one per tab
+    stop_event=None                       # threading.Event; setting it stops the crawl (raises StopRequested)
 ):
     """
     Orchestrates the full crawling process:
     1. Discovers internal links from a base URL.
     2. Extracts rendered + PDF content via Selenium + multiprocessing.
-    3. Saves content to disk or returns as a dict.
+    3. Appends content to the crawl store and returns it as a dict.
+    With archive_mode="record" every discovery response, rendered DOM and PDF is
+    archived under archive_dir; with archive_mode="replay" the crawl runs from
+    that archive without network access.
+    Per-URL, per-stage timings, counters and failure reasons are written to
+    <metrics_dir>/crawl-*.jsonl and a Prometheus textfile, and summarized in the log.
     """
+    metrics = NULL_METRICS
+    if metrics_dir is not False:
+        metrics_dir = metrics_dir or os.path.join(output_dir, "metrics")
+        metrics_path = os.path.join(metrics_dir, f"crawl-{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:6]}.jsonl")
+        metrics = CrawlMetrics(metrics_path, profile_stages=profile_stages, trace_memory=trace_memory)
+    archive = get_archive(archive_dir, archive_mode)
+    try:
+        with metrics.span("crawl_total", url=base_url):
+            return _crawl_website(
+                base_url, output_dir=output_dir, max_pages=max_pages, max_threads=max_threads,
+                max_processes=max_processes, respect_robots=respect_robots, proxy_list=proxy_list,
+                save_text=save_text, show_progress=show_progress, save_screenshot_on_fail=save_screenshot_on_fail,
+                lang=lang, min_content_length=min_content_length, store_path=store_path, run_id=run_id,
+                on_page=on_page, archive_dir=archive_dir, archive_mode=archive_mode, metrics=metrics,
+                browser_memory_mb=browser_memory_mb, pin_proxy_per_domain=pin_proxy_per_domain,
+                frontier_path=frontier_path, tabs_per_browser=tabs_per_browser, stop_event=stop_event
+            )
+    finally:
+        # Also on failure, so long-lived processes do not keep a stale archive handle
+        if archive:
+            archive.close()
+        if metrics.path:
+            report_metrics(metrics)
+
+def report_metrics(metrics):
+    """Aggregates a crawl's events from all processes, exports them and logs a summary."""
+    try:
+        metrics.close()
+        summary = summarize(load_events(metrics.path))
+        prom_path = os.path.splitext(metrics.path)[0] + ".prom"
+        write_prometheus(summary, prom_path)
+        logger.info(f"[METRICS] Events: {metrics.path} | Prometheus: {prom_path}")
+        for line in format_report(summary).splitlines():
+            logger.info(f"[METRICS] {line}")
+        return summary
+    except Exception as e:
+        logger.warning(f"[METRICS_FAIL] Could not build crawl report: {e}")
+        return None
+
+def _crawl_website(
+    base_url, *, output_dir, max_pages, max_threads, max_processes, respect_robots, proxy_list,
+    save_text, show_progress, save_screenshot_on_fail, lang, min_content_length, store_path,
+    run_id, on_page, archive_dir, archive_mode, metrics, browser_memory_mb, pin_proxy_per_domain,
+    frontier_path, tabs_per_browser, stop_event
+):
     logger.info(f"[CRAWL_START] Base URL: {base_url}")
-    logger.info(f"[CRAWL_CONFIG] max_pages={max_pages}, max_processes={max_processes}, min_content_length={min_content_length}")
+    logger.info(f"[CRAWL_CONFIG] max_pages={max_pages}, max_processes={max_processes}, tabs_per_browser={tabs_per_browser}, "
+                f"min_content_length={min_content_length}")
     
     os.makedirs(output_dir, exist_ok=True)
+    archive = get_archive(archive_dir, archive_mode)
+    if archive:
+        logger.info(f"[ARCHIVE] Mode: {archive_mode}, directory: {archive_dir}")
+    
+    # Failure artifacts are grouped by run; workers write them in the background
+    artifacts = None
+    if save_screenshot_on_fail:
+        artifact_run = run_id or f"{urlparse(base_url).netloc}-{time.strftime('%Y%m%dT%H%M%S')}"
+        artifacts = FailureArtifacts(os.path.join(output_dir, "artifacts"), run_id=artifact_run)
+    
+    # Discovery requests and browser sessions share one pool, so proxy health carries over
+    proxy_pool = ProxyPool(proxy_list, pin_domains=pin_proxy_per_domain) if proxy_list else None
+    if proxy_pool:
+        logger.info(f"[PROXY] Spreading traffic over {len(proxy_pool)} proxies")
     
     # Step 1: Link Discovery
     try:
         logger.info(f"[LINK_DISCOVERY] Starting link discovery for {base_url}")
-        links, errors = discover_internal_links(
-            start_url=base_url,
-            max_pages=max_pages,
-            max_threads=max_threads,
-            respect_robots=respect_robots
-        )
+        with metrics.span("discovery", url=base_url) as span:
+            links, errors = discover_internal_links(
+                start_url=base_url,
+                max_pages=max_pages,
+                max_threads=max_threads,
+                respect_robots=respect_robots,
+                archive=archive,
+                metrics=metrics,
+                proxy_pool=proxy_pool,
+                frontier_path=frontier_path
+            )
+            span["pages"] = len(links)
         
         logger.info(f"[LINK_DISCOVERY] Found {len(links)} links, {len(errors)} errors")
         
@@ -64,25 +155,32 @@ def crawl_website(
         logger.warning(f"[LINK_DISCOVERY] No links found, trying base URL directly")
         links = [base_url]
     
+    if stop_event is not None and stop_event.is_set():
+        raise StopRequested("stopped after link discovery")
     logger.info(f"[EXTRACTION_START] Processing {len(links)} URLs")
     
     # Step 2: Text Extraction
-    proxy = proxy_list[0] if proxy_list and len(proxy_list) > 0 else None
-    if proxy:
-        logger.info(f"[EXTRACTION] Using proxy: {proxy}")
-    
     try:
-        url_text_map = extract_texts_from_urls(
-            urls=links,
-            max_workers=max_processes,
-            proxy=proxy,
-            headless=True,
-            show_progress=show_progress,
-            save_screenshot_on_fail=save_screenshot_on_fail,
-            lang=lang,
-            min_content_length=min_content_length,
-            cookie_handler=handle_cookie_consent
-        )
+        with metrics.span("extraction", url=base_url, urls=len(links)):
+            url_text_map = extract_texts_from_urls(
+                urls=links,
+                max_workers=max_processes,
+                headless=True,
+                show_progress=show_progress,
+                save_screenshot_on_fail=save_screenshot_on_fail,
+                lang=lang,
+                min_content_length=min_content_length,
+                cookie_handler=handle_cookie_consent,
+                on_result=on_page,
+                archive_dir=archive_dir,
+                archive_mode=archive_mode,
+                metrics_config=metrics.config(),
+                browser_memory_mb=browser_memory_mb,
+                proxy_pool=proxy_pool,
+                tabs_per_browser=tabs_per_browser,
+                artifacts_config=artifacts.config() if artifacts else None,
+                stop_event=stop_event
+            )
         
         # Analyze results
         successful_extractions = {url: text for url, text in url_text_map.items() if text.strip()}
@@ -98,37 +196,15 @@ def crawl_website(
             for url, text in successful_extractions.items():
                 logger.info(f"[EXTRACTION_SUCCESS] {url}: {len(text)} characters")
         
-        # If all extractions failed, provide detailed error info
         if not successful_extractions:
-            logger.error(f"[EXTRACTION_TOTAL_FAIL] All extractions failed!")
+            logger.error(f"[EXTRACTION_TOTAL_FAIL] All extractions failed after retries!")
             logger.error(f"[EXTRACTION_TOTAL_FAIL] URLs attempted: {links}")
-            
-            # Try a single URL with detailed debugging
-            if links:
-                test_url = links[0]
-                logger.info(f"[DEBUG_EXTRACTION] Testing single URL: {test_url}")
-                
-                # Import directly for debugging
-                from extractor.crawl.text_extractor import extract_text_from_url
-                try:
-                    debug_url, debug_text = extract_text_from_url(
-                        test_url,
-                        headless=False,  # Use non-headless for debugging
-                        save_screenshot_on_fail=True,
-                        min_content_length=min_content_length,
-                        lang=lang
-                    )
-                    logger.info(f"[DEBUG_EXTRACTION] Result: {len(debug_text)} characters")
-                    if debug_text:
-                        successful_extractions[debug_url] = debug_text
-                except Exception as e:
-                    logger.error(f"[DEBUG_EXTRACTION] Failed: {e}")
-                    import traceback
-                    traceback.print_exc()
         
         # Use successful extractions for further processing
         url_text_map = successful_extractions
         
+    except StopRequested:
+        raise
     except Exception as e:
         logger.error(f"[EXTRACTION_ERROR] Failed during text extraction: {e}")
         import traceback
@@ -137,15 +213,25 @@ def crawl_website(
     
     # Step 3: Save Output
     if save_text and url_text_map:
-        logger.info(f"[SAVE_START] Saving {len(url_text_map)} files")
-        for url, content in url_text_map.items():
-            try:
-                filename = sanitize_filename(url) + ".txt"
-                path = os.path.join(output_dir, filename)
-                save_text_to_file(content, path)
-                logger.info(f"[SAVE_SUCCESS] {filename}: {len(content)} characters")
-            except Exception as e:
-                logger.warning(f"[SAVE_FAIL] Could not save {url}: {e}")
+        store_path = store_path or os.path.join(output_dir, STORE_FILENAME)
+        logger.info(f"[SAVE_START] Saving {len(url_text_map)} pages to {store_path}")
+        try:
+            with metrics.span("save", url=base_url), CrawlStore(store_path) as store:
+                run_id = store.start_run(base_url, run_id=run_id)
+                store.add_pages(run_id, url_text_map)
+            logger.info(f"[SAVE_SUCCESS] Run {run_id}: {len(url_text_map)} pages")
+        except Exception as e:
+            logger.warning(f"[SAVE_FAIL] Could not save crawl results to {store_path}: {e}")
+    
+    if artifacts:
+        entries = load_index(artifacts.directory, artifacts.run_id)
+        if entries:
+            logger.info(f"[ARTIFACTS] {len(entries)} failure artifacts in {artifacts.run_dir}")
+    
+    if proxy_pool:
+        for s in proxy_pool.stats():
+            logger.info(f"[PROXY] {s['proxy']}: {s['requests']} requests, errors {s['error_rate']:.0%}, "
+                        f"blocks {s['block_rate']:.0%}, latency {s['latency_s'] or 0:.2f}s")
     
     logger.info(f"[CRAWL_COMPLETE] Returned {len(url_text_map)} extracted texts")
     return url_text_map
@@ -0,0 +1,216 @@
+# extractor/crawl/frontier.py
+import os
+import math
+import sqlite3
+import hashlib
+import logging
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+QUEUED, IN_PROGRESS, DONE, FAILED, SKIPPED = 0, 1, 2, 3, 4
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS frontier (
+    id        INTEGER PRIMARY KEY AUTOINCREMENT,
+    url_hash  INTEGER NOT NULL UNIQUE,
+    url       TEXT NOT NULL,
+    depth     INTEGER NOT NULL,
+    state     INTEGER NOT NULL,
+    error     TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_frontier_state ON frontier (state, id);
+CREATE TABLE IF NOT EXISTS meta (
+    key    TEXT PRIMARY KEY,
+    value  BLOB
+);
+"""
+
+
+def _hash_pair(url):
+    digest = hashlib.blake2b(url.encode("utf-8"), digest_size=16).digest()
+    return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little")
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter (double hashing over one blake2b digest).
+    Memory is set by capacity and error_rate, not by how many items are added:
+    1M URLs at a 1e-5 false-positive rate take about 3 MB.
+    """
+
+    def __init__(self, capacity, error_rate=1e-5, bits=None):
+        capacity = max(int(capacity), 1)
+        self.size = bits or max(64, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.array = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        h1, h2 = _hash_pair(item)
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, item):
+        for pos in self._positions(item):
+            self.array[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item):
+        return all(self.array[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+    def to_bytes(self):
+        return self.size.to_bytes(8, "little") + self.hashes.to_bytes(2, "little") + bytes(self.array)
+
+    @classmethod
+    def from_bytes(cls, data):
+        bloom = cls.__new__(cls)
+        bloom.size = int.from_bytes(data[:8], "little")
+        bloom.hashes = int.from_bytes(data[8:10], "little")
+        bloom.array = bytearray(data[10:])
+        return bloom
+
+
+class CrawlFrontier:
+    """
+    Disk-backed URL frontier for link discovery.
+    - Queue and per-URL state (queued / in progress / done / failed) live in SQLite,
+      so memory stays flat however many pages a site has.
+    - Seen URLs are tracked in an in-memory Bloom filter sized from capacity, backed by a
+      UNIQUE 64-bit URL hash in the table. A Bloom false positive skips a URL (rate ~error_rate).
+    - With a path, the frontier survives the process: reopening it resets in-progress URLs
+      to queued and discovery continues where it stopped. Without one, a temporary file is used.
+    """
+
+    def __init__(self, path=None, capacity=100_000, error_rate=1e-5, checkpoint_every=500):
+        self.temporary = path is None
+        if self.temporary:
+            fd, path = tempfile.mkstemp(prefix="frontier-", suffix=".sqlite")
+            os.close(fd)
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+        self.checkpoint_every = checkpoint_every
+        self._pending_writes = 0
+
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'bloom'").fetchone()
+        self.bloom = BloomFilter.from_bytes(row[0]) if row else BloomFilter(capacity, error_rate)
+        if row:
+            # URLs queued after the last Bloom snapshot are only in the table
+            for (url,) in self.conn.execute("SELECT url FROM frontier WHERE id > ?", (self._meta_int("bloom_last_id"),)):
+                self.bloom.add(url)
+        resumed = self.conn.execute(
+            "UPDATE frontier SET state = ? WHERE state = ?", (QUEUED, IN_PROGRESS)
+        ).rowcount
+        self.conn.commit()
+        self._total = self.conn.execute("SELECT COUNT(*) FROM frontier").fetchone()[0]
+        if row:
+            counts = self.counts()
+            logger.info(f"[FRONTIER] Resumed {path}: {counts['done']} done, {counts['queued']} queued "
+                        f"({resumed} were in progress)")
+
+    def _meta_int(self, key, default=0):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return int(row[0]) if row else default
+
+    def get_meta(self, key):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    # ---------- Queue ----------
+    def add(self, urls, depth=0, limit=None):
+        """
+        Queues unseen URLs; returns how many were added.
+        limit caps the total number of URLs ever queued (the crawl's max_pages).
+        """
+        added = 0
+        for url in urls:
+            if limit is not None and self._total >= limit:
+                break
+            if url in self.bloom:
+                continue
+            self.bloom.add(url)
+            h1, _ = _hash_pair(url)
+            cur = self.conn.execute(
+                "INSERT OR IGNORE INTO frontier (url_hash, url, depth, state) VALUES (?, ?, ?, ?)",
+                (h1 - (1 << 63), url, depth, QUEUED),
+            )
+            added += cur.rowcount
+            self._total += cur.rowcount
+        self._wrote(added)
+        return added
+
+    def pop(self, n):
+        """Takes up to n queued URLs in FIFO order and marks them in progress; returns [(url, depth)]."""
+        rows = self.conn.execute(
+            "SELECT id, url, depth FROM frontier WHERE state = ? ORDER BY id LIMIT ?", (QUEUED, n)
+        ).fetchall()
+        self.conn.executemany("UPDATE frontier SET state = ? WHERE id = ?", [(IN_PROGRESS, r[0]) for r in rows])
+        self._wrote(len(rows))
+        return [(url, depth) for _, url, depth in rows]
+
+    def mark(self, url, state=DONE, error=None):
+        """Records the outcome of an in-progress URL: DONE, FAILED or SKIPPED."""
+        h1, _ = _hash_pair(url)
+        self.conn.execute("UPDATE frontier SET state = ?, error = ? WHERE url_hash = ?", (state, error, h1 - (1 << 63)))
+        self._wrote(1)
+
+    def _wrote(self, n):
+        self._pending_writes += n
+        if self._pending_writes >= self.checkpoint_every:
+            self.checkpoint()
+
+    def checkpoint(self):
+        """Commits queue changes and snapshots the Bloom filter, so a restart loses little work."""
+        last_id = self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM frontier").fetchone()[0]
+        self.set_meta("bloom", sqlite3.Binary(self.bloom.to_bytes()))
+        self.set_meta("bloom_last_id", last_id)
+        self.conn.commit()
+        self._pending_writes = 0
+
+    # ---------- Reporting ----------
+    def counts(self):
+        counts = dict(self.conn.execute("SELECT state, COUNT(*) FROM frontier GROUP BY state").fetchall())
+        return {
+            "queued": counts.get(QUEUED, 0),
+            "in_progress": counts.get(IN_PROGRESS, 0),
+            "done": counts.get(DONE, 0),
+            "failed": counts.get(FAILED, 0),
+            "skipped": counts.get(SKIPPED, 0),
+        }
+
+    def total(self):
+        """URLs ever queued, in any state."""
+        return self._total
+
+    def iter_urls(self, state=DONE):
+        for (url,) in self.conn.execute("SELECT url FROM frontier WHERE state = ? ORDER BY id", (state,)):
+            yield url
+
+    def errors(self):
+        return self.conn.execute("SELECT url, error FROM frontier WHERE state = ? ORDER BY id", (FAILED,)).fetchall()
+
+    def close(self):
+        if self.conn is None:
+            return
+        if self.temporary:
+            self.conn.close()
+            for suffix in ("", "-wal", "-shm"):
+                try:
+                    os.remove(self.path + suffix)
+                except OSError:
+                    pass
+        else:
+            self.checkpoint()
+            self.conn.close()
+        self.conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
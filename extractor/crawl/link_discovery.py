@@ -1,13 +1,17 @@
 # extractor/crawl/link_discovery.py
-import requests
-from bs4 import BeautifulSoup
 from urllib.parse import urljoin, urlparse, urlunparse, parse_qsl, urlencode
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from functools import lru_cache
+from html import unescape
+import codecs
 import logging
 import re
 import time
 import random
-from urllib.robotparser import RobotFileParser
+from extractor.crawl.archive import RECORD, REPLAY, RESPONSE
+from extractor.crawl.metrics import NULL_METRICS
+from extractor.crawl.frontier import CrawlFrontier, DONE, FAILED, SKIPPED
+from extractor.crawl.proxy_pool import OK, ERROR, BLOCKED, requests_proxies
 
 logger = logging.getLogger(__name__)
 
@@ -18,12 +22,27 @@ HEADERS = {
                   "(KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36"
 }
 
+# Discovery only needs the links: bodies are streamed and cut off at this size
+MAX_DISCOVERY_BYTES = 2 * 1024 * 1024
+_CHUNK_SIZE = 64 * 1024
+
+# One pass over the raw bytes: comments, script and style blocks are consumed whole
+# (links inside them are not real anchors), <a> and <link> tags yield their attributes.
+_TAG_RE = re.compile(
+    rb'<!--.*?-->|<(script|style)\b.*?</\1\s*>|<(a|link)\s((?:"[^"]*"|\'[^\']*\'|[^\'">])*)>',
+    re.IGNORECASE | re.DOTALL,
+)
+_ATTR_RE = re.compile(rb'([^\s=/>"\']+)\s*(?:=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+)))?')
+_CHARSET_RE = re.compile(r'charset=["\']?([\w.:-]+)', re.IGNORECASE)
+
+@lru_cache(maxsize=65536)
 def is_valid_url(href, domain):
     if not href or href.startswith(('mailto:', 'tel:')):
         return False
     parsed = urlparse(href)
     return (parsed.netloc == '' or parsed.netloc == domain) and not href.lower().endswith(EXCLUDED_EXTENSIONS)
 
+@lru_cache(maxsize=65536)
 def normalize_url(href, base_url):
     href = href.strip().split('#')[0]
     abs_url = urljoin(base_url, href)
@@ -33,11 +52,66 @@ def normalize_url(href, base_url):
     normalized = urlunparse((parsed.scheme, parsed.netloc, path, '', query, ''))
     return normalized
 
-def get_canonical_url(soup, url):
-    tag = soup.find('link', rel='canonical')
-    if tag and tag.get('href'):
-        return urljoin(url, tag['href'])
-    return url
+def _attributes(raw):
+    attrs = {}
+    for m in _ATTR_RE.finditer(raw):
+        name = m.group(1).lower()
+        if name not in attrs:
+            value = m.group(2) if m.group(2) is not None else m.group(3) if m.group(3) is not None else m.group(4)
+            attrs[name] = value
+    return attrs
+
+def scan_links(body, encoding="utf-8"):
+    """
+    Finds link targets in raw HTML bytes without building a document tree.
+    Returns (canonical href or None, set of <a href> values), entity-decoded.
+    """
+    canonical = None
+    hrefs = set()
+    for m in _TAG_RE.finditer(body):
+        tag = m.group(2)
+        if tag is None:
+            continue
+        attrs = _attributes(m.group(3))
+        href = attrs.get(b'href')
+        if href is None:
+            continue
+        href = unescape(href.decode(encoding, errors="replace"))
+        if tag.lower() == b'a':
+            hrefs.add(href)
+        elif canonical is None and b'canonical' in (attrs.get(b'rel') or b'').lower().split() and href:
+            canonical = href
+    return canonical, hrefs
+
+def _charset(content_type):
+    match = _CHARSET_RE.search(content_type)
+    if match:
+        try:
+            return codecs.lookup(match.group(1)).name
+        except LookupError:
+            pass
+    return "utf-8"
+
+def _origin(url):
+    parsed = urlparse(url)
+    return f"{parsed.scheme}://{parsed.netloc}"
+
+def resolve_links(hrefs, base_url, domain):
+    """
+    Normalizes hrefs against base_url and keeps the internal ones.
+    Root-relative and absolute hrefs resolve the same from any page of the site, so they
+    are joined against the origin: menu links repeated on every page then hit the
+    normalize_url cache instead of being parsed again for each page.
+    """
+    origin = _origin(base_url)
+    links = set()
+    for href in hrefs:
+        stripped = href.strip()
+        independent = (stripped.startswith('/') and not stripped.startswith('//')) or '://' in stripped[:12]
+        full_url = normalize_url(href, origin if independent else base_url)
+        if is_valid_url(full_url, domain):
+            links.add(full_url)
+    return links
 
 def robots_txt_allows(url, rp):
     try:
@@ -45,18 +119,21 @@ def robots_txt_allows(url, rp):
     except Exception:
         return True
 
-def discover_internal_links(start_url, max_pages=20, max_threads=10, respect_robots=False):
+def discover_internal_links(start_url, max_pages=20, max_threads=10, respect_robots=False, delay_range=(0.5, 1.5), archive=None, metrics=NULL_METRICS, proxy_pool=None, frontier_path=None):
+    """
+    Breadth-first discovery of up to max_pages internal pages.
+    The queue and seen-set are disk-backed (CrawlFrontier), so memory stays flat on very
+    large sites. With frontier_path the discovery state is kept in that file and a rerun
+    with the same path resumes it. Returns (discovered URLs, [(url, error)]).
+    """
     parsed = urlparse(start_url)
     domain = parsed.netloc
-    visited = set()
-    to_visit = [normalize_url(start_url, start_url)]
-    all_discovered = []
-    error_stats = []
 
     # robots.txt setup
     rp = None
-    if respect_robots:
+    if respect_robots and not (archive and archive.mode == REPLAY):
         try:
+            from urllib.robotparser import RobotFileParser
             rp = RobotFileParser()
             rp.set_url(f"{parsed.scheme}://{domain}/robots.txt")
             rp.read()
@@ -64,47 +141,139 @@ def discover_internal_links(start_url, max_pages=20, max_threads=10, respect_rob
             logger.warning(f"[ROBOTS] Failed to read robots.txt: {e}")
             rp = None
 
-    with ThreadPoolExecutor(max_workers=max_threads) as executor:
-        while to_visit and len(visited) < max_pages:
-            futures = {
-                executor.submit(extract_links_from_page, url, domain): url
-                for url in to_visit
-                if url not in visited and (not respect_robots or robots_txt_allows(url, rp))
-            }
-            to_visit = []
-            for future in as_completed(futures):
-                base_url = futures[future]
-                visited.add(base_url)
-                try:
-                    new_links = future.result()
-                    for link in new_links:
-                        if link not in visited and link not in to_visit and len(visited) + len(to_visit) < max_pages:
-                            to_visit.append(link)
-                    all_discovered.append(base_url)
-                except Exception as e:
-                    logger.warning(f"[THREAD_ERROR] Failed on {base_url}: {e}")
-                    error_stats.append((base_url, str(e)))
+    frontier = CrawlFrontier(frontier_path, capacity=max(max_pages, 1000) * 2)
+    try:
+        start = normalize_url(start_url, start_url)
+        previous = frontier.get_meta("start_url")
+        if previous and previous != start:
+            logger.warning(f"[FRONTIER] {frontier_path} was started for {previous}, not {start}")
+        frontier.set_meta("start_url", start)
+        frontier.add([start], limit=max_pages)
+
+        # Keep a bounded number of fetches in flight; the rest of the queue stays on disk
+        in_flight = {}
+        window = max_threads * 2
+        with ThreadPoolExecutor(max_workers=max_threads) as executor:
+            while True:
+                while len(in_flight) < window:
+                    batch = frontier.pop(window - len(in_flight))
+                    if not batch:
+                        break
+                    for url, depth in batch:
+                        if rp and not robots_txt_allows(url, rp):
+                            frontier.mark(url, SKIPPED, "disallowed by robots.txt")
+                            continue
+                        future = executor.submit(extract_links_from_page, url, domain, delay_range=delay_range,
+                                                 archive=archive, metrics=metrics, proxy_pool=proxy_pool)
+                        in_flight[future] = (url, depth)
+                if not in_flight:
+                    break
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    url, depth = in_flight.pop(future)
+                    try:
+                        new_links = future.result()
+                        frontier.mark(url, DONE)
+                        frontier.add(new_links, depth + 1, limit=max_pages)
+                    except Exception as e:
+                        logger.warning(f"[THREAD_ERROR] Failed on {url}: {e}")
+                        frontier.mark(url, FAILED, str(e))
+
+        all_discovered = list(frontier.iter_urls(DONE))
+        error_stats = frontier.errors()
+    finally:
+        frontier.close()
 
     logger.info(f"[LINK_DISCOVERY] {len(all_discovered)} pages discovered. {len(error_stats)} errors.")
-    return list(set(all_discovered)), error_stats
+    return all_discovered, error_stats
+
+def fetch_page(url, archive=None, metrics=NULL_METRICS, proxy_pool=None, max_bytes=MAX_DISCOVERY_BYTES):
+    """
+    Returns (content_type, body bytes, encoding) for a discovery fetch.
+    The body is streamed: non-HTML responses are closed after the headers (empty body) and
+    HTML is read up to max_bytes, so a huge page costs at most that much.
+    In replay mode the response comes from the archive; in record mode it is archived.
+    With a proxy_pool, the request goes through the pool's pick and its outcome is reported back.
+    """
+    if archive and archive.mode == REPLAY:
+        record = archive.get(RESPONSE, url)
+        if record is None:
+            raise LookupError("not in archive")
+        meta, body = record
+        return meta.get("content_type", ""), body, meta.get("encoding") or "utf-8"
+
+    import requests
+
+    proxy = proxy_pool.acquire(urlparse(url).netloc) if proxy_pool else None
+    start = time.perf_counter()
+    try:
+        response = requests.get(url, headers=HEADERS, timeout=10, proxies=requests_proxies(proxy), stream=True)
+    except Exception:
+        if proxy_pool:
+            proxy_pool.release(proxy, ERROR)
+        raise
+    with response:
+        if proxy_pool:
+            status = response.status_code
+            outcome = BLOCKED if status in (403, 429) else ERROR if status >= 500 else OK
+            proxy_pool.release(proxy, outcome, time.perf_counter() - start)
+        content_type = response.headers.get('Content-Type', '')
+        encoding = _charset(content_type)
+        body = b""
+        truncated = False
+        if 'text/html' in content_type:
+            declared = response.headers.get('Content-Length', '')
+            if declared.isdigit() and int(declared) > max_bytes:
+                logger.info(f"[LINKS] {url}: {int(declared)} bytes, reading the first {max_bytes}")
+            chunks, size = [], 0
+            for chunk in response.iter_content(_CHUNK_SIZE):
+                chunks.append(chunk)
+                size += len(chunk)
+                if size >= max_bytes:
+                    truncated = True
+                    break
+            body = b"".join(chunks)[:max_bytes]
+        else:
+            metrics.count("discovery_skipped_non_html", url=url)
+        if truncated:
+            metrics.count("discovery_truncated", url=url)
+    metrics.count("discovery_bytes", len(body), url=url)
+    if archive and archive.mode == RECORD:
+        archive.record(RESPONSE, url, body, {
+            "status": response.status_code,
+            "content_type": content_type,
+            "encoding": encoding,
+            "final_url": response.url,
+            "truncated": truncated,
+        })
+    return content_type, body, encoding
 
-def extract_links_from_page(url, domain, retries=2, delay_range=(0.5, 1.5)):
+def extract_links_from_page(url, domain, retries=2, delay_range=(0.5, 1.5), archive=None, metrics=NULL_METRICS, proxy_pool=None):
+    replay = archive is not None and archive.mode == REPLAY
     for attempt in range(retries):
+        if attempt:
+            metrics.count("discovery_retries", url=url)
         try:
-            response = requests.get(url, headers=HEADERS, timeout=10)
-            if 'text/html' not in response.headers.get('Content-Type', ''):
+            with metrics.span("discovery_fetch", url=url):
+                content_type, body, encoding = fetch_page(url, archive, metrics, proxy_pool)
+            if 'text/html' not in content_type:
                 return []
-            soup = BeautifulSoup(response.text, 'html.parser')
-            canonical_url = get_canonical_url(soup, url)
-            links = set()
-            for tag in soup.find_all('a', href=True):
-                full_url = normalize_url(tag['href'], canonical_url)
-                if is_valid_url(full_url, domain):
-                    links.add(full_url)
+            with metrics.span("discovery_parse", url=url) as span:
+                canonical, hrefs = scan_links(body, encoding)
+                canonical_url = urljoin(url, canonical) if canonical else url
+                links = resolve_links(hrefs, canonical_url, domain)
+                span["links"] = len(links)
             logger.info(f"[LINKS] {url}: {len(links)} links found")
-            time.sleep(random.uniform(*delay_range))
+            if not replay:
+                time.sleep(random.uniform(*delay_range))
             return list(links)
+        except LookupError:
+            logger.warning(f"[REPLAY_MISS] {url}: no archived response")
+            metrics.failure("discovery", url, "replay_miss")
+            return []
         except Exception as e:
             logger.warning(f"[DISCOVERY_FAIL] {url} (attempt {attempt+1}): {e}")
+            if attempt + 1 >= retries:
+                metrics.failure("discovery", url, type(e).__name__)
             time.sleep(2 ** attempt + random.uniform(0, 1))
     return []
@@ -0,0 +1,262 @@
+# extractor/crawl/metrics.py
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds in seconds (Prometheus "le" labels)
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+class CrawlMetrics:
+    """
+    Structured per-URL, per-stage instrumentation for a crawl.
+    - span(stage, url) times a block and records success or the failure reason.
+    - count(name, value, url) records counters such as bytes fetched or retries.
+    - Events are appended as JSON lines, one file shared by all processes of a crawl
+      (each line is a single small write, so concurrent appends do not interleave).
+    - Optional per-stage cProfile dumps and tracemalloc peak memory.
+    """
+
+    def __init__(self, path=None, profile_stages=(), trace_memory=False):
+        self.path = path
+        self.profile_stages = set(profile_stages or ())
+        self.trace_memory = trace_memory
+        self.lock = threading.Lock()
+        self._file = None
+        self._profiles = 0
+        self._peaks = {}
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if trace_memory:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+
+    def config(self):
+        """Picklable settings, passed to worker processes to rebuild their own instance."""
+        return {"path": self.path, "profile_stages": sorted(self.profile_stages), "trace_memory": self.trace_memory}
+
+    def _emit(self, event):
+        if not self.path:
+            return
+        event["pid"] = os.getpid()
+        event["ts"] = time.time()
+        line = json.dumps(event, default=str) + "\n"
+        try:
+            with self.lock:
+                if self._file is None:
+                    self._file = open(self.path, "a", encoding="utf-8", buffering=1)
+                self._file.write(line)
+        except Exception as e:
+            logger.debug(f"[METRICS] Could not write event: {e}")
+
+    def count(self, name, value=1, url=None, **labels):
+        self._emit({"type": "counter", "name": name, "value": value, "url": url, **labels})
+
+    def failure(self, stage, url, reason):
+        self._emit({"type": "failure", "stage": stage, "url": url, "reason": reason})
+
+    @contextmanager
+    def span(self, stage, url=None, **attrs):
+        """
+        Times the enclosed block as one stage of one URL.
+        The yielded dict can be filled with extra attributes (e.g. bytes) before the block ends.
+        """
+        extra = dict(attrs)
+        profiler = None
+        if stage in self.profile_stages:
+            import cProfile
+            profiler = cProfile.Profile()
+        if self.trace_memory:
+            import tracemalloc
+            token = object()
+            with self.lock:
+                self._fold_peaks()
+                tracemalloc.reset_peak()
+                mem_start = tracemalloc.get_traced_memory()[0]
+                self._peaks[token] = mem_start
+
+        ok, error = True, None
+        start = time.perf_counter()
+        if profiler:
+            profiler.enable()
+        try:
+            yield extra
+        except BaseException as e:
+            ok, error = False, type(e).__name__
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            if profiler:
+                profiler.disable()
+                self._dump_profile(stage, profiler)
+            if self.trace_memory:
+                with self.lock:
+                    self._fold_peaks()
+                    extra["peak_alloc_bytes"] = self._peaks.pop(token) - mem_start
+            self._emit({"type": "span", "stage": stage, "url": url, "duration_s": duration,
+                        "ok": ok and not extra.pop("failed", False), "error": error, **extra})
+
+    def _fold_peaks(self):
+        # tracemalloc keeps one process-wide peak and every span entry resets it, so the peak
+        # so far is folded into all open spans first (nested, threaded or interleaved in tabs)
+        import tracemalloc
+        peak = tracemalloc.get_traced_memory()[1]
+        for token, value in self._peaks.items():
+            if peak > value:
+                self._peaks[token] = peak
+
+    def _dump_profile(self, stage, profiler):
+        if not self.path:
+            return
+        profile_dir = os.path.join(os.path.dirname(os.path.abspath(self.path)), "profiles")
+        os.makedirs(profile_dir, exist_ok=True)
+        with self.lock:
+            self._profiles += 1
+            n = self._profiles
+        profiler.dump_stats(os.path.join(profile_dir, f"{stage}-{os.getpid()}-{n}.prof"))
+
+    def close(self):
+        with self.lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+
+class _NullMetrics(CrawlMetrics):
+    """Drop-in used when instrumentation is off."""
+
+    def __init__(self):
+        super().__init__(path=None)
+
+    @contextmanager
+    def span(self, stage, url=None, **attrs):
+        yield dict(attrs)
+
+
+NULL_METRICS = _NullMetrics()
+
+_instances = {}
+
+
+def get_metrics(config=None):
+    """
+    Per-process CrawlMetrics for a config from CrawlMetrics.config(), or a no-op instance.
+    Keyed by PID so forked pool workers open their own file handle.
+    """
+    if not config or not config.get("path"):
+        return NULL_METRICS
+    key = (os.path.abspath(config["path"]), os.getpid())
+    if key not in _instances:
+        _instances[key] = CrawlMetrics(**config)
+    return _instances[key]
+
+
+# ---------- Aggregation and export ----------
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = (len(values) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def load_events(path):
+    events = []
+    if not path or not os.path.exists(path):
+        return events
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                events.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return events
+
+
+def summarize(events):
+    """Aggregates events into per-stage duration stats, counter totals and failure reasons."""
+    stages = {}
+    counters = {}
+    failures = {}
+    for event in events:
+        kind = event.get("type")
+        if kind == "span":
+            s = stages.setdefault(event["stage"], {"durations": [], "errors": 0})
+            s["durations"].append(event["duration_s"])
+            if not event.get("ok", True):
+                s["errors"] += 1
+        elif kind == "counter":
+            counters[event["name"]] = counters.get(event["name"], 0) + event.get("value", 0)
+        elif kind == "failure":
+            key = (event["stage"], event["reason"])
+            failures[key] = failures.get(key, 0) + 1
+
+    summary = {"stages": {}, "counters": counters,
+               "failures": [{"stage": s, "reason": r, "count": n} for (s, r), n in sorted(failures.items())]}
+    for stage, s in stages.items():
+        durations = s["durations"]
+        summary["stages"][stage] = {
+            "count": len(durations),
+            "errors": s["errors"],
+            "total_s": sum(durations),
+            "p50_s": _percentile(durations, 0.5),
+            "p95_s": _percentile(durations, 0.95),
+            "max_s": max(durations),
+            "buckets": [sum(1 for d in durations if d <= le) for le in DURATION_BUCKETS],
+        }
+    return summary
+
+
+def write_prometheus(summary, path, labels=None):
+    """Writes the summary in the Prometheus textfile-collector format."""
+    label_str = ",".join(f'{k}="{v}"' for k, v in (labels or {}).items())
+
+    def _labels(**extra):
+        parts = [label_str] if label_str else []
+        parts += [f'{k}="{v}"' for k, v in extra.items()]
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    lines = [
+        "# HELP crawl_stage_duration_seconds Time spent per crawl stage.",
+        "# TYPE crawl_stage_duration_seconds histogram",
+    ]
+    for stage, s in sorted(summary["stages"].items()):
+        for le, n in zip(DURATION_BUCKETS, s["buckets"]):
+            lines.append(f"crawl_stage_duration_seconds_bucket{_labels(stage=stage, le=le)} {n}")
+        lines.append(f"crawl_stage_duration_seconds_bucket{_labels(stage=stage, le='+Inf')} {s['count']}")
+        lines.append(f"crawl_stage_duration_seconds_sum{_labels(stage=stage)} {s['total_s']:.6f}")
+        lines.append(f"crawl_stage_duration_seconds_count{_labels(stage=stage)} {s['count']}")
+    lines += ["# HELP crawl_stage_errors_total Failed spans per crawl stage.", "# TYPE crawl_stage_errors_total counter"]
+    for stage, s in sorted(summary["stages"].items()):
+        lines.append(f"crawl_stage_errors_total{_labels(stage=stage)} {s['errors']}")
+    lines += ["# HELP crawl_counter_total Crawl counters such as bytes fetched and retries.", "# TYPE crawl_counter_total counter"]
+    for name, value in sorted(summary["counters"].items()):
+        lines.append(f"crawl_counter_total{_labels(name=name)} {value}")
+    lines += ["# HELP crawl_failures_total Failed URLs by stage and reason.", "# TYPE crawl_failures_total counter"]
+    for f in summary["failures"]:
+        lines.append(f"crawl_failures_total{_labels(stage=f['stage'], reason=f['reason'])} {f['count']}")
+
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp, path)
+
+
+def format_report(summary):
+    lines = [f"{'stage':<20}{'count':>7}{'errors':>8}{'total s':>10}{'p50 s':>9}{'p95 s':>9}{'max s':>9}"]
+    for stage, s in sorted(summary["stages"].items(), key=lambda kv: -kv[1]["total_s"]):
+        lines.append(f"{stage:<20}{s['count']:>7}{s['errors']:>8}{s['total_s']:>10.2f}"
+                     f"{s['p50_s']:>9.2f}{s['p95_s']:>9.2f}{s['max_s']:>9.2f}")
+    for name, value in sorted(summary["counters"].items()):
+        lines.append(f"{name}: {value}")
+    for f in summary["failures"]:
+        lines.append(f"failure {f['stage']}/{f['reason']}: {f['count']}")
+    return "\n".join(lines)
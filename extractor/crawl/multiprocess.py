@@ -1,29 +1,89 @@
 # --- extractor/crawl/multiprocess.py ---
+import time
 import logging
-import multiprocessing
 import traceback
-from tqdm import tqdm
-from extractor.crawl.text_extractor import extract_text_from_url
+from functools import partial
+from extractor.crawl.text_extractor import extract_text_with_reason
+from extractor.crawl.worker_manager import BrowserWorkerManager, StopRequested
+from extractor.crawl.retry import RetryQueue
+from extractor.crawl.metrics import get_metrics
+from extractor.crawl.artifacts import close_artifacts
+from extractor.extractors.cookie_handler import cookie_budget
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO)
 
-def init_worker():
-    import signal
-    signal.signal(signal.SIGINT, signal.SIG_IGN)
+# Per-stage allowances for the default URL deadline (seconds)
+DRIVER_START_S = 30       # Chrome + chromedriver start-up on a loaded machine
+SETTLE_S = 3              # fixed pause after the page load
+SCROLL_STEP_S = 0.5       # driver round trips per scroll, on top of scroll_pause
+DEADLINE_SLACK_S = 30
+SOFT_DEADLINE_MARGIN_S = 15  # a task gives up this long before its watchdog deadline, keeping its artifact
 
-def _safe_extract_url(args):
+def extraction_budget(timeout=20, scroll_pause=1.5, max_scrolls=15, cookie_handler=None, **_):
+    """
+    Worst-case seconds for one browser extraction with these settings, summed over its
+    stages: driver start, page load (timeout), settle, cookie handling, scrolling, and text
+    extraction plus validation (allowed another timeout).
+    """
+    budget = DRIVER_START_S + timeout + SETTLE_S + max_scrolls * (scroll_pause + SCROLL_STEP_S) + timeout
+    if cookie_handler:
+        budget += cookie_budget()
+    return budget
+
+def task_deadline(task, url_deadline=None, base_budget=None):
+    """
+    Watchdog deadline of one (url, kwargs) task. Retries rewrite kwargs (e.g. longer waits),
+    so the deadline follows them; an explicit url_deadline grows by the same extra budget.
+    """
+    budget = extraction_budget(**task[1])
+    if url_deadline is None:
+        return budget + DEADLINE_SLACK_S
+    return url_deadline + max(0, budget - base_budget)
+
+def soft_deadline(task, deadline):
+    """
+    time.time() at which a task starting now should give up on its own (see
+    extract_text_with_reason), leaving the task time to fail cleanly before the watchdog
+    stops its worker. deadline is the manager's watchdog deadline (seconds or a function of the task).
+    """
+    seconds = deadline(task) if callable(deadline) else deadline
+    if not seconds:
+        return None
+    return time.time() + seconds - min(SOFT_DEADLINE_MARGIN_S, seconds / 4)
+
+def _safe_extract_url(args, deadline=None):
     url, kwargs = args
     try:
-        # extract_text_from_url returns (url, text), we want just the text
-        _, text = extract_text_from_url(url, **kwargs)
-        return url, text
+        # Keep the requested URL as the key even if the page redirected
+        _, text, reason = extract_text_with_reason(url, deadline=soft_deadline(args, deadline), **kwargs)
+        return url, text, reason
     except Exception as e:
         logger.error(f"[WORKER_ERROR] {url}: {e}")
         traceback.print_exc()
-        return url, ""
+        return url, "", type(e).__name__
 
-def extract_texts_from_urls(
+async def _safe_extract_in_tab(args, tabs, deadline=None):
+    from extractor.crawl.tabs import extract_text_in_tab, get_tab_session
+
+    url, kwargs = args
+    try:
+        _, text, reason = await extract_text_in_tab(get_tab_session(tabs), url,
+                                                    deadline=soft_deadline(args, deadline), **kwargs)
+        return url, text, reason
+    except Exception as e:
+        logger.error(f"[WORKER_ERROR] {url}: {e}")
+        traceback.print_exc()
+        return url, "", type(e).__name__
+
+def _worker_exit():
+    # Flush queued failure artifacts first: quitting a browser that stopped answering can hang
+    # until the worker is killed. Then quit a shared multi-tab browser.
+    from extractor.crawl.tabs import close_tab_sessions
+
+    close_artifacts()
+    close_tab_sessions()
+
+def iter_extracted_texts(
     urls,
     headless=True,
     proxy=None,
@@ -35,14 +95,43 @@ def extract_texts_from_urls(
     save_screenshot_on_fail=False,
     cookie_handler=None,
     show_progress=True,
-    max_workers=None  # Add this parameter
+    max_workers=None,
+    archive_dir=None,
+    archive_mode=None,
+    metrics_config=None,
+    browser_memory_mb=None,
+    url_deadline=None,
+    retry=True,
+    proxy_pool=None,
+    tabs_per_browser=1,
+    artifacts_config=None,
+    stop_event=None
 ):
-    logger.info(f"[MULTIPROCESS_START] Processing {len(urls)} URLs")
-    
+    """
+    Yields (url, text) as soon as each page finishes, in completion order.
+    Failed pages are yielded with an empty string.
+    max_workers is an upper bound; the actual browser count follows available memory.
+    browser_memory_mb caps each browser (Chrome flags, and the worker is killed above it).
+    url_deadline is the total wall-clock budget per URL; a worker still busy after it is
+    killed with its browser and replaced. Defaults to extraction_budget() of the settings
+    (every stage, cookie handling included) plus DEADLINE_SLACK_S, computed per task so
+    retries with longer waits get a longer deadline (see task_deadline). Each task gives up
+    SOFT_DEADLINE_MARGIN_S before it, so the URL fails with its failure artifact instead of being killed.
+    With retry, failures are classified and re-queued with per-class backoff and a fallback
+    strategy (longer waits, another proxy, or the static HTTP tier); retries
+    run alongside the remaining URLs and only the final attempt is yielded.
+    With a ProxyPool, every page gets its proxy from the pool (proxy is ignored).
+    tabs_per_browser > 1 renders that many pages at once in each browser, one per tab,
+    so page loads and scroll pauses overlap and Chrome's startup and base memory are
+    shared; max_workers then bounds browsers, and browser_memory_mb is the budget per tab.
+    save_screenshot_on_fail captures sampled failure artifacts under artifacts_config
+    (FailureArtifacts.config()), written by a background thread in each worker.
+    Setting stop_event stops the workers and raises StopRequested.
+    """
     if not urls:
         logger.warning("[MULTIPROCESS] No URLs provided")
-        return {}
-    
+        return
+
     # Prepare arguments for each URL
     args = [
         (url, {
@@ -54,41 +143,116 @@ def extract_texts_from_urls(
             "min_content_length": min_content_length,
             "lang": lang,
             "save_screenshot_on_fail": save_screenshot_on_fail,
-            "cookie_handler": cookie_handler
+            "cookie_handler": cookie_handler,
+            "archive_dir": archive_dir,
+            "archive_mode": archive_mode,
+            "metrics_config": metrics_config,
+            "browser_memory_mb": browser_memory_mb,
+            "artifacts_config": artifacts_config
         }) for url in urls
     ]
+
+    # Browser extraction is mostly waiting, so workers are bounded by memory, not CPU count
+    tabs = max(1, tabs_per_browser or 1)
+    browsers_needed = -(-len(urls) // tabs)
+    max_workers = min(max_workers, browsers_needed) if max_workers else browsers_needed
+    logger.info(f"[MULTIPROCESS] Up to {max_workers} workers x {tabs} tabs for {len(urls)} URLs")
+
+    # Every URL runs in a worker process, even small batches, so the deadline always applies.
+    # Results arrive in completion order so a slow page does not hold back the rest.
+    deadline = partial(task_deadline, url_deadline=url_deadline, base_budget=extraction_budget(**args[0][1]))
+    manager = BrowserWorkerManager(
+        partial(_safe_extract_in_tab, tabs=tabs, deadline=deadline) if tabs > 1
+        else partial(_safe_extract_url, deadline=deadline),
+        max_workers=max_workers,
+        memory_limit_mb=browser_memory_mb * tabs if browser_memory_mb else None,
+        deadline=deadline,
+        metrics=get_metrics(metrics_config),
+        proxy_pool=proxy_pool,
+        tabs=tabs,
+        worker_exit=_worker_exit,
+        stop_event=stop_event
+    )
+    from tqdm import tqdm
+
+    retry_queue = RetryQueue(proxy_pool, metrics=get_metrics(metrics_config)) if retry else None
+    for url, text, _ in tqdm(manager.run(args, retry_queue), total=len(args), disable=not show_progress):
+        yield url, text
+
+def extract_texts_from_urls(
+    urls,
+    headless=True,
+    proxy=None,
+    timeout=20,
+    scroll_pause=1.5,
+    max_scrolls=15,
+    min_content_length=400,
+    lang="en",
+    save_screenshot_on_fail=False,
+    cookie_handler=None,
+    show_progress=True,
+    max_workers=None,  # upper bound; actual concurrency is sized from available memory
+    on_result=None,    # called with (url, text) as each page finishes
+    archive_dir=None,
+    archive_mode=None,  # "record" or "replay"
+    metrics_config=None,  # CrawlMetrics.config() of the calling crawl
+    browser_memory_mb=None,  # per-browser memory limit
+    url_deadline=None,  # total seconds per URL before its browser is killed
+    retry=True,  # classified retries with backoff and fallback strategies
+    proxy_pool=None,  # ProxyPool spreading pages over proxies; overrides proxy
+    tabs_per_browser=1,  # pages rendered concurrently in each browser, one per tab
+    artifacts_config=None,  # FailureArtifacts.config() for sampled failure artifacts
+    stop_event=None  # threading.Event; when set, workers are stopped and StopRequested is raised
+):
+    logger.info(f"[MULTIPROCESS_START] Processing {len(urls)} URLs")
     
-    # Use max_workers if provided, otherwise use the minimum of URLs count and CPU count
-    if max_workers is None:
-        max_workers = min(len(urls), multiprocessing.cpu_count())
-    else:
-        max_workers = min(max_workers, len(urls), multiprocessing.cpu_count())
-    
-    logger.info(f"[MULTIPROCESS] Using {max_workers} workers for {len(urls)} URLs")
+    if not urls:
+        logger.warning("[MULTIPROCESS] No URLs provided")
+        return {}
     
+    results = {}
     try:
-        # For small number of URLs, process sequentially for better debugging
-        if len(urls) <= 2:
-            logger.info("[MULTIPROCESS] Processing sequentially for debugging")
-            results = []
-            for arg in args:
-                result = _safe_extract_url(arg)
-                results.append(result)
-                logger.info(f"[SEQUENTIAL] Processed {result[0]}: {len(result[1])} chars")
-            return dict(results)
-        
-        # Use multiprocessing for larger batches
-        with multiprocessing.Pool(processes=max_workers, initializer=init_worker) as pool:
-            results = list(tqdm(pool.imap(_safe_extract_url, args), total=len(args), disable=not show_progress))
+        for url, text in iter_extracted_texts(
+            urls,
+            headless=headless,
+            proxy=proxy,
+            timeout=timeout,
+            scroll_pause=scroll_pause,
+            max_scrolls=max_scrolls,
+            min_content_length=min_content_length,
+            lang=lang,
+            save_screenshot_on_fail=save_screenshot_on_fail,
+            cookie_handler=cookie_handler,
+            show_progress=show_progress,
+            max_workers=max_workers,
+            archive_dir=archive_dir,
+            archive_mode=archive_mode,
+            metrics_config=metrics_config,
+            browser_memory_mb=browser_memory_mb,
+            url_deadline=url_deadline,
+            retry=retry,
+            proxy_pool=proxy_pool,
+            tabs_per_browser=tabs_per_browser,
+            artifacts_config=artifacts_config,
+            stop_event=stop_event
+        ):
+            results[url] = text
+            if on_result:
+                try:
+                    on_result(url, text)
+                except Exception as e:
+                    logger.warning(f"[CALLBACK_FAIL] {url}: {e}")
         
         # Log results
-        successful = sum(1 for _, text in results if text.strip())
+        successful = sum(1 for text in results.values() if text.strip())
         failed = len(results) - successful
         logger.info(f"[MULTIPROCESS_COMPLETE] {successful} successful, {failed} failed")
         
-        return dict(results)
+        return results
         
+    except StopRequested:
+        raise
     except Exception as e:
         logger.error(f"[MULTIPROCESS] Unexpected error: {e}")
         traceback.print_exc()
-        return {}
+        return results
@@ -0,0 +1,183 @@
+# extractor/crawl/proxy_pool.py
+import time
+import random
+import logging
+import threading
+from collections import deque
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# Outcomes reported back to the pool
+OK = "ok"
+ERROR = "error"        # connection errors, timeouts, 5xx through the proxy
+BLOCKED = "blocked"    # challenge pages, 403/429 from the target
+
+
+class _ProxyState:
+    def __init__(self, proxy, window):
+        self.proxy = proxy
+        self.in_flight = 0
+        self.latency = None              # EWMA of successful request latency, seconds
+        self.outcomes = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        self.cooldowns = 0
+        self.requests = 0
+
+    def rate(self, outcome):
+        if not self.outcomes:
+            return 0.0
+        return sum(1 for o in self.outcomes if o == outcome) / len(self.outcomes)
+
+    def score(self):
+        """Higher is better: success rate discounted by latency."""
+        success = 1.0 - self.rate(ERROR) - self.rate(BLOCKED)
+        latency = self.latency if self.latency is not None else 1.0
+        return max(success, 0.05) / (1.0 + latency)
+
+
+class ProxyPool:
+    """
+    Spreads requests over a set of proxies and tracks their health.
+    - acquire() picks the healthy proxy with the lowest load per health score
+      (in-flight requests / score), so fast, reliable exits get more traffic.
+    - release() reports the outcome and latency; a proxy with too many consecutive
+      failures, or a high error/block rate over the recent window, is taken out of
+      rotation for a cooldown that doubles each time it happens again.
+    - pin_domains=True keeps one proxy per domain (stable sessions) until it cools down.
+    - acquire(prefer=...) keeps a multi-tab browser on its proxy while it is healthy.
+    - If every proxy is cooling down, the one that recovers first is used.
+    Thread-safe; lives in the crawling process, workers get their proxy per task.
+    """
+
+    def __init__(
+        self,
+        proxies,
+        pin_domains=False,
+        cooldown=60,
+        max_cooldown=900,
+        max_consecutive_failures=3,
+        max_failure_rate=0.5,
+        min_samples=5,
+        window=50
+    ):
+        self.states = {p: _ProxyState(p, window) for p in dict.fromkeys(proxies or [])}
+        self.pin_domains = pin_domains
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.max_consecutive_failures = max_consecutive_failures
+        self.max_failure_rate = max_failure_rate
+        self.min_samples = min_samples
+        self.pins = {}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.states)
+
+    def _available(self, now, exclude):
+        candidates = [s for s in self.states.values() if s.proxy not in exclude] or list(self.states.values())
+        healthy = [s for s in candidates if s.cooldown_until <= now]
+        return healthy or [min(candidates, key=lambda s: s.cooldown_until)]
+
+    def acquire(self, domain=None, exclude=(), prefer=None):
+        """
+        Returns a proxy for the next request (None when the pool is empty).
+        prefer asks for a specific proxy (e.g. the one a shared browser was started with);
+        it is honoured unless that proxy is excluded or cooling down.
+        """
+        if not self.states:
+            return None
+        now = time.time()
+        with self.lock:
+            state = self.states.get(prefer)
+            if state and state.cooldown_until <= now and state.proxy not in exclude:
+                state.in_flight += 1
+                return state.proxy
+            if self.pin_domains and domain in self.pins:
+                state = self.states.get(self.pins[domain])
+                if state and state.cooldown_until <= now and state.proxy not in exclude:
+                    state.in_flight += 1
+                    return state.proxy
+            candidates = self._available(now, set(exclude))
+            load = {s.proxy: (s.in_flight + 1) / s.score() for s in candidates}
+            best = min(load.values())
+            # Break ties randomly so equal proxies share load from the first request on
+            state = random.choice([s for s in candidates if load[s.proxy] <= best * 1.0001])
+            state.in_flight += 1
+            if self.pin_domains and domain:
+                self.pins[domain] = state.proxy
+            return state.proxy
+
+    def release(self, proxy, outcome=OK, latency=None):
+        """
+        Reports how a request through proxy went. outcome=None only frees the slot
+        (failures that say nothing about the proxy, e.g. too-short content).
+        """
+        state = self.states.get(proxy)
+        if state is None:
+            return
+        with self.lock:
+            state.in_flight = max(0, state.in_flight - 1)
+            if outcome is None:
+                return
+            state.requests += 1
+            state.outcomes.append(outcome)
+            if outcome == OK:
+                state.consecutive_failures = 0
+                if latency is not None:
+                    state.latency = latency if state.latency is None else 0.8 * state.latency + 0.2 * latency
+                return
+            state.consecutive_failures += 1
+            failure_rate = state.rate(ERROR) + state.rate(BLOCKED)
+            if state.consecutive_failures >= self.max_consecutive_failures or (
+                len(state.outcomes) >= self.min_samples and failure_rate > self.max_failure_rate
+            ):
+                duration = min(self.cooldown * (2 ** state.cooldowns), self.max_cooldown)
+                state.cooldown_until = time.time() + duration
+                state.cooldowns += 1
+                state.consecutive_failures = 0
+                state.outcomes.clear()
+                self.pins = {d: p for d, p in self.pins.items() if p != proxy}
+                logger.warning(f"[PROXY_COOLDOWN] {proxy}: {outcome} rate {failure_rate:.0%}, out for {duration:.0f}s")
+
+    def stats(self):
+        now = time.time()
+        with self.lock:
+            return [{
+                "proxy": s.proxy,
+                "requests": s.requests,
+                "in_flight": s.in_flight,
+                "latency_s": s.latency,
+                "error_rate": s.rate(ERROR),
+                "block_rate": s.rate(BLOCKED),
+                "cooling_down_s": max(0.0, s.cooldown_until - now),
+            } for s in self.states.values()]
+
+
+def requests_proxies(proxy):
+    """proxies= mapping for requests; accepts "host:port" as well as full proxy URLs."""
+    if not proxy:
+        return None
+    url = proxy if "://" in proxy else f"http://{proxy}"
+    return {"http": url, "https": url}
+
+
+def domain_of(url):
+    return urlparse(url).netloc
+
+
+def outcome_for(reason):
+    """
+    Maps an extraction failure reason to a proxy outcome (None: not the proxy's fault).
+    "timeout" here is a page load that timed out in the browser; tasks killed by the
+    worker manager's watchdog or memory limit are released without an outcome, and so is
+    "deadline", a task giving up at its soft deadline ahead of the watchdog.
+    """
+    if reason is None:
+        return OK
+    if reason == "blocked":
+        return BLOCKED
+    if reason in ("network", "timeout"):
+        return ERROR
+    return None
@@ -0,0 +1,123 @@
+# extractor/crawl/retry.py
+import heapq
+import random
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Failure classes
+DRIVER_INIT = "driver_init"
+TIMEOUT = "timeout"
+BLOCKED = "blocked"
+TOO_SHORT = "too_short"
+NETWORK = "network"
+OTHER = "other"
+
+# Retry strategies
+SAME = "same"                # fresh browser, same settings
+LONGER_WAIT = "longer_wait"  # double page timeout and scroll pauses
+OTHER_PROXY = "other_proxy"  # a different proxy from the crawl's ProxyPool
+STATIC = "static"            # plain HTTP fetch + HTML parsing, no browser
+
+# Per class: base backoff in seconds, then one strategy per retry attempt
+RETRY_POLICIES = {
+    DRIVER_INIT: {"backoff": 5, "strategies": [SAME, STATIC]},
+    TIMEOUT: {"backoff": 2, "strategies": [LONGER_WAIT, STATIC]},
+    BLOCKED: {"backoff": 30, "strategies": [OTHER_PROXY, LONGER_WAIT]},
+    TOO_SHORT: {"backoff": 1, "strategies": [LONGER_WAIT, STATIC]},
+    NETWORK: {"backoff": 10, "strategies": [SAME, OTHER_PROXY]},
+    OTHER: {"backoff": 5, "strategies": [SAME]},
+}
+
+# Failures that retrying cannot fix
+NO_RETRY = {"replay_miss", "memory_limit"}
+
+
+def classify_failure(reason):
+    """Maps a failure reason (see text_extractor.failure_reason) to a retry class, or None."""
+    if not reason or reason in NO_RETRY:
+        return None
+    if reason in RETRY_POLICIES:
+        return reason
+    if reason == "worker_crash":
+        return DRIVER_INIT
+    if reason == "deadline":
+        # Soft deadline inside the task (see text_extractor.extract_text_with_reason)
+        return TIMEOUT
+    return OTHER
+
+
+class RetryQueue:
+    """
+    Schedules failed extraction tasks for another attempt.
+    - Each failure class has its own backoff (exponential with jitter) and an ordered
+      list of strategies; attempt n uses the n-th strategy, so a page that keeps timing
+      out in the browser ends up on the static HTTP tier.
+    - Strategies that cannot apply (e.g. other_proxy without spare proxies) are skipped.
+    """
+
+    def __init__(self, proxy_pool=None, policies=None, metrics=None):
+        self.proxy_pool = proxy_pool
+        self.policies = policies or RETRY_POLICIES
+        self.metrics = metrics
+        self.attempts = {}
+        self._heap = []
+        self._seq = 0
+
+    def _apply(self, strategy, kwargs):
+        kwargs = dict(kwargs)
+        if strategy == LONGER_WAIT:
+            kwargs["timeout"] = kwargs.get("timeout", 20) * 2
+            kwargs["scroll_pause"] = kwargs.get("scroll_pause", 1.5) * 1.5
+        elif strategy == OTHER_PROXY:
+            if not self.proxy_pool or len(self.proxy_pool) < 2:
+                return None
+            # The worker manager asks the pool for a proxy other than this one at dispatch
+            kwargs["exclude_proxy"] = kwargs.get("proxy")
+        elif strategy == STATIC:
+            kwargs["tier"] = STATIC
+        return kwargs
+
+    def schedule(self, task, reason):
+        """
+        Queues a retry for a failed (url, kwargs) task.
+        Returns the delay in seconds, or None if the task is out of retries.
+        """
+        url, kwargs = task
+        failure_class = classify_failure(reason)
+        if failure_class is None:
+            return None
+        policy = self.policies[failure_class]
+        attempt = self.attempts.get(url, 0)
+        strategies = policy["strategies"]
+        while attempt < len(strategies):
+            new_kwargs = self._apply(strategies[attempt], kwargs)
+            attempt += 1
+            if new_kwargs is None:
+                continue
+            self.attempts[url] = attempt
+            delay = policy["backoff"] * (2 ** (attempt - 1)) * random.uniform(0.8, 1.2)
+            self._seq += 1
+            heapq.heappush(self._heap, (time.time() + delay, self._seq, (url, new_kwargs)))
+            logger.info(f"[RETRY] {url}: {failure_class} -> {strategies[attempt - 1]} in {delay:.1f}s (attempt {attempt})")
+            if self.metrics:
+                self.metrics.count("retries", url=url, failure_class=failure_class, strategy=strategies[attempt - 1])
+            return delay
+        self.attempts[url] = attempt
+        return None
+
+    def pop_ready(self, now=None):
+        """Tasks whose backoff has elapsed."""
+        now = now or time.time()
+        ready = []
+        while self._heap and self._heap[0][0] <= now:
+            ready.append(heapq.heappop(self._heap)[2])
+        return ready
+
+    def next_ready(self):
+        """Time of the earliest queued retry, or None."""
+        return self._heap[0][0] if self._heap else None
+
+    def __len__(self):
+        return len(self._heap)
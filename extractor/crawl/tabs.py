@@ -0,0 +1,379 @@
+# extractor/crawl/tabs.py
+import os
+import json
+import time
+import signal
+import asyncio
+import logging
+import threading
+from functools import partial
+from contextlib import asynccontextmanager
+from extractor.crawl.text_extractor import (
+    init_driver, is_pdf_url, is_blocked_page, failure_reason, _validate_text, _check_deadline,
+    _remaining, extract_text_with_reason, BlockedPageError, handle_cookie_consent,
+)
+from extractor.extractors.cookie_handler import run_cookie_handler
+from extractor.crawl.archive import get_archive, RECORD, REPLAY, DOM
+from extractor.crawl.metrics import get_metrics
+from extractor.crawl.artifacts import get_artifacts
+
+logger = logging.getLogger(__name__)
+
+READY_POLL = 0.25  # seconds between document.readyState checks
+
+
+class BrowserStuckError(Exception):
+    """The shared browser stopped answering while serving another tab."""
+
+
+class TabSession:
+    """
+    One Chrome shared by several pages at once, each in its own tab, inside one worker process.
+    - Coroutines take turns on the driver: `async with session.use(handle)` holds the
+      driver lock and switches to the tab. WebDriver calls inside the block run without
+      yielding, so every command reaches the right window. Page loads, settle time and
+      scroll pauses are awaited outside the lock, which is when the other tabs get the driver.
+    - Longer driver routines run through call(), off the event loop and with a time limit.
+      A driver call that does not return in time fails its own tab as a timeout and marks the
+      browser stuck: chromedriver runs one command at a time, so every other tab would hang
+      behind it. The other tabs then fail at once as collateral ("worker_crash"), and the
+      browser is abandoned and restarted once its tabs have closed.
+    - The browser starts on first use. A task that needs a different browser
+      (headless, proxy or memory setting) waits until the open tabs finish, then the browser
+      is restarted with its settings.
+    """
+
+    def __init__(self, tabs):
+        self.tabs = tabs
+        self.driver = None
+        self.key = None
+        self.active = 0
+        self.current = None
+        self.stuck = False
+        self.lock = asyncio.Lock()
+
+    async def open_tab(self, key):
+        """Opens a blank tab in a browser started with key; returns its handle, or None if Chrome cannot start."""
+        while True:
+            async with self.lock:
+                if not self.active and self.stuck:
+                    self.abandon()
+                if not self.stuck and (self.driver is None or key == self.key or not self.active):
+                    if self.driver is not None and key != self.key:
+                        self.quit()
+                    for attempt in range(2):
+                        if self.driver is None:
+                            headless, proxy, memory_limit_mb = key
+                            self.driver = init_driver(headless=headless, proxy=proxy,
+                                                      memory_limit_mb=memory_limit_mb, tabs=self.tabs)
+                            if self.driver is None:
+                                return None
+                            self.key = key
+                        try:
+                            self.driver.switch_to.new_window("tab")
+                            break
+                        except Exception as e:
+                            # The browser died; restart it if no other tab is still using it
+                            if attempt or self.active:
+                                raise
+                            logger.warning(f"[TABS] Browser unusable ({e}); restarting")
+                            self.quit()
+                    self.current = self.driver.current_window_handle
+                    self.active += 1
+                    return self.current
+            await asyncio.sleep(READY_POLL)
+
+    @asynccontextmanager
+    async def use(self, handle):
+        async with self.lock:
+            if self.stuck:
+                raise BrowserStuckError("The browser stopped answering on another tab")
+            if self.current != handle:
+                self.driver.switch_to.window(handle)
+                self.current = handle
+            yield self.driver
+
+    async def call(self, handle, fn, timeout=None):
+        """
+        Runs a long blocking driver routine off the event loop; every other tab waits until it
+        returns. After timeout seconds the tab fails with a TimeoutException and the browser
+        is marked stuck (see the class docstring).
+        """
+        from selenium.common.exceptions import TimeoutException
+
+        async with self.use(handle) as driver:
+            future = asyncio.get_running_loop().run_in_executor(None, fn, driver)
+            try:
+                return await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                self.stuck = True
+                logger.warning(f"[TABS] Driver call did not return within {timeout}s; restarting the browser "
+                               f"once its {self.active} tabs have closed")
+                raise TimeoutException(f"Driver call timed out after {timeout}s")
+
+    async def run_steps(self, handle, steps):
+        """
+        Drives a generator of short driver steps (see cookie_handler.consent_steps): each
+        step runs in one turn on the tab, and the pauses it yields leave the driver to the
+        other tabs. Returns the generator's return value.
+        """
+        while True:
+            async with self.use(handle):
+                try:
+                    pause = next(steps)
+                except StopIteration as done:
+                    return done.value
+            await asyncio.sleep(pause)
+
+    async def wait_loaded(self, handle, timeout):
+        """Polls until the tab's document is complete, like a blocking driver.get would wait."""
+        from selenium.common.exceptions import TimeoutException
+
+        deadline = time.time() + timeout
+        while True:
+            async with self.use(handle) as driver:
+                if driver.execute_script(
+                    "return document.readyState === 'complete' && location.href !== 'about:blank'"
+                ):
+                    return
+            if time.time() > deadline:
+                raise TimeoutException(f"Page load timed out after {timeout}s")
+            await asyncio.sleep(READY_POLL)
+
+    async def close_tab(self, handle):
+        async with self.lock:
+            try:
+                if self.driver is not None and not self.stuck:
+                    self.driver.switch_to.window(handle)
+                    self.driver.close()
+            except Exception:
+                pass
+            finally:
+                self.current = None
+                self.active = max(0, self.active - 1)
+
+    def abandon(self):
+        """Drops a stuck browser without waiting for it: kills its processes and quits it in the background."""
+        driver = self.driver
+        logger.warning("[TABS] Abandoning a stuck browser")
+        for pid in (getattr(driver, "browser_pid", None),
+                    getattr(getattr(getattr(driver, "service", None), "process", None), "pid", None)):
+            if pid:
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except (OSError, AttributeError):
+                    pass
+        if driver is not None:
+            threading.Thread(target=driver.quit, name="abandoned-browser", daemon=True).start()
+        self.driver = None
+        self.key = None
+        self.current = None
+        self.stuck = False
+
+    def quit(self):
+        if self.driver is not None:
+            try:
+                self.driver.quit()
+            except Exception:
+                pass
+        self.driver = None
+        self.key = None
+        self.current = None
+
+
+# One session per worker process (workers are forked, so nothing is inherited on purpose)
+_sessions = {}
+
+
+def get_tab_session(tabs):
+    key = os.getpid()
+    if key not in _sessions:
+        _sessions[key] = TabSession(tabs)
+    return _sessions[key]
+
+
+def close_tab_sessions():
+    """Quits this process's shared browser; run when a multi-tab worker exits."""
+    session = _sessions.pop(os.getpid(), None)
+    if session:
+        if session.stuck:
+            session.abandon()
+        else:
+            session.quit()
+
+
+async def extract_text_in_tab(
+    session,
+    url,
+    headless=True,
+    proxy=None,
+    timeout=20,
+    scroll_pause=1.5,
+    max_scrolls=15,
+    min_content_length=400,
+    lang="en",
+    save_screenshot_on_fail=False,
+    cookie_handler=handle_cookie_consent,
+    archive_dir=None,
+    archive_mode=None,
+    metrics_config=None,
+    browser_memory_mb=None,
+    tier=None,
+    artifacts_config=None,
+    deadline=None
+):
+    """
+    Same contract as extract_text_with_reason (returns (url, text, failure_reason), with the
+    same soft deadline), but
+    renders the page in a tab of the session's shared browser. PDFs, archive replay and the
+    static tier need no browser and run in a thread, off the event loop.
+    """
+    if tier == "static" or is_pdf_url(url) or archive_mode == REPLAY:
+        return await asyncio.get_running_loop().run_in_executor(None, partial(
+            extract_text_with_reason, url, headless=headless, proxy=proxy, timeout=timeout,
+            scroll_pause=scroll_pause, max_scrolls=max_scrolls, min_content_length=min_content_length,
+            lang=lang, save_screenshot_on_fail=save_screenshot_on_fail, cookie_handler=cookie_handler,
+            archive_dir=archive_dir, archive_mode=archive_mode, metrics_config=metrics_config,
+            browser_memory_mb=browser_memory_mb, tier=tier, artifacts_config=artifacts_config,
+            deadline=deadline
+        ))
+
+    metrics = get_metrics(metrics_config)
+    archive = get_archive(archive_dir, archive_mode)
+    artifacts = get_artifacts(artifacts_config) if save_screenshot_on_fail else None
+    with metrics.span("extract_total", url=url, tier="tab") as span:
+        url, text, reason = await _extract_text_in_tab(
+            session, url, headless, proxy, timeout, scroll_pause, max_scrolls, min_content_length,
+            lang, artifacts, cookie_handler, archive, metrics, browser_memory_mb, deadline
+        )
+        span["chars"] = len(text)
+        span["failed"] = not text
+    return url, text, reason
+
+
+async def _extract_text_in_tab(
+    session, url, headless, proxy, timeout, scroll_pause, max_scrolls, min_content_length, lang,
+    artifacts, cookie_handler, archive, metrics, browser_memory_mb, deadline
+):
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.common.keys import Keys
+
+    logger.info(f"[EXTRACT_START] Processing URL: {url} (tab)")
+
+    with metrics.span("driver_start", url=url) as span:
+        try:
+            handle = await session.open_tab((headless, proxy, browser_memory_mb))
+        except Exception as e:
+            logger.error(f"[DRIVER_FAIL] {url}: could not open a tab: {e}")
+            handle = None
+        span["failed"] = handle is None
+    if not handle:
+        logger.error(f"[DRIVER_FAIL] Could not initialize driver for {url}")
+        metrics.failure("driver_start", url, "driver_init")
+        return url, "", "driver_init"
+
+    stage = "page_load"
+    try:
+        logger.info(f"[LOADING] {url}")
+        with metrics.span("page_load", url=url):
+            # Returns once navigation starts (page load strategy "none"), unless the browser hangs
+            await session.call(handle, lambda driver: driver.get(url), timeout)
+            await session.wait_loaded(handle, _remaining(deadline, timeout))
+            await asyncio.sleep(3)  # Give page time to load
+
+        async with session.use(handle) as driver:
+            current_url = driver.current_url
+        if current_url != url:
+            logger.warning(f"[REDIRECT] {url} -> {current_url}")
+
+        if cookie_handler:
+            stage = "cookie"
+            _check_deadline(deadline)
+            with metrics.span("cookie", url=url) as span:
+                try:
+                    logger.info(f"[COOKIE] Handling consent for {url}")
+                    steps = getattr(cookie_handler, "steps", None)
+                    if steps:
+                        accepted = await session.run_steps(handle, steps(session.driver, metrics=metrics, url=url))
+                    else:
+                        # A handler without a step-wise form holds the browser for its whole run
+                        accepted = await session.call(handle, lambda d: run_cookie_handler(cookie_handler, d, metrics, url))
+                    span["accepted"] = bool(accepted)
+                except Exception as e:
+                    logger.warning(f"[COOKIE_FAIL] {url}: {e}")
+                    span["failed"] = True
+
+        stage = "scroll"
+        with metrics.span("scroll", url=url, scrolls=max_scrolls):
+            try:
+                logger.info(f"[SCROLL] Scrolling {max_scrolls} times for {url}")
+                for i in range(max_scrolls):
+                    if deadline and time.time() + scroll_pause > deadline:
+                        logger.warning(f"[SCROLL] {url}: soft deadline reached after {i} scrolls")
+                        break
+                    async with session.use(handle) as driver:
+                        driver.find_element(By.TAG_NAME, "body").send_keys(Keys.END)
+                    await asyncio.sleep(scroll_pause)
+            except Exception as e:
+                logger.warning(f"[SCROLL_FAIL] {url}: {e}")
+
+        # Text, snapshot and validation all read the tab, so they run in one turn on the driver
+        def read_page(driver):
+            nonlocal stage
+            stage = "text_extract"
+            with metrics.span("text_extract", url=url) as span:
+                try:
+                    text = driver.find_element(By.TAG_NAME, "body").text.strip()
+                    logger.info(f"[TEXT_EXTRACTED] {url}: {len(text)} characters")
+                except Exception as e:
+                    logger.error(f"[TEXT_EXTRACT_FAIL] {url}: {e}")
+                    text = ""
+                span["chars"] = len(text)
+
+            if archive and archive.mode == RECORD:
+                try:
+                    archive.record(DOM, url, json.dumps({
+                        "text": text,
+                        "page_source": driver.page_source,
+                        "current_url": current_url,
+                        "title": driver.title,
+                    }), {"current_url": current_url})
+                except Exception as e:
+                    logger.warning(f"[ARCHIVE_FAIL] {url}: {e}")
+
+            stage = "validate"
+            with metrics.span("validate", url=url):
+                if is_blocked_page(driver.title, text):
+                    raise BlockedPageError(f"Challenge page: {driver.title!r} ({len(text)} chars)")
+                return _validate_text(
+                    url, text, min_content_length, lang,
+                    lambda selector: driver.find_element(By.CSS_SELECTOR, selector).text.strip()
+                )
+
+        text = await session.call(handle, read_page, timeout)
+        metrics.count("text_chars", len(text), url=url)
+
+        logger.info(f"[SUCCESS] {url}: Extracted {len(text)} characters")
+        return url, text, None
+
+    except Exception as e:
+        logger.error(f"[EXTRACT_FAIL] {url}: {e}")
+        if isinstance(e, BrowserStuckError):
+            # Collateral of another tab: neither this page nor its proxy is to blame
+            reason = "worker_crash"
+        else:
+            reason = failure_reason(e)
+        if reason == "timeout" and deadline and time.time() >= deadline:
+            # The load was cut short by the soft deadline, not by the page timeout
+            reason = "deadline"
+        metrics.failure(stage, url, reason)
+
+        if artifacts and not session.stuck:
+            try:
+                # capture() bounds its own driver reads
+                await session.call(handle, lambda driver: artifacts.capture(driver, url, reason, stage))
+            except Exception as ae:
+                logger.warning(f"[ARTIFACT_FAIL] {url}: {ae}")
+        return url, "", reason
+    finally:
+        await session.close_tab(handle)
@@ -1,36 +1,122 @@
+import io
 import os
+import json
 import time
 import logging
 import traceback
-from langdetect import detect
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
-import undetected_chromedriver as uc
-import pdfplumber
-import requests
-from extractor.extractors.cookie_handler import handle_cookie_consent
+from extractor.extractors.cookie_handler import handle_cookie_consent, run_cookie_handler
+from extractor.crawl.archive import get_archive, RECORD, REPLAY, DOM, PDF
+from extractor.crawl.metrics import get_metrics, NULL_METRICS
+from extractor.crawl.artifacts import get_artifacts, close_artifacts
+from extractor.crawl.worker_manager import WorkerStopped
+from extractor.crawl.proxy_pool import requests_proxies
+
+# selenium, undetected_chromedriver, pdfplumber, langdetect, requests and bs4 are imported
+# inside the functions that use them, so importing the crawler stays cheap until a crawl runs
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO)
 
 def is_pdf_url(url):
     return url.lower().endswith(".pdf")
 
-def extract_text_from_pdf(url):
+ALT_SELECTORS = ['main', 'article', '.content', '#content', '.post', '.entry']
+
+# Bot-protection / challenge pages (matched case-insensitively against title and short bodies)
+BLOCK_MARKERS = [
+    "just a moment", "attention required", "checking your browser", "verify you are human",
+    "are you a robot", "access denied", "captcha", "cf-challenge", "ddos protection by",
+]
+
+STATIC_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                  "(KHTML, like Gecko) Chrome/120.0 Safari/537.36",
+    "Accept-Language": "en-US,en;q=0.9",
+}
+
+class BlockedPageError(Exception):
+    """The page is a bot-protection or challenge page instead of content."""
+
+class DeadlineExceeded(Exception):
+    """The extraction's soft deadline passed; it gives up before the worker manager's watchdog stops it."""
+
+def _check_deadline(deadline):
+    """Raises DeadlineExceeded once deadline (a time.time() value; None for none) has passed."""
+    if deadline is not None and time.time() >= deadline:
+        raise DeadlineExceeded(f"Soft deadline passed {time.time() - deadline:.0f}s ago")
+
+def _remaining(deadline, limit):
+    """limit in seconds, shortened to the time left before deadline."""
+    _check_deadline(deadline)
+    return limit if deadline is None else min(limit, max(1, deadline - time.time()))
+
+def is_blocked_page(title, text):
+    title = (title or "").lower()
+    head = (text or "")[:2000].lower()
+    if any(marker in title for marker in BLOCK_MARKERS):
+        return True
+    # Real pages can mention "captcha" in passing; only treat short bodies as challenges
+    return len(text or "") < 1500 and any(marker in head for marker in BLOCK_MARKERS)
+
+def failure_reason(error):
+    """Short, stable label for why an extraction failed."""
+    import requests
+
+    name = type(error).__name__
+    message = str(error)
+    if isinstance(error, BlockedPageError):
+        return "blocked"
+    if isinstance(error, DeadlineExceeded):
+        return "deadline"
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None \
+            and error.response.status_code in (403, 429, 503):
+        return "blocked"
+    if name == "TimeoutException" or "timed out" in message.lower():
+        return "timeout"
+    if isinstance(error, ValueError) and "too short" in message:
+        return "too_short"
+    if "net::ERR_" in message or isinstance(error, requests.exceptions.RequestException):
+        return "network"
+    return name
+
+def extract_text_from_pdf(url, archive=None, metrics=NULL_METRICS):
     try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        with open("temp.pdf", "wb") as f:
-            f.write(response.content)
-        with pdfplumber.open("temp.pdf") as pdf:
-            text = "\n".join(page.extract_text() or "" for page in pdf.pages)
-        os.remove("temp.pdf")
+        import requests
+        import pdfplumber
+
+        if archive and archive.mode == REPLAY:
+            record = archive.get(PDF, url)
+            if record is None:
+                logger.warning(f"[REPLAY_MISS] {url}: no archived PDF")
+                metrics.failure("pdf", url, "replay_miss")
+                return ""
+            content = record[1]
+        else:
+            with metrics.span("pdf_download", url=url) as span:
+                response = requests.get(url, timeout=10)
+                response.raise_for_status()
+                content = response.content
+                span["bytes"] = len(content)
+            metrics.count("pdf_bytes", len(content), url=url)
+            if archive and archive.mode == RECORD:
+                archive.record(PDF, url, content, {"status": response.status_code})
+        # Parse in memory; a shared temp file would race between worker processes
+        with metrics.span("pdf_parse", url=url):
+            with pdfplumber.open(io.BytesIO(content)) as pdf:
+                text = "\n".join(page.extract_text() or "" for page in pdf.pages)
         return text
     except Exception as e:
         logger.warning(f"[PDF_FAIL] Failed to extract PDF {url}: {e}")
+        metrics.failure("pdf", url, failure_reason(e))
         return ""
 
-def init_driver(headless=True, proxy=None):
+def init_driver(headless=True, proxy=None, memory_limit_mb=None, tabs=1):
+    """
+    Starts Chrome; returns None if it cannot start.
+    tabs > 1 prepares one browser for several pages at once (see extractor.crawl.tabs):
+    driver.get returns without waiting for the load, and background tabs are not throttled.
+    """
+    import undetected_chromedriver as uc
+
     options = uc.ChromeOptions()
     if headless:
         options.add_argument("--headless")
@@ -41,6 +127,22 @@ def init_driver(headless=True, proxy=None):
     options.add_argument("--disable-blink-features=AutomationControlled")
     options.add_experimental_option("excludeSwitches", ["enable-automation"])
     options.add_experimental_option('useAutomationExtension', False)
+    # Console messages end up in failure artifacts
+    options.set_capability("goog:loggingPrefs", {"browser": "WARNING"})
+    
+    if memory_limit_mb:
+        # Keep one tab's browser footprint bounded: few renderers, capped JS heap, no background work
+        options.add_argument(f"--renderer-process-limit={max(2, tabs + 1)}")
+        options.add_argument(f"--js-flags=--max-old-space-size={max(64, int(memory_limit_mb) // 2)}")
+        options.add_argument("--disable-extensions")
+        options.add_argument("--disable-background-networking")
+        options.add_argument("--disk-cache-size=33554432")
+    
+    if tabs > 1:
+        options.page_load_strategy = "none"
+        options.add_argument("--disable-background-timer-throttling")
+        options.add_argument("--disable-backgrounding-occluded-windows")
+        options.add_argument("--disable-renderer-backgrounding")
     
     if proxy:
         options.add_argument(f'--proxy-server={proxy}')
@@ -54,6 +156,104 @@ def init_driver(headless=True, proxy=None):
         logger.error(f"[DRIVER_FAIL] Failed to initialize driver: {e}")
         return None
 
+def _validate_text(url, text, min_content_length, lang, find_alt_text):
+    """
+    Applies the minimum-length check (trying main content areas as a fallback)
+    and the optional language check. find_alt_text(selector) returns the text of
+    the first element matching a CSS selector. Raises ValueError if too short.
+    """
+    # Validate text length
+    if not text or len(text) < min_content_length:
+        error_msg = f"Extracted text too short or empty: {len(text)} characters (min: {min_content_length})"
+        logger.warning(f"[SHORT_TEXT] {url}: {error_msg}")
+        
+        # Try alternative extraction methods
+        try:
+            # Try getting text from main content areas
+            for selector in ALT_SELECTORS:
+                try:
+                    alt_text = find_alt_text(selector)
+                    if alt_text and len(alt_text) >= min_content_length:
+                        logger.info(f"[ALT_EXTRACT] {url}: Found text using {selector}: {len(alt_text)} chars")
+                        text = alt_text
+                        break
+                except Exception:
+                    continue
+        except Exception as e:
+            logger.warning(f"[ALT_EXTRACT_FAIL] {url}: {e}")
+        
+        if not text or len(text) < min_content_length:
+            raise ValueError(error_msg)
+    
+    # Language detection (make it optional)
+    if lang and text:
+        try:
+            from langdetect import detect
+            detected_lang = detect(text)
+            if detected_lang != lang:
+                logger.warning(f"[LANG_MISMATCH] {url}: Expected {lang}, got {detected_lang}")
+                # Don't fail on language mismatch, just warn
+                # raise ValueError(f"Non-target language: {detected_lang}")
+        except Exception as e:
+            logger.warning(f"[LANG_DETECT_FAIL] {url}: {e}")
+    
+    return text
+
+def replay_text_from_archive(url, archive, min_content_length=400, lang="en"):
+    """Re-runs text validation over an archived DOM snapshot, without a browser."""
+    record = archive.get(DOM, url)
+    if record is None:
+        logger.warning(f"[REPLAY_MISS] {url}: no archived DOM snapshot")
+        return url, ""
+    snapshot = json.loads(record[1])
+    soup = None
+
+    def find_alt_text(selector):
+        nonlocal soup
+        if soup is None:
+            from bs4 import BeautifulSoup
+            soup = BeautifulSoup(snapshot.get("page_source", ""), "html.parser")
+        element = soup.select_one(selector)
+        return element.get_text("\n", strip=True) if element else None
+
+    try:
+        text = _validate_text(url, snapshot.get("text", ""), min_content_length, lang, find_alt_text)
+        logger.info(f"[SUCCESS] {url}: Replayed {len(text)} characters")
+        return url, text
+    except Exception as e:
+        logger.error(f"[EXTRACT_FAIL] {url}: {e}")
+        return url, ""
+
+def extract_text_static(url, proxy=None, timeout=20, min_content_length=400, lang="en", metrics=NULL_METRICS):
+    """
+    Browserless tier: plain HTTP fetch and HTML text extraction, for pages that do not
+    need JavaScript. Raises on failure, like the browser path before validation.
+    """
+    import requests
+    from bs4 import BeautifulSoup
+
+    with metrics.span("static_fetch", url=url) as span:
+        response = requests.get(url, headers=STATIC_HEADERS, timeout=timeout, proxies=requests_proxies(proxy))
+        response.raise_for_status()
+        span["bytes"] = len(response.content)
+
+    with metrics.span("static_parse", url=url):
+        soup = BeautifulSoup(response.text, "html.parser")
+        for tag in soup(["script", "style", "noscript", "template", "svg"]):
+            tag.decompose()
+        root = soup.body or soup
+        text = root.get_text("\n", strip=True)
+        if is_blocked_page(soup.title.get_text() if soup.title else "", text):
+            raise BlockedPageError(f"Challenge page served to static fetch ({len(text)} chars)")
+
+        def find_alt_text(selector):
+            element = soup.select_one(selector)
+            return element.get_text("\n", strip=True) if element else None
+
+        text = _validate_text(url, text, min_content_length, lang, find_alt_text)
+    logger.info(f"[SUCCESS] {url}: Extracted {len(text)} characters (static)")
+    return text
+
 def extract_text_from_url(
     url,
     headless=True,
@@ -64,25 +264,106 @@ def extract_text_from_url(
     min_content_length=400,
     lang="en",
     save_screenshot_on_fail=False,
-    cookie_handler=handle_cookie_consent
+    cookie_handler=handle_cookie_consent,
+    archive_dir=None,
+    archive_mode=None,
+    metrics_config=None,
+    browser_memory_mb=None,
+    artifacts_config=None
 ):
+    url, text, _ = extract_text_with_reason(
+        url, headless=headless, proxy=proxy, timeout=timeout, scroll_pause=scroll_pause,
+        max_scrolls=max_scrolls, min_content_length=min_content_length, lang=lang,
+        save_screenshot_on_fail=save_screenshot_on_fail, cookie_handler=cookie_handler,
+        archive_dir=archive_dir, archive_mode=archive_mode, metrics_config=metrics_config,
+        browser_memory_mb=browser_memory_mb, artifacts_config=artifacts_config
+    )
+    return url, text
+
+def extract_text_with_reason(
+    url,
+    headless=True,
+    proxy=None,
+    timeout=20,
+    scroll_pause=1.5,
+    max_scrolls=15,
+    min_content_length=400,
+    lang="en",
+    save_screenshot_on_fail=False,
+    cookie_handler=handle_cookie_consent,
+    archive_dir=None,
+    archive_mode=None,
+    metrics_config=None,
+    browser_memory_mb=None,
+    tier=None,
+    artifacts_config=None,
+    deadline=None
+):
+    """
+    Like extract_text_from_url, but returns (url, text, failure_reason); the reason is
+    None on success. tier="static" skips the browser and uses a plain HTTP fetch.
+    deadline (a time.time() value) is a soft deadline: the page load timeout is shortened to
+    it and scrolling stops at it, and a page load that runs past it fails as "deadline", with
+    its failure artifact, before the worker manager's watchdog would stop the worker.
+    save_screenshot_on_fail captures sampled failure artifacts (screenshot, DOM, console
+    log) in the background; artifacts_config is FailureArtifacts.config() of the crawl.
+    cookie_handler(driver) returns True when it dismissed a consent banner; it also gets
+    metrics and url when it accepts them (see run_cookie_handler).
+    """
+    metrics = get_metrics(metrics_config)
+    archive = get_archive(archive_dir, archive_mode)
+    artifacts = get_artifacts(artifacts_config) if save_screenshot_on_fail else None
+    with metrics.span("extract_total", url=url, tier=tier or "browser") as span:
+        if tier == "static" and not is_pdf_url(url) and not (archive and archive.mode == REPLAY):
+            try:
+                text, reason = extract_text_static(url, proxy, timeout, min_content_length, lang, metrics), None
+            except Exception as e:
+                logger.error(f"[EXTRACT_FAIL] {url} (static): {e}")
+                text, reason = "", failure_reason(e)
+                metrics.failure("static", url, reason)
+        else:
+            url, text, reason = _extract_text_from_url(
+                url, headless, proxy, timeout, scroll_pause, max_scrolls, min_content_length, lang,
+                artifacts, cookie_handler, archive, metrics, browser_memory_mb, deadline
+            )
+        span["chars"] = len(text)
+        span["failed"] = not text
+    return url, text, reason
+
+def _extract_text_from_url(
+    url, headless, proxy, timeout, scroll_pause, max_scrolls, min_content_length, lang,
+    artifacts, cookie_handler, archive, metrics, browser_memory_mb=None, deadline=None
+):
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.common.keys import Keys
+
     logger.info(f"[EXTRACT_START] Processing URL: {url}")
     
     if is_pdf_url(url):
         logger.info(f"[PDF_DETECTED] {url}")
-        pdf_text = extract_text_from_pdf(url)
-        return url, pdf_text
+        pdf_text = extract_text_from_pdf(url, archive=archive, metrics=metrics)
+        return url, pdf_text, None if pdf_text else "pdf_failed"
+    
+    if archive and archive.mode == REPLAY:
+        url, text = replay_text_from_archive(url, archive, min_content_length=min_content_length, lang=lang)
+        # Replay is deterministic, so a failure here is never worth retrying
+        return url, text, None if text else "replay_miss"
     
-    driver = init_driver(headless=headless, proxy=proxy)
+    with metrics.span("driver_start", url=url) as span:
+        driver = init_driver(headless=headless, proxy=proxy, memory_limit_mb=browser_memory_mb)
+        span["failed"] = driver is None
     if not driver:
         logger.error(f"[DRIVER_FAIL] Could not initialize driver for {url}")
-        return url, ""
+        metrics.failure("driver_start", url, "driver_init")
+        return url, "", "driver_init"
     
+    stage = "page_load"
     try:
-        driver.set_page_load_timeout(timeout)
+        driver.set_page_load_timeout(_remaining(deadline, timeout))
         logger.info(f"[LOADING] {url}")
-        driver.get(url)
-        time.sleep(3)  # Give page time to load
+        with metrics.span("page_load", url=url):
+            driver.get(url)
+            time.sleep(3)  # Give page time to load
         
         # Check if page actually loaded
         current_url = driver.current_url
@@ -91,93 +372,90 @@ def extract_text_from_url(
         
         # Handle cookie consent
         if cookie_handler:
-            try:
-                logger.info(f"[COOKIE] Handling consent for {url}")
-                cookie_handler(driver)
-            except Exception as e:
-                logger.warning(f"[COOKIE_FAIL] {url}: {e}")
+            stage = "cookie"
+            _check_deadline(deadline)
+            with metrics.span("cookie", url=url) as span:
+                try:
+                    logger.info(f"[COOKIE] Handling consent for {url}")
+                    span["accepted"] = bool(run_cookie_handler(cookie_handler, driver, metrics, url))
+                except Exception as e:
+                    logger.warning(f"[COOKIE_FAIL] {url}: {e}")
+                    span["failed"] = True
         
         # Scroll to load dynamic content
-        try:
-            body = driver.find_element(By.TAG_NAME, "body")
-            logger.info(f"[SCROLL] Scrolling {max_scrolls} times for {url}")
-            for i in range(max_scrolls):
-                body.send_keys(Keys.END)
-                time.sleep(scroll_pause)
-        except Exception as e:
-            logger.warning(f"[SCROLL_FAIL] {url}: {e}")
+        stage = "scroll"
+        with metrics.span("scroll", url=url, scrolls=max_scrolls):
+            try:
+                body = driver.find_element(By.TAG_NAME, "body")
+                logger.info(f"[SCROLL] Scrolling {max_scrolls} times for {url}")
+                for i in range(max_scrolls):
+                    if deadline and time.time() + scroll_pause > deadline:
+                        logger.warning(f"[SCROLL] {url}: soft deadline reached after {i} scrolls")
+                        break
+                    body.send_keys(Keys.END)
+                    time.sleep(scroll_pause)
+            except Exception as e:
+                logger.warning(f"[SCROLL_FAIL] {url}: {e}")
         
         # Extract text
-        try:
-            text = driver.find_element(By.TAG_NAME, "body").text.strip()
-            logger.info(f"[TEXT_EXTRACTED] {url}: {len(text)} characters")
-        except Exception as e:
-            logger.error(f"[TEXT_EXTRACT_FAIL] {url}: {e}")
-            text = ""
-        
-        # Validate text length
-        if not text or len(text) < min_content_length:
-            error_msg = f"Extracted text too short or empty: {len(text)} characters (min: {min_content_length})"
-            logger.warning(f"[SHORT_TEXT] {url}: {error_msg}")
-            
-            # Try alternative extraction methods
+        stage = "text_extract"
+        with metrics.span("text_extract", url=url) as span:
             try:
-                # Try getting text from main content areas
-                selectors = ['main', 'article', '.content', '#content', '.post', '.entry']
-                for selector in selectors:
-                    try:
-                        element = driver.find_element(By.CSS_SELECTOR, selector)
-                        alt_text = element.text.strip()
-                        if alt_text and len(alt_text) >= min_content_length:
-                            logger.info(f"[ALT_EXTRACT] {url}: Found text using {selector}: {len(alt_text)} chars")
-                            text = alt_text
-                            break
-                    except:
-                        continue
+                text = driver.find_element(By.TAG_NAME, "body").text.strip()
+                logger.info(f"[TEXT_EXTRACTED] {url}: {len(text)} characters")
             except Exception as e:
-                logger.warning(f"[ALT_EXTRACT_FAIL] {url}: {e}")
-            
-            if not text or len(text) < min_content_length:
-                raise ValueError(error_msg)
+                logger.error(f"[TEXT_EXTRACT_FAIL] {url}: {e}")
+                text = ""
+            span["chars"] = len(text)
         
-        # Language detection (make it optional)
-        if lang and text:
+        # Snapshot the rendered page before validation, so short pages can be re-checked offline
+        if archive and archive.mode == RECORD:
             try:
-                detected_lang = detect(text)
-                if detected_lang != lang:
-                    logger.warning(f"[LANG_MISMATCH] {url}: Expected {lang}, got {detected_lang}")
-                    # Don't fail on language mismatch, just warn
-                    # raise ValueError(f"Non-target language: {detected_lang}")
+                archive.record(DOM, url, json.dumps({
+                    "text": text,
+                    "page_source": driver.page_source,
+                    "current_url": current_url,
+                    "title": driver.title,
+                }), {"current_url": current_url})
             except Exception as e:
-                logger.warning(f"[LANG_DETECT_FAIL] {url}: {e}")
+                logger.warning(f"[ARCHIVE_FAIL] {url}: {e}")
+        
+        stage = "validate"
+        with metrics.span("validate", url=url):
+            if is_blocked_page(driver.title, text):
+                raise BlockedPageError(f"Challenge page: {driver.title!r} ({len(text)} chars)")
+            text = _validate_text(
+                url, text, min_content_length, lang,
+                lambda selector: driver.find_element(By.CSS_SELECTOR, selector).text.strip()
+            )
+        metrics.count("text_chars", len(text), url=url)
         
         logger.info(f"[SUCCESS] {url}: Extracted {len(text)} characters")
-        return url, text
+        return url, text, None
         
     except Exception as e:
         error_msg = f"[EXTRACT_FAIL] {url}: {e}"
         logger.error(error_msg)
+        reason = failure_reason(e)
+        if reason == "timeout" and deadline and time.time() >= deadline:
+            # The load was cut short by the soft deadline, not by the page timeout
+            reason = "deadline"
+        metrics.failure(stage, url, reason)
         
-        if save_screenshot_on_fail:
-            screenshot_name = f"screenshot_fail_{url.replace('https://','').replace('http://','').replace('/','_')}.png"
-            try:
-                driver.save_screenshot(screenshot_name)
-                logger.warning(f"[SCREENSHOT] Saved: {screenshot_name}")
-            except Exception as sse:
-                logger.warning(f"[SCREENSHOT_FAIL] Could not save screenshot for {url}: {sse}")
+        # Screenshot, DOM and console log of sampled failures, written in the background
+        if artifacts:
+            artifacts.capture(driver, url, reason, stage)
         
-        # Print more debug info
-        try:
-            page_source_len = len(driver.page_source) if driver.page_source else 0
-            logger.error(f"[DEBUG] {url}: Page source length: {page_source_len}")
-            logger.error(f"[DEBUG] {url}: Current URL: {driver.current_url}")
-            logger.error(f"[DEBUG] {url}: Page title: {driver.title}")
-        except:
-            pass
-        
-        return url, ""
+        return url, "", reason
+    except WorkerStopped as stop:
+        # Keep what the browser shows after a memory kill (a timed-out driver may not answer),
+        # and flush queued artifacts before quitting a browser that may hang
+        if artifacts and stop.reason == "memory_limit":
+            artifacts.capture(driver, url, stop.reason, stage)
+        close_artifacts()
+        raise
     finally:
         try:
             driver.quit()
-        except:
+        except Exception:
             pass
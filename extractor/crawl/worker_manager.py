@@ -0,0 +1,538 @@
+# extractor/crawl/worker_manager.py
+import os
+import time
+import signal
+import logging
+import threading
+import multiprocessing
+from functools import partial
+from collections import deque
+from multiprocessing.connection import wait
+from extractor.crawl.metrics import NULL_METRICS
+from extractor.crawl.proxy_pool import domain_of, outcome_for
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BROWSER_MB = 700     # starting estimate for one worker + its Chrome, refined by measurement
+DEFAULT_TAB_MB = 250         # starting estimate for each extra tab in a multi-tab browser
+DEFAULT_RESERVE_MB = 1024    # memory left for the OS and the parent process
+DEFAULT_HARD_MAX = 64
+STOP_GRACE_S = 15            # a stopping worker's cleanup time before it is killed (flushing failure
+                             # artifacts alone may take FailureArtifacts.close's 10 s)
+
+# Signals that stop a busy worker, by the reason it is stopped for (POSIX only)
+STOP_SIGNALS = {reason: getattr(signal, name) for reason, name in
+                (("timeout", "SIGUSR1"), ("memory_limit", "SIGUSR2"), ("stopped", "SIGTERM"))
+                if hasattr(signal, name)}
+
+# Managers running in this process (e.g. concurrent crawls in threads) split the free memory
+_running = set()
+_running_lock = threading.Lock()
+
+
+# ---------- Process memory helpers (Linux /proc; degrade to None elsewhere) ----------
+def available_memory_mb():
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def _children_map():
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # Field 4 is the parent PID; the command name (field 2) may contain spaces
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            children.setdefault(ppid, []).append(int(entry))
+        except (OSError, IndexError, ValueError):
+            continue
+    return children
+
+
+def process_tree(pid, children=None):
+    """PID plus all descendant PIDs."""
+    children = children if children is not None else _children_map()
+    tree, stack = [], [pid]
+    while stack:
+        p = stack.pop()
+        tree.append(p)
+        stack.extend(children.get(p, []))
+    return tree
+
+
+def _rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def tree_rss_mb(pid, children=None):
+    """Resident memory of a worker and every browser/driver process it started."""
+    return sum(_rss_mb(p) for p in process_tree(pid, children))
+
+
+def kill_tree(pid):
+    """Kills a worker, its process group and any descendants (Chrome, chromedriver)."""
+    try:
+        pids = process_tree(pid) if os.path.isdir("/proc") else [pid]
+    except OSError:
+        pids = [pid]
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (OSError, AttributeError):
+        pass
+    for p in reversed(pids):
+        try:
+            os.kill(p, signal.SIGKILL)
+        except OSError:
+            pass
+
+
+class StopRequested(Exception):
+    """Raised by BrowserWorkerManager.run when its stop_event is set; its workers have been stopped."""
+
+
+# ---------- Worker ----------
+class WorkerStopped(SystemExit):
+    """
+    Raised in a worker process when the manager stops it while it is busy (reason: "timeout",
+    "memory_limit" or "stopped"). It unwinds the running task like an exit, so cleanup still
+    runs: browsers quit and queued failure artifacts are flushed.
+    """
+
+    def __init__(self, reason):
+        super().__init__(1)
+        self.reason = reason
+
+
+def _on_stop_signal(reason, signum, frame):
+    # Cleanup must not be interrupted by a second signal
+    for sig in STOP_SIGNALS.values():
+        signal.signal(sig, signal.SIG_IGN)
+    raise WorkerStopped(reason)
+
+
+def _worker_main(conn, task_fn, tabs=1, worker_exit=None):
+    # Ignore Ctrl-C in workers; the parent decides when to stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    for reason, sig in STOP_SIGNALS.items():
+        signal.signal(sig, partial(_on_stop_signal, reason))
+    try:
+        # Own process group, so the browser it starts can be killed together with it
+        os.setsid()
+    except (OSError, AttributeError):
+        pass
+    try:
+        if tabs > 1:
+            import asyncio
+            asyncio.run(_serve_concurrent(conn, task_fn))
+        else:
+            while True:
+                try:
+                    task = conn.recv()
+                except (EOFError, OSError):
+                    break
+                if task is None:
+                    break
+                conn.send(("start", task[0], time.time()))
+                conn.send(("done",) + tuple(task_fn(task)))
+    finally:
+        if worker_exit:
+            try:
+                worker_exit()
+            except Exception as e:
+                logger.warning(f"[WORKERS] Worker cleanup failed: {e}")
+        conn.close()
+
+
+async def _serve_concurrent(conn, task_fn):
+    """Runs each received task as a coroutine as soon as it arrives; returns on stop or EOF."""
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    inbox = asyncio.Queue()
+
+    def on_readable():
+        try:
+            inbox.put_nowait(conn.recv())
+        except (EOFError, OSError):
+            loop.remove_reader(conn.fileno())
+            inbox.put_nowait(None)
+
+    async def run(task):
+        conn.send(("start", task[0], time.time()))
+        conn.send(("done",) + tuple(await task_fn(task)))
+
+    running = set()
+    loop.add_reader(conn.fileno(), on_readable)
+    try:
+        while True:
+            task = await inbox.get()
+            if task is None:
+                break
+            future = asyncio.ensure_future(run(task))
+            running.add(future)
+            future.add_done_callback(running.discard)
+    finally:
+        try:
+            loop.remove_reader(conn.fileno())
+        except (OSError, ValueError):
+            pass
+    # Only idle workers are asked to stop, so this is normally empty
+    if running:
+        await asyncio.gather(*running, return_exceptions=True)
+
+
+class _Worker:
+    def __init__(self, ctx, task_fn, tabs=1, worker_exit=None):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn, task_fn, tabs, worker_exit), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.capacity = tabs
+        self.tasks = {}          # url -> task
+        self.started = {}        # url -> start time
+        self.deadlines = {}      # url -> watchdog deadline in seconds (None: no limit)
+        self.proxy = None        # proxy of the most recent task (the browser's, in multi-tab mode)
+        self.peak_mb = 0.0
+        self.peak_tasks = 0
+
+    @property
+    def pid(self):
+        return self.process.pid
+
+    @property
+    def free(self):
+        return self.capacity - len(self.tasks)
+
+    def assign(self, task, deadline=None):
+        self.tasks[task[0]] = task
+        self.started[task[0]] = time.time()
+        self.deadlines[task[0]] = deadline
+        self.peak_tasks = max(self.peak_tasks, len(self.tasks))
+        self.proxy = task[1].get("proxy")
+        self.conn.send(task)
+
+    def finish(self, url):
+        """Removes a finished task; returns (task, start time)."""
+        self.deadlines.pop(url, None)
+        return self.tasks.pop(url, None), self.started.pop(url, None)
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (OSError, BrokenPipeError):
+            pass
+
+    def terminate(self, reason):
+        """Interrupts a busy worker (see WorkerStopped); it cleans up and exits on its own."""
+        try:
+            os.kill(self.pid, STOP_SIGNALS.get(reason, signal.SIGTERM))
+        except OSError:
+            pass
+
+    def kill(self):
+        kill_tree(self.pid)
+        self.process.join(timeout=5)
+        self.conn.close()
+
+
+class BrowserWorkerManager:
+    """
+    Runs browser extraction tasks in worker processes, sizing concurrency by memory.
+    - Each worker runs one task (one Chrome) at a time, or with tabs > 1, up to tabs
+      tasks at once in one Chrome: task_fn is then a coroutine function, run on an event
+      loop in the worker (see extractor.crawl.tabs). Tasks are packed into workers that
+      already have a browser running before new workers are started.
+    - Concurrency is re-evaluated every rescale_interval seconds:
+      target = busy workers + (available RAM - reserve) / measured memory per worker,
+      clamped to [min_workers, max_workers]. Managers running at the same time in one
+      process (concurrent crawls) each count only their share of the free memory. It stays at min_workers until a running browser
+      has been measured or a task has finished, then at most doubles per interval. Idle workers above target are
+      retired; they are joined once they exit, or killed if they do not.
+    - Memory per worker starts at browser_mb (default: one browser plus DEFAULT_TAB_MB
+      per extra tab) and follows the measured peak RSS of worker process trees
+      (worker + Chrome + chromedriver), scaled up to a full worker's tabs.
+    - A worker whose tree exceeds memory_limit_mb is stopped; its URLs fail and a fresh worker takes over.
+    - Watchdog: a task still running after its deadline has its worker and browser
+      stopped. deadline is seconds per task, or a function of the task, so retries with
+      longer waits get more time; the URL fails as "timeout", other tabs of that browser as "worker_crash",
+      and the remaining tasks keep draining. Stopped workers are signalled (WorkerStopped)
+      and given STOP_GRACE_S to clean up before they are killed; their results do not wait for it.
+    - With a ProxyPool, each task gets its proxy at dispatch and reports its outcome back.
+      In multi-tab mode a worker's browser keeps its proxy while the pool considers it healthy.
+    - Setting stop_event (a threading.Event) ends run() within a rescale interval: the
+      workers are stopped and StopRequested is raised.
+    """
+
+    def __init__(
+        self,
+        task_fn,
+        max_workers=None,
+        min_workers=1,
+        browser_mb=None,
+        reserve_mb=DEFAULT_RESERVE_MB,
+        memory_limit_mb=None,
+        rescale_interval=2.0,
+        deadline=None,
+        metrics=NULL_METRICS,
+        proxy_pool=None,
+        tabs=1,
+        worker_exit=None,
+        stop_event=None
+    ):
+        self.task_fn = task_fn
+        self.max_workers = max_workers or DEFAULT_HARD_MAX
+        self.min_workers = max(1, min(min_workers, self.max_workers))
+        self.tabs = max(1, tabs)
+        self.browser_mb = browser_mb or DEFAULT_BROWSER_MB + (self.tabs - 1) * DEFAULT_TAB_MB
+        self.reserve_mb = reserve_mb
+        self.memory_limit_mb = memory_limit_mb
+        self.rescale_interval = rescale_interval
+        self.deadline = deadline
+        self.metrics = metrics
+        self.proxy_pool = proxy_pool
+        self.worker_exit = worker_exit
+        self.stop_event = stop_event
+        self.ctx = multiprocessing.get_context("fork") if hasattr(os, "fork") else multiprocessing.get_context()
+        self.workers = []
+        self.retired = []        # (worker, kill time): asked to stop, reaped once they exit
+        self.target = self.min_workers
+        self.measure = os.path.isdir("/proc")
+        self.measured = False    # no browser measured yet: stay at min_workers
+
+    # ---------- Sizing ----------
+    def _observe(self):
+        """Samples busy workers' tree RSS; returns those above memory_limit_mb."""
+        if not self.measure:
+            return []
+        children = _children_map()
+        over_limit = []
+        for worker in self.workers:
+            if not worker.tasks:
+                continue
+            rss = tree_rss_mb(worker.pid, children)
+            worker.peak_mb = max(worker.peak_mb, rss)
+            if rss > 100:
+                self.measured = True
+            if self.memory_limit_mb and rss > self.memory_limit_mb:
+                over_limit.append(worker)
+        return over_limit
+
+    def _learn(self, worker):
+        # Exponential moving average of per-worker peaks, extrapolated to all of its tabs
+        # (an overestimate, which errs on the safe side); ignores workers that never started a browser
+        if worker.peak_mb > 100:
+            sample = worker.peak_mb * worker.capacity / max(1, worker.peak_tasks)
+            self.browser_mb = 0.7 * self.browser_mb + 0.3 * sample
+        # A finished task counts as measured even without a browser (PDFs, replay, static tier)
+        self.measured = True
+        worker.peak_mb = 0.0
+        worker.peak_tasks = 0
+
+    def _rescale(self):
+        busy = sum(1 for w in self.workers if w.tasks)
+        available = available_memory_mb() if self.measure else None
+        if available is None:
+            target = min(self.max_workers, multiprocessing.cpu_count())
+        else:
+            # Browsers still loading may already be above the learned average
+            live = [w.peak_mb * w.capacity / max(1, len(w.tasks)) for w in self.workers if w.tasks and w.peak_mb > 100]
+            per_browser = max([self.browser_mb] + live)
+            # Other managers see the same free memory, so each one only claims its share of it
+            with _running_lock:
+                share = max(1, len(_running))
+            headroom = available - self.reserve_mb
+            target = busy + int(headroom / share // per_browser)
+            # Ramp up: min_workers until a browser has been measured, then at most double per rescale
+            target = min(target, 2 * len(self.workers) if self.measured else self.min_workers)
+        target = max(self.min_workers, min(self.max_workers, target))
+        if target != self.target:
+            logger.info(
+                f"[WORKERS] Target {self.target} -> {target} "
+                f"(available={available and round(available)} MB, per browser~{round(self.browser_mb)} MB, busy={busy})"
+            )
+        self.target = target
+
+    # ---------- Main loop ----------
+    def run(self, tasks, retry_queue=None):
+        """
+        Runs (url, kwargs) tasks; task_fn returns (url, text, failure_reason or None).
+        Yields those results as each task finishes. With a RetryQueue, failed tasks are
+        re-queued after their backoff and run alongside the rest; only their final result is yielded.
+        """
+        pending = deque(tasks)
+        outstanding = len(pending)
+        with _running_lock:
+            _running.add(self)
+        self._rescale()
+        next_rescale = time.time() + self.rescale_interval
+        try:
+            while outstanding:
+                if self.stop_event is not None and self.stop_event.is_set():
+                    logger.warning(f"[WORKERS] Stop requested; stopping {len(self.workers)} workers "
+                                   f"with {self._busy()} tasks running")
+                    raise StopRequested(f"stopped with {outstanding} tasks unfinished")
+                if retry_queue is not None:
+                    pending.extend(retry_queue.pop_ready())
+
+                # Retire idle workers above target, spawn up to target, dispatch work
+                idle = [w for w in self.workers if not w.tasks]
+                excess = len(self.workers) - self.target
+                for worker in idle[:max(0, excess)]:
+                    self._retire(worker)
+                self._reap()
+                needed = -(-(len(pending) + self._busy()) // self.tabs)
+                while len(self.workers) < min(self.target, needed):
+                    self.workers.append(_Worker(self.ctx, self.task_fn, self.tabs, self.worker_exit))
+                # Fill browsers that are already running first
+                for worker in sorted(self.workers, key=lambda w: -len(w.tasks)):
+                    while pending and worker.free > 0:
+                        task = self._with_proxy(pending.popleft(), worker)
+                        worker.assign(task, self._deadline_for(task))
+
+                wake = min([next_rescale] + self._deadlines() + [kill_at for _, kill_at in self.retired])
+                if retry_queue is not None and retry_queue.next_ready():
+                    wake = min(wake, retry_queue.next_ready())
+                ready = wait([w.conn for w in self.workers], timeout=max(0.05, wake - time.time()))
+                finished = []
+                for conn in ready:
+                    worker = next((w for w in self.workers if w.conn is conn), None)
+                    if worker is None:
+                        continue
+                    try:
+                        message = conn.recv()
+                    except (EOFError, OSError):
+                        finished.extend(self._fail(worker, "worker_crash"))
+                        continue
+                    if message[0] == "start":
+                        if message[1] in worker.started:
+                            worker.started[message[1]] = time.time()
+                    elif message[0] == "done":
+                        task, started = worker.finish(message[1])
+                        if task is None:
+                            continue
+                        finished.append(self._complete(task, started, tuple(message[1:])))
+                        if not worker.tasks:
+                            self._learn(worker)
+
+                now = time.time()
+                for worker in list(self.workers):
+                    overdue = [url for url, started in worker.started.items()
+                               if worker.deadlines.get(url) and now - started > worker.deadlines[url]]
+                    if overdue:
+                        logger.warning(f"[WATCHDOG] {', '.join(overdue)} exceeded the "
+                                       f"{round(worker.deadlines[overdue[0]])}s deadline; stopping worker {worker.pid} and its browser")
+                        finished.extend(self._fail(worker, "timeout", overdue))
+
+                if time.time() >= next_rescale:
+                    for worker in self._observe():
+                        logger.warning(f"[WORKERS] {', '.join(worker.tasks)} exceeded {self.memory_limit_mb} MB "
+                                       f"({round(worker.peak_mb)} MB); stopping browser")
+                        # With several tabs open the page responsible is unknown; all of them are retried
+                        finished.extend(self._fail(worker, "memory_limit", None if len(worker.tasks) == 1 else ()))
+                    self._rescale()
+                    next_rescale = time.time() + self.rescale_interval
+
+                for task, result in finished:
+                    reason = result[2]
+                    if reason and retry_queue is not None and retry_queue.schedule(task, reason) is not None:
+                        continue
+                    outstanding -= 1
+                    yield result
+        finally:
+            with _running_lock:
+                _running.discard(self)
+            self.shutdown()
+
+    def _with_proxy(self, task, worker):
+        if not self.proxy_pool:
+            return task
+        url, kwargs = task
+        kwargs = dict(kwargs)
+        exclude = kwargs.pop("exclude_proxy", None)
+        # A multi-tab browser has one proxy; keep using it so its tabs can share the browser
+        prefer = worker.proxy if worker.capacity > 1 else None
+        kwargs["proxy"] = self.proxy_pool.acquire(domain_of(url), exclude=(exclude,) if exclude else (), prefer=prefer)
+        return url, kwargs
+
+    def _complete(self, task, started, result, charge_proxy=True):
+        """
+        Pairs a task with its result and reports the outcome to the proxy pool.
+        charge_proxy=False only frees the proxy slot (kills by this manager say nothing about the proxy).
+        """
+        if self.proxy_pool:
+            outcome = outcome_for(result[2]) if charge_proxy else None
+            self.proxy_pool.release(task[1].get("proxy"), outcome, time.time() - started)
+        return task, result
+
+    def _retire(self, worker, grace=STOP_GRACE_S):
+        """Asks a worker to exit; _reap joins it, or kills it if it is still alive after grace seconds."""
+        worker.stop()
+        if worker in self.workers:
+            self.workers.remove(worker)
+        self.retired.append((worker, time.time() + grace))
+
+    def _reap(self, force=False):
+        """Joins retired workers that exited and kills those past their grace period (all of them with force)."""
+        now = time.time()
+        remaining = []
+        for worker, kill_at in self.retired:
+            if not worker.process.is_alive():
+                worker.process.join(timeout=0)
+                worker.conn.close()
+            elif force or now >= kill_at:
+                worker.kill()
+            else:
+                remaining.append((worker, kill_at))
+        self.retired = remaining
+
+    def _deadline_for(self, task):
+        return self.deadline(task) if callable(self.deadline) else self.deadline
+
+    def _deadlines(self):
+        return [started + w.deadlines[url] for w in self.workers
+                for url, started in w.started.items() if w.deadlines.get(url)]
+
+    def _busy(self):
+        return sum(len(w.tasks) for w in self.workers)
+
+    def _fail(self, worker, reason, culprits=None):
+        """
+        Stops a worker; returns [(task, failed result)] for the tasks it was running.
+        Tasks in culprits (default: all) fail with reason, the others with "worker_crash".
+        """
+        tasks, started = list(worker.tasks.values()), dict(worker.started)
+        worker.terminate(reason)
+        self._retire(worker)
+        results = []
+        for task in tasks:
+            task_reason = reason if culprits is None or task[0] in culprits else "worker_crash"
+            logger.error(f"[WORKER_FAIL] {task[0]}: {task_reason}")
+            self.metrics.failure("watchdog", task[0], task_reason)
+            # Watchdog and memory kills are about the page or the browser, not the proxy
+            results.append(self._complete(task, started[task[0]], (task[0], "", task_reason), charge_proxy=False))
+        return results
+
+    def shutdown(self):
+        for worker in list(self.workers):
+            if worker.tasks:
+                worker.terminate("stopped")
+            self._retire(worker)
+        for worker, kill_at in self.retired:
+            worker.process.join(timeout=max(0, kill_at - time.time()))
+        self._reap(force=True)
+        self.workers = []
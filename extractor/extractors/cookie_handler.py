@@ -1,103 +1,164 @@
 import logging
 import time
-from selenium.webdriver.common.by import By
-from selenium.common.exceptions import (
-    NoSuchElementException,
-    ElementClickInterceptedException,
-    ElementNotInteractableException,
-    StaleElementReferenceException,
-    WebDriverException,
-    TimeoutException,
-)
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+import inspect
+from extractor.crawl.metrics import NULL_METRICS
 
 logger = logging.getLogger(__name__)
 
+# Selenium locator strategies (the values of selenium's By constants), so this module
+# can be imported without loading selenium
+BY_ID = "id"
+BY_CLASS_NAME = "class name"
+BY_XPATH = "xpath"
+BY_TAG_NAME = "tag name"
+
 # Patterns for consent buttons (expand as needed)
 CONSENT_PATTERNS = [
-    {"by": By.ID, "value": "accept"},
-    {"by": By.ID, "value": "cookie-accept"},
-    {"by": By.ID, "value": "onetrust-accept-btn-handler"},
-    {"by": By.CLASS_NAME, "value": "accept-cookies"},
-    {"by": By.CLASS_NAME, "value": "cookie-consent-accept"},
-    {"by": By.XPATH, "value": "//*[contains(text(),'Accept')]"},
-    {"by": By.XPATH, "value": "//*[contains(text(),'I agree')]"},
-    {"by": By.XPATH, "value": "//*[contains(text(),'Allow all')]"},
-    {"by": By.XPATH, "value": "//*[contains(text(),'Got it')]"},
+    {"by": BY_ID, "value": "accept"},
+    {"by": BY_ID, "value": "cookie-accept"},
+    {"by": BY_ID, "value": "onetrust-accept-btn-handler"},
+    {"by": BY_CLASS_NAME, "value": "accept-cookies"},
+    {"by": BY_CLASS_NAME, "value": "cookie-consent-accept"},
+    {"by": BY_XPATH, "value": "//*[contains(text(),'Accept')]"},
+    {"by": BY_XPATH, "value": "//*[contains(text(),'I agree')]"},
+    {"by": BY_XPATH, "value": "//*[contains(text(),'Allow all')]"},
+    {"by": BY_XPATH, "value": "//*[contains(text(),'Got it')]"},
     # Add more patterns and languages as needed
 ]
 
-def switch_to_iframe_if_present(driver):
-    """Switch to the first iframe if a consent banner is inside it."""
+POLL_INTERVAL = 0.5   # seconds between probes while waiting for a banner
+CLICK_SETTLE = 1      # seconds for a banner to close after a click
+MAX_IFRAMES = 5       # iframes searched per probe
+
+
+def cookie_budget(timeout=7, retry=2):
+    """Approximate upper bound on the seconds handle_cookie_consent takes, banner or not."""
+    # Each attempt polls for timeout seconds, plus a click settle and the pause between attempts
+    return retry * (timeout + 2 * CLICK_SETTLE)
+
+
+def _clickable(driver, pattern):
+    # One non-blocking lookup; WebDriverWait would block for its whole timeout on every miss
+    for element in driver.find_elements(pattern["by"], pattern["value"]):
+        try:
+            if element.is_displayed() and element.is_enabled():
+                return element
+        except Exception:
+            continue
+    return None
+
+
+def click_consent_button(driver, metrics=NULL_METRICS, url=None):
+    """
+    One quick pass over the page: clicks the first visible consent button in the main
+    document or in one of its first MAX_IFRAMES iframes. Returns True if it clicked.
+    Always leaves the driver in the main document.
+    """
+    for pattern in CONSENT_PATTERNS:
+        element = _clickable(driver, pattern)
+        if element is not None:
+            try:
+                element.click()
+            except Exception as e:
+                logger.debug(f"[COOKIE][CLICK] {pattern}: {e}")
+                continue
+            logger.info(f"[COOKIE] Clicked consent button: {pattern}")
+            metrics.count("cookie_clicks", url=url, where="main")
+            return True
+
     try:
-        iframes = driver.find_elements(By.TAG_NAME, "iframe")
-        for iframe in iframes:
+        iframes = driver.find_elements(BY_TAG_NAME, "iframe")[:MAX_IFRAMES]
+    except Exception as e:
+        logger.debug(f"[COOKIE][IFRAME] Could not list iframes: {e}")
+        return False
+    for iframe in iframes:
+        try:
+            driver.switch_to.frame(iframe)
+            for pattern in CONSENT_PATTERNS:
+                element = _clickable(driver, pattern)
+                if element is not None:
+                    element.click()
+                    logger.info(f"[COOKIE][IFRAME] Clicked consent button: {pattern}")
+                    metrics.count("cookie_clicks", url=url, where="iframe")
+                    return True
+        except Exception as e:
+            logger.debug(f"[COOKIE][IFRAME] Error in iframe: {e}")
+        finally:
             try:
-                driver.switch_to.frame(iframe)
-                # Try to find a consent button in this iframe
-                for pattern in CONSENT_PATTERNS:
-                    if driver.find_elements(pattern["by"], pattern["value"]):
-                        return True
                 driver.switch_to.default_content()
             except Exception:
-                driver.switch_to.default_content()
-                continue
-    except Exception as e:
-        logger.debug(f"[COOKIE][IFRAME] Error switching to iframe: {e}")
+                pass
     return False
 
-def handle_cookie_consent(driver, timeout=7, retry=2):
+
+def consent_steps(driver, timeout=7, retry=2, metrics=NULL_METRICS, url=None):
     """
-    Attempts to click cookie consent buttons on common popups.
-    - Waits for banners to appear.
-    - Handles iframes.
-    - Retries and confirms dismissal.
+    handle_cookie_consent as a generator of short driver steps: each step is one quick
+    probe (click_consent_button or a banner check), and it yields the seconds to pause
+    before the next. Returns True once a banner was clicked away.
+    A shared browser can run the steps of several tabs in turn (see extractor.crawl.tabs).
     """
     for attempt in range(retry):
+        metrics.count("cookie_attempts", url=url)
+        deadline = time.time() + timeout
+        while True:
+            try:
+                clicked = click_consent_button(driver, metrics=metrics, url=url)
+            except Exception as e:
+                logger.warning(f"[COOKIE_HANDLER] Exception: {e}")
+                clicked = False
+            if clicked:
+                yield CLICK_SETTLE
+                # Confirm banner is gone
+                if not is_consent_banner_present(driver):
+                    return True
+            if time.time() >= deadline:
+                break
+            yield POLL_INTERVAL
+        logger.info("[COOKIE] No known consent button found on attempt %d.", attempt + 1)
+        if attempt + 1 < retry:
+            yield CLICK_SETTLE
+    return False
+
+
+def handle_cookie_consent(driver, timeout=7, retry=2, metrics=NULL_METRICS, url=None):
+    """
+    Attempts to click cookie consent buttons on common popups.
+    - Polls for a banner for up to timeout seconds per attempt, with quick non-blocking
+      lookups in the main document and its iframes.
+    - Retries and confirms dismissal; bounded by cookie_budget(timeout, retry) on pages without a banner.
+    - Records attempts, clicks and which document (main/iframe) held the banner in metrics.
+    Extractors call cookie handlers through run_cookie_handler: with metrics and url when
+    the handler accepts them, otherwise as handler(driver). The return value is whether a
+    banner was accepted.
+    A browser shared by several tabs uses handler.steps instead when the handler has one
+    (here consent_steps), so other tabs keep working during the polling pauses.
+    """
+    steps = consent_steps(driver, timeout=timeout, retry=retry, metrics=metrics, url=url)
+    while True:
         try:
-            # Try in main document
-            for pattern in CONSENT_PATTERNS:
-                try:
-                    element = WebDriverWait(driver, timeout).until(
-                        EC.element_to_be_clickable((pattern["by"], pattern["value"]))
-                    )
-                    element.click()
-                    logger.info(f"[COOKIE] Clicked consent button: {pattern}")
-                    time.sleep(1)
-                    # Confirm banner is gone
-                    if not is_consent_banner_present(driver):
-                        return True
-                except (TimeoutException, NoSuchElementException, ElementClickInterceptedException,
-                        ElementNotInteractableException, StaleElementReferenceException):
-                    continue
-                except WebDriverException as e:
-                    logger.warning(f"[COOKIE][CLICK] WebDriverException: {e}")
-                    continue
-
-            # Try in iframes
-            if switch_to_iframe_if_present(driver):
-                for pattern in CONSENT_PATTERNS:
-                    try:
-                        element = WebDriverWait(driver, timeout).until(
-                            EC.element_to_be_clickable((pattern["by"], pattern["value"]))
-                        )
-                        element.click()
-                        logger.info(f"[COOKIE][IFRAME] Clicked consent button: {pattern}")
-                        driver.switch_to.default_content()
-                        time.sleep(1)
-                        if not is_consent_banner_present(driver):
-                            return True
-                    except Exception:
-                        driver.switch_to.default_content()
-                        continue
-                driver.switch_to.default_content()
+            pause = next(steps)
+        except StopIteration as done:
+            return bool(done.value)
+        time.sleep(pause)
 
-            logger.info("[COOKIE] No known consent button found on attempt %d.", attempt + 1)
-            time.sleep(1)
-        except Exception as e:
-            logger.warning(f"[COOKIE_HANDLER] Exception: {e}")
-    return False
+
+handle_cookie_consent.steps = consent_steps
+
+def run_cookie_handler(handler, driver, metrics=NULL_METRICS, url=None):
+    """
+    Calls a cookie handler, passing metrics and url only if its signature takes them, so
+    handlers written as handler(driver) keep working.
+    """
+    try:
+        params = inspect.signature(handler).parameters.values()
+    except (TypeError, ValueError):
+        return handler(driver)
+    if any(p.kind == p.VAR_KEYWORD for p in params):
+        return handler(driver, metrics=metrics, url=url)
+    names = {p.name for p in params}
+    kwargs = {k: v for k, v in (("metrics", metrics), ("url", url)) if k in names}
+    return handler(driver, **kwargs)
 
 def is_consent_banner_present(driver):
     """
@@ -1,6 +1,9 @@
 import sys
 import os
 import re
+import time
+import logging
+import shutil
 import tempfile
 import pandas as pd
 import streamlit as st
@@ -20,9 +23,22 @@ except ModuleNotFoundError:
     sys.modules["distutils"] = distutils
     sys.modules["distutils.version"] = distutils.version
 
-from extractor.crawl.core import crawl_website
-from analyzer.analyze import analyze_text
-from analyzer.utils.config_utils import load_config, save_config
+from interface.jobs import CrawlJobRunner, QUEUED, RUNNING, DONE
+from analyzer.batch import analyze_documents, expand_upload, read_document, rescore_indexes, results_to_rows
+from analyzer.compare import compare_competitors
+from analyzer.utils.token_index import iter_index_paths, load_token_index
+from analyzer.utils.config_utils import CONFIG_PATH, load_config, save_config
+
+logging.basicConfig(level=logging.INFO)
+
+INDEX_DIR = os.path.join("output", "index")
+
+CRAWL_PARAMS = {
+    "max_pages": 20,
+    "save_screenshot_on_fail": True,
+    "lang": "en",
+    "min_content_length": 400,
+}
 
 # ---------- Utilities ----------
 def is_valid_url(url):
@@ -32,104 +48,260 @@ def is_valid_url(url):
 def sanitize_filename(filename):
     return re.sub(r'[^A-Za-z0-9_.-]', '_', filename)
 
+def escape_markdown(text):
+    # Competitor text and config keywords are shown literally, not as markdown, LaTeX or emoji codes
+    return re.sub(r'([\\`*_{}\[\]()#+\-.!|>~<$:])', r'\\\1', text)
+
+def highlight_snippet(snippet):
+    # Bold each keyword hit; hit offsets are relative to the snippet text
+    text = snippet["text"]
+    parts, pos = [], 0
+    for start, length in sorted(snippet["hits"]):
+        if start < pos:
+            continue
+        parts.append(escape_markdown(text[pos:start]))
+        parts.append(f"**{escape_markdown(text[start:start + length])}**")
+        pos = start + length
+    parts.append(escape_markdown(text[pos:]))
+    return "...{}...".format("".join(parts).replace("\n", " "))
+
+def save_uploads(uploaded_files, directory):
+    """Copies uploads into directory in chunks; returns [(upload name, path)] for expand_upload."""
+    saved = []
+    for i, uploaded_file in enumerate(uploaded_files):
+        path = os.path.join(directory, f"{i}_{sanitize_filename(uploaded_file.name)}")
+        uploaded_file.seek(0)
+        with open(path, "wb") as f:
+            shutil.copyfileobj(uploaded_file, f, 1 << 20)
+        saved.append((uploaded_file.name, path))
+    return saved
+
+def upload_key(uploaded_files):
+    # Same files and same keyword config give the same analysis
+    files = tuple((f.name, f.size, getattr(f, "file_id", None)) for f in uploaded_files)
+    return files, os.path.getmtime(CONFIG_PATH)
+
 def log_error(msg):
     with tempfile.NamedTemporaryFile(delete=False, mode='a', suffix='.log', prefix='streamlit_app_', dir=tempfile.gettempdir()) as f:
         f.write(msg + '\n')
 
+# ---------- Caching ----------
+@st.cache_resource
+def get_job_runner():
+    # One runner per server process, shared by every session
+    return CrawlJobRunner()
+
+@st.cache_data
+def _load_config_cached(mtime):
+    return load_config()
+
+def get_config():
+    # Keyed by file mtime so saved edits invalidate the cache
+    return _load_config_cached(os.path.getmtime(CONFIG_PATH))
+
+@st.cache_data(max_entries=32)
+def load_job_text(job_id, run_id):
+    results = get_job_runner().result(job_id)
+    return "\n\n".join(results.values()) if results else ""
+
 # ---------- Streamlit UI ----------
 st.set_page_config(page_title="Competitor Analyzer", layout="wide")
 st.title("Competitor Analysis Tool")
 
 st.sidebar.header("Navigation")
-section = st.sidebar.radio("Choose Section:", ["Extractor", "Analyzer", "Config Editor"])
+section = st.sidebar.radio("Choose Section:", ["Extractor", "Analyzer", "Comparison", "Config Editor"])
 
 # ---------- Extractor ----------
 if section == "Extractor":
     st.subheader("Website Text Extractor")
     url = st.text_input("Enter website URL:")
 
+    runner = get_job_runner()
+
     if st.button("Extract Text"):
         if not url or not is_valid_url(url):
             st.warning("Please enter a valid URL (starting with http:// or https://).")
         else:
-            with st.spinner("Extracting content..."):
-                try:
-                    results = crawl_website(
-                        base_url=url,
-                        max_pages=20,
-                        save_text=False,
-                        show_progress=False,
-                        save_screenshot_on_fail=True,
-                        lang="en",
-                        min_content_length=400
-                    )
-                    extracted_text = "\n\n".join(results.values()) if results else ""
-                    if extracted_text.strip():
-                        filename = sanitize_filename(url.replace('https://', '').replace('http://', '').replace('/', '_')) + ".txt"
-                        st.success(f"Extraction complete. Filename: `{filename}`")
-                        st.download_button("Download Extracted Text", data=extracted_text, file_name=filename)
-                    else:
-                        st.error("Extraction returned no text. The website may be protected, empty, or not supported.")
-                except Exception as e:
-                    log_error(f"[Extractor] URL: {url} | Error: {str(e)}")
-                    st.error(f"Failed to extract text from the URL. Error: {e}")
+            try:
+                st.session_state["job_id"] = runner.submit(url.strip(), **CRAWL_PARAMS)
+            except Exception as e:
+                log_error(f"[Extractor] URL: {url} | Error: {str(e)}")
+                st.error(f"Failed to start extraction for the URL. Error: {e}")
+
+    job_id = st.session_state.get("job_id")
+    job = runner.status(job_id) if job_id else None
+    if job:
+        st.caption(f"Job `{job_id}` for {job['url']}")
+        page_scores = runner.page_scores(job_id)
+        if page_scores:
+            partial = job.get("partial") or {}
+            st.markdown(f"**Running score:** {partial.get('score')} over {job.get('pages_scored')} pages")
+            st.dataframe(pd.DataFrame([
+                {"URL": p["url"], "Characters": p["characters"], "Score": p["score"], **p["buckets"]}
+                for p in page_scores
+            ]), use_container_width=True)
+        if job["status"] in (QUEUED, RUNNING):
+            st.info(f"Extraction {job['status']}... this page refreshes automatically.")
+            time.sleep(2)
+            st.rerun()
+        elif job["status"] == DONE:
+            extracted_text = load_job_text(job_id, job["run_id"])
+            if extracted_text.strip():
+                filename = sanitize_filename(job["url"].replace('https://', '').replace('http://', '').replace('/', '_')) + ".txt"
+                st.success(f"Extraction complete. {job.get('pages', 0)} pages. Filename: `{filename}`")
+                st.download_button("Download Extracted Text", data=extracted_text, file_name=filename)
+            else:
+                st.error("Extraction returned no text. The website may be protected, empty, or not supported.")
+        else:
+            st.error(f"Extraction {job['status']}. {job.get('error', '')}")
+            if st.button("Retry"):
+                st.session_state["job_id"] = runner.submit(job["url"], force=True, **job["params"])
+                st.rerun()
+
+    with st.expander("Recent jobs"):
+        jobs = runner.list_jobs()
+        if jobs:
+            st.dataframe(pd.DataFrame([
+                {"Job": j["job_id"], "URL": j["url"], "Status": j["status"], "Pages": j.get("pages")}
+                for j in jobs
+            ]), use_container_width=True)
+        else:
+            st.write("No jobs yet.")
 
 # ---------- Analyzer ----------
 elif section == "Analyzer":
     st.subheader("Content Analyzer")
-    uploaded_file = st.file_uploader("Upload a .txt file for analysis", type=["txt"])
+    uploaded_files = st.file_uploader(
+        "Upload .txt files or .zip archives of .txt files for analysis",
+        type=["txt", "zip"],
+        accept_multiple_files=True
+    )
 
-    if uploaded_file:
+    if uploaded_files:
         try:
-            uploaded_file.seek(0, os.SEEK_END)
-            file_size = uploaded_file.tell()
-            uploaded_file.seek(0)
-
-            if file_size > 5 * 1024 * 1024:
-                st.error("File too large. Please upload a text file smaller than 5MB.")
+            # Reruns (widget changes, downloads) reuse the batch until the files or the config change
+            batch_key = upload_key(uploaded_files)
+            cached = st.session_state.get("analyzer_batch")
+            if cached and cached[0] == batch_key:
+                results = cached[1]
             else:
-                try:
-                    text = uploaded_file.read().decode("utf-8")
-                except UnicodeDecodeError:
-                    uploaded_file.seek(0)
-                    try:
-                        text = uploaded_file.read().decode("latin-1")
-                        st.info("File decoded with latin-1 encoding.")
-                    except Exception:
-                        st.error("Unable to decode file. Please upload a valid UTF-8 or latin-1 encoded text file.")
-                        text = None
-
-                if text:
-                    base_url = sanitize_filename(uploaded_file.name.replace(".txt", ""))
-                    with st.spinner("Analyzing..."):
+                results = None
+                with tempfile.TemporaryDirectory(prefix="analyzer_") as upload_dir:
+                    documents = []
+                    for name, path in save_uploads(uploaded_files, upload_dir):
                         try:
-                            results = analyze_text(base_url, text)
+                            for member, source in expand_upload(path, name):
+                                documents.append((sanitize_filename(os.path.splitext(member)[0]), source))
                         except Exception as e:
-                            log_error(f"[Analyzer] File: {uploaded_file.name} | Error: {str(e)}")
-                            st.error(f"Analysis failed due to an internal error: {e}")
-                            results = None
+                            log_error(f"[Analyzer] File: {name} | Error: {str(e)}")
+                            st.error(f"Could not read {name}: {e}")
 
-                    if results and isinstance(results, dict) and any(results.values()):
-                        st.success("Analysis complete.")
-                        try:
-                            df = pd.DataFrame([results])
-                            st.dataframe(df)
-                            csv = df.to_csv(index=False).encode("utf-8")
-                            st.download_button("Download Results as CSV", data=csv, file_name="analysis_result.csv")
-                        except Exception as e:
-                            log_error(f"[Analyzer] DataFrame/Export error: {str(e)}")
-                            st.error("Error displaying or exporting results.")
+                    if not documents:
+                        st.error("No .txt documents found in the upload.")
                     else:
-                        st.error("Analysis returned no results. Please check the uploaded file content.")
+                        # Workers stream their own files, decoded with utf-8/latin-1 fallback
+                        with st.spinner(f"Analyzing {len(documents)} document(s)..."):
+                            try:
+                                results = analyze_documents(documents, index_dir=INDEX_DIR, evidence=True)
+                            except Exception as e:
+                                log_error(f"[Analyzer] Batch of {len(documents)} files | Error: {str(e)}")
+                                st.error(f"Analysis failed due to an internal error: {e}")
+                                results = []
+                        st.session_state["analyzer_batch"] = (batch_key, results)
+
+            if results is not None:
+                if results:
+                    st.success(f"Analysis complete for {len(results)} document(s).")
+                    try:
+                        df = pd.DataFrame(results_to_rows(results))
+                        st.dataframe(df, use_container_width=True)
+                        csv = df.to_csv(index=False).encode("utf-8")
+                        st.download_button("Download Results as CSV", data=csv, file_name="analysis_results.csv")
+                    except Exception as e:
+                        log_error(f"[Analyzer] DataFrame/Export error: {str(e)}")
+                        st.error("Error displaying or exporting results.")
+
+                    st.markdown("### Evidence")
+                    for result in results:
+                        with st.expander(f"{escape_markdown(result['identifier'])} (score: {result['score']})"):
+                            for bucket, details in result.get("evidence", {}).items():
+                                hits = {kw: n for kw, n in details["hits"].items() if n}
+                                st.markdown(f"**{escape_markdown(bucket)}**: " + (", ".join(f"{escape_markdown(kw)} x{n}" for kw, n in hits.items()) or "no hits"))
+                                for snippet in details["snippets"]:
+                                    st.markdown(f"> {highlight_snippet(snippet)}")
+                else:
+                    st.error("Analysis returned no results. Please check the uploaded file content.")
         except Exception as e:
             log_error(f"[Analyzer] File upload error: {str(e)}")
             st.error("Unexpected error during file upload or analysis.")
 
+# ---------- Comparison ----------
+elif section == "Comparison":
+    st.subheader("Competitor Similarity and Clustering")
+    source = st.radio("Competitors to compare:", ["Indexed documents", "Upload files"], horizontal=True)
+
+    documents = {}
+    try:
+        if source == "Indexed documents":
+            st.caption(f"Uses the token indexes saved by the Analyzer in `{INDEX_DIR}`.")
+            for path in iter_index_paths(INDEX_DIR):
+                index = load_token_index(path)
+                documents[index.identifier or os.path.basename(path)] = index
+        else:
+            uploaded_files = st.file_uploader(
+                "Upload one .txt file per competitor, or .zip archives of them",
+                type=["txt", "zip"],
+                accept_multiple_files=True
+            )
+            with tempfile.TemporaryDirectory(prefix="comparison_") as upload_dir:
+                for name, path in save_uploads(uploaded_files or [], upload_dir):
+                    for member, doc_source in expand_upload(path, name):
+                        documents[sanitize_filename(os.path.splitext(member)[0])] = read_document(doc_source)
+    except Exception as e:
+        log_error(f"[Comparison] Load error: {str(e)}")
+        st.error(f"Could not load documents: {e}")
+
+    if len(documents) < 2:
+        st.info("At least two competitors are needed for a comparison.")
+    else:
+        col1, col2 = st.columns(2)
+        n_neighbors = col1.number_input("Nearest neighbours per competitor", min_value=1, max_value=max(1, len(documents) - 1), value=min(3, len(documents) - 1))
+        n_clusters = col2.number_input("Clusters (0 = automatic)", min_value=0, max_value=len(documents), value=0)
+
+        if st.button("Compare"):
+            with st.spinner(f"Comparing {len(documents)} competitors..."):
+                try:
+                    comparison = compare_competitors(
+                        documents,
+                        config=get_config(),
+                        n_neighbors=int(n_neighbors),
+                        n_clusters=int(n_clusters) or None
+                    )
+                except Exception as e:
+                    log_error(f"[Comparison] Error: {str(e)}")
+                    st.error(f"Comparison failed: {e}")
+                    comparison = None
+
+            if comparison:
+                st.markdown("### Clusters")
+                st.dataframe(comparison["clusters"], use_container_width=True)
+                st.markdown("### Nearest Neighbours")
+                st.dataframe(comparison["neighbors"], use_container_width=True)
+                st.markdown("### Pairwise Similarity")
+                st.dataframe(comparison["similarity"].round(3), use_container_width=True)
+                st.download_button(
+                    "Download Similarity Matrix as CSV",
+                    data=comparison["similarity"].to_csv().encode("utf-8"),
+                    file_name="competitor_similarity.csv"
+                )
+                with st.expander("TF-IDF keyword profiles"):
+                    st.dataframe(comparison["profiles"].round(3), use_container_width=True)
+
 # ---------- Config Editor ----------
 elif section == "Config Editor":
     st.subheader("Keyword Buckets and Scoring Configuration")
 
-    config = load_config()
+    config = get_config()
     buckets = {k: v for k, v in config.items() if not k.startswith("_")}
 
     table_data = []
@@ -165,25 +337,50 @@ elif section == "Config Editor":
     updated_vars = {}
 
     for var, val in custom_vars.items():
-        updated_vars[var] = st.number_input(f"{var}", value=val, step=0.1)
+        updated_vars[var] = st.number_input(f"{var}", value=float(val), step=0.1)
 
     new_var_name = st.text_input("New Variable Name")
     new_var_val = st.number_input("New Variable Value", step=0.1)
     if new_var_name:
         updated_vars[new_var_name] = new_var_val
 
+    new_config = {}
+    for _, row in edited_df.iterrows():
+        bucket = row["Bucket"]
+        keywords = [k.strip() for k in (row["Keywords"] or "").split(",") if k.strip()]
+        weight = row["Weight"]
+        new_config[bucket] = {"keywords": keywords, "weight": weight}
+
+    new_config["_formula"] = formula_input
+    new_config["_custom_variables"] = updated_vars
+
     if st.button("Save Configuration"):
-        new_config = {}
-        for _, row in edited_df.iterrows():
-            bucket = row["Bucket"]
-            keywords = [k.strip() for k in row["Keywords"].split(",") if k.strip()]
-            weight = row["Weight"]
-            new_config[bucket] = {"keywords": keywords, "weight": weight}
-
-        new_config["_formula"] = formula_input
-        new_config["_custom_variables"] = updated_vars
         save_config(new_config)
         st.success("Configuration saved successfully.")
 
+    st.markdown("### Re-score Indexed Documents")
+    st.caption(f"Applies the configuration above to every document analyzed so far, using the token indexes in `{INDEX_DIR}`.")
+    if st.button("Preview Scores"):
+        with st.spinner("Re-scoring..."):
+            try:
+                rescored = rescore_indexes(INDEX_DIR, config=new_config)
+            except Exception as e:
+                log_error(f"[Config Editor] Re-score error: {str(e)}")
+                st.error(f"Re-scoring failed: {e}")
+                rescored = []
+        if rescored:
+            unresolved = sorted({kw for result in rescored for kw in result.get("unresolved_keywords", [])})
+            if unresolved:
+                st.warning(
+                    "These keywords cannot be counted from the stored indexes and score 0 in this preview: "
+                    + ", ".join(f"`{kw}`" for kw in unresolved)
+                    + ". Re-analyze the documents in the Analyzer section for exact scores."
+                )
+            df = pd.DataFrame(results_to_rows(rescored))
+            st.dataframe(df, use_container_width=True)
+            st.download_button("Download Re-scored Results as CSV", data=df.to_csv(index=False).encode("utf-8"), file_name="rescored_results.csv")
+        else:
+            st.info("No indexed documents yet. Analyze files in the Analyzer section first.")
+
 st.markdown("---")
 st.caption("Competitor_Analyzer_Anushka © 2025")
@@ -0,0 +1,198 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from extractor.crawl.core import crawl_website
+from analyzer.analyze import IncrementalAnalysis
+from analyzer.utils.crawl_store import CrawlStore, STORE_FILENAME
+
+logger = logging.getLogger(__name__)
+
+JOBS_DIR = os.path.join("output", "jobs")
+PROGRESS_INTERVAL_S = 2  # how often a running job's status file gets its running totals
+
+QUEUED, RUNNING, DONE, FAILED, INTERRUPTED = "queued", "running", "done", "failed", "interrupted"
+
+
+def normalize_job_url(url):
+    return url.strip()
+
+
+def job_key(url, params):
+    """Deterministic job ID for a (normalized) URL + crawl parameters, so identical requests share one job."""
+    payload = json.dumps({"url": url, "params": params}, sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class CrawlJobRunner:
+    """
+    Runs crawls in background threads and persists their status as JSON files.
+    - Jobs are keyed by URL + parameters; resubmitting a queued, running or finished job returns the existing ID.
+    - A crawl that extracts no pages is marked failed, so it can be retried instead of being reused.
+    - Extracted pages go to the crawl store under the job's run ID. Each page's score is
+      appended to <job_id>.pages.jsonl as it arrives (see page_scores); the status file
+      gets the running totals every PROGRESS_INTERVAL_S.
+    - Jobs left running by a previous process are reported as interrupted.
+    """
+
+    def __init__(self, jobs_dir=JOBS_DIR, max_concurrent=2):
+        self.jobs_dir = jobs_dir
+        self.store_path = os.path.join(jobs_dir, STORE_FILENAME)
+        os.makedirs(jobs_dir, exist_ok=True)
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix="crawl-job")
+        self.lock = threading.Lock()
+        self.active = set()
+
+    def _job_path(self, job_id):
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+
+    def _pages_path(self, job_id):
+        return os.path.join(self.jobs_dir, f"{job_id}.pages.jsonl")
+
+    def _write(self, job):
+        path = self._job_path(job["job_id"])
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(job, f, indent=2)
+        os.replace(tmp, path)
+
+    def _update(self, job_id, **fields):
+        with self.lock:
+            job = self._read(job_id) or {"job_id": job_id}
+            job.update(fields)
+            self._write(job)
+            return job
+
+    def _read(self, job_id):
+        try:
+            with open(self._job_path(job_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    # ---------- Public API ----------
+    def submit(self, url, force=False, **params):
+        """Queues a crawl and returns its job ID. Reuses an existing job unless it failed, found no pages, or force=True."""
+        url = normalize_job_url(url)
+        job_id = job_key(url, params)
+        with self.lock:
+            job = self._read(job_id)
+            if job and not force:
+                if (job["status"] == DONE and job.get("pages")) or job_id in self.active:
+                    return job_id
+            self.active.add(job_id)
+            self._write({
+                "job_id": job_id,
+                "url": url,
+                "params": params,
+                "status": QUEUED,
+                "submitted_at": time.time(),
+                "run_id": f"{job_id}-{int(time.time())}",
+            })
+        self.executor.submit(self._run, job_id)
+        logger.info(f"[JOB_SUBMIT] {job_id}: {url}")
+        return job_id
+
+    def status(self, job_id):
+        job = self._read(job_id)
+        if job and job["status"] in (QUEUED, RUNNING) and job_id not in self.active:
+            # Left behind by a process that exited before the crawl finished
+            job = self._update(job_id, status=INTERRUPTED)
+        return job
+
+    def list_jobs(self, limit=20):
+        jobs = []
+        for name in os.listdir(self.jobs_dir):
+            if name.endswith(".json"):
+                job = self.status(name[:-len(".json")])
+                if job:
+                    jobs.append(job)
+        jobs.sort(key=lambda j: j.get("submitted_at", 0), reverse=True)
+        return jobs[:limit]
+
+    def page_scores(self, job_id):
+        """Per-page scores of a job's latest run, in arrival order."""
+        try:
+            with open(self._pages_path(job_id), "r", encoding="utf-8") as f:
+                return [json.loads(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            return []
+
+    def result(self, job_id):
+        """Returns the {url: text} map of a finished job, read back from the crawl store."""
+        job = self._read(job_id)
+        if not job or job["status"] != DONE:
+            return {}
+        with CrawlStore(self.store_path) as store:
+            return store.load_run(job["run_id"])
+
+    # ---------- Worker ----------
+    def _run(self, job_id):
+        job = self._update(job_id, status=RUNNING, started_at=time.time(), pages_scored=0, partial=None)
+        analysis = IncrementalAnalysis(job["url"])
+        progress = {"pages": 0, "published": 0.0}
+        # Rows of an earlier run of this job are replaced
+        pages_file = open(self._pages_path(job_id), "w", encoding="utf-8")
+
+        def publish():
+            partial = analysis.result()
+            self._update(job_id, pages_scored=progress["pages"],
+                         partial={"score": partial["score"], "buckets": partial["buckets"]})
+            progress["published"] = time.time()
+
+        def on_page(url, text):
+            # Score each page as it arrives; polling clients read the rows and the running totals
+            if not text.strip():
+                return
+            page = analysis.add(url, text)
+            pages_file.write(json.dumps({
+                "url": url,
+                "characters": len(text),
+                "score": page["score"],
+                "buckets": page["buckets"],
+            }) + "\n")
+            pages_file.flush()
+            progress["pages"] += 1
+            if time.time() - progress["published"] >= PROGRESS_INTERVAL_S:
+                publish()
+
+        try:
+            results = crawl_website(
+                base_url=job["url"],
+                output_dir=self.jobs_dir,
+                store_path=self.store_path,
+                run_id=job["run_id"],
+                save_text=True,
+                show_progress=False,
+                on_page=on_page,
+                **job["params"]
+            )
+            pages_file.close()
+            if progress["pages"]:
+                publish()
+            if not results:
+                # crawl_website logs and swallows its own errors; an empty crawl must stay retryable
+                self._update(job_id, status=FAILED, finished_at=time.time(), pages=0, error="no pages extracted")
+                logger.error(f"[JOB_FAIL] {job_id}: no pages extracted")
+                return
+            self._update(
+                job_id,
+                status=DONE,
+                finished_at=time.time(),
+                pages=len(results),
+                characters=sum(len(t) for t in results.values()),
+            )
+            logger.info(f"[JOB_DONE] {job_id}: {len(results)} pages")
+        except Exception as e:
+            logger.error(f"[JOB_FAIL] {job_id}: {e}")
+            traceback.print_exc()
+            self._update(job_id, status=FAILED, finished_at=time.time(), error=str(e))
+        finally:
+            pages_file.close()
+            with self.lock:
+                self.active.discard(job_id)
@@ -0,0 +1,309 @@
+"""
+Headless batch runner: crawl and analyze a list of competitors.
+
+    python -m interface.run_all competitors.csv --output-dir output/sweep --concurrency 2
+    python -m interface.run_all competitors.json --max-pages 40 --proxy http://10.0.0.5:3128
+
+The competitor list is a CSV with a "url" column (and optionally "name"), or a
+JSON list of URLs, of {"name": ..., "url": ...} objects, or a {name: url} map.
+
+Progress is checkpointed per domain under <output-dir>/checkpoints. Running the
+same command again after an interruption skips finished domains, re-analyzes
+domains whose crawl was already stored, and re-crawls the rest; their link
+discovery resumes from its frontier file next to the checkpoint.
+"""
+import os
+import sys
+import csv
+import json
+import time
+import logging
+import argparse
+import threading
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Ensure the root project directory is in sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from analyzer.analyze import IncrementalAnalysis
+from analyzer.batch import results_to_rows
+from analyzer.utils.helpers import sanitize_filename
+from analyzer.utils.crawl_store import CrawlStore, STORE_FILENAME
+
+logger = logging.getLogger(__name__)
+
+PENDING, CRAWLING, DONE, FAILED = "pending", "crawling", "done", "failed"
+
+
+def domain_key(url):
+    netloc = urlparse(url if "://" in url else f"https://{url}").netloc.lower()
+    return netloc[4:] if netloc.startswith("www.") else netloc
+
+
+def load_competitors(path):
+    """Reads a competitor list; returns [{"name", "url", "domain"}], de-duplicated by domain."""
+    with open(path, "r", encoding="utf-8-sig") as f:
+        if path.lower().endswith(".json"):
+            data = json.load(f)
+            if isinstance(data, dict):
+                entries = [{"name": name, "url": url} for name, url in data.items()]
+            else:
+                entries = [{"url": item} if isinstance(item, str) else dict(item) for item in data]
+        else:
+            entries = [{k.strip().lower(): (v or "").strip() for k, v in row.items() if k} for row in csv.DictReader(f)]
+
+    competitors = {}
+    for entry in entries:
+        url = (entry.get("url") or entry.get("website") or "").strip()
+        if not url:
+            continue
+        if "://" not in url:
+            url = f"https://{url}"
+        domain = domain_key(url)
+        competitors.setdefault(domain, {"name": entry.get("name") or domain, "url": url, "domain": domain})
+    return list(competitors.values())
+
+
+class SweepCheckpoint:
+    """One JSON file per domain, rewritten atomically at every state change."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, domain):
+        return os.path.join(self.directory, sanitize_filename(domain) + ".json")
+
+    def frontier_path(self, domain):
+        """Link discovery state of the domain's crawl (see CrawlFrontier), kept for resuming it."""
+        return os.path.join(self.directory, sanitize_filename(domain) + ".frontier.sqlite")
+
+    def clear_frontier(self, domain):
+        path = self.frontier_path(domain)
+        for name in (path, path + "-wal", path + "-shm"):
+            try:
+                os.remove(name)
+            except FileNotFoundError:
+                pass
+
+    def load(self, domain):
+        try:
+            with open(self._path(domain), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def update(self, domain, **fields):
+        with self.lock:
+            state = self.load(domain) or {"domain": domain}
+            state.update(fields, updated_at=time.time())
+            path = self._path(domain)
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(state, f, indent=2)
+            os.replace(path + ".tmp", path)
+            return state
+
+
+def _analyze_stored_run(competitor, store_path, run_id):
+    """Scores a crawl that was stored before the runner was interrupted; None if nothing was stored."""
+    with CrawlStore(store_path) as store:
+        pages = store.load_run(run_id)
+    if not pages:
+        return None
+    analysis = IncrementalAnalysis(competitor["url"])
+    for url, text in pages.items():
+        if text.strip():
+            analysis.add(url, text)
+    return analysis.result(), len(pages), sum(len(t) for t in pages.values())
+
+
+def run_competitor(competitor, checkpoint, output_dir, crawl_params, stop_event=None):
+    """
+    Crawls and analyzes one competitor, checkpointing each step. Returns its final checkpoint.
+    A crawl stopped through stop_event stores nothing and stays CRAWLING, so a rerun crawls it again.
+    """
+    from extractor.crawl.core import crawl_website
+    from extractor.crawl.worker_manager import StopRequested
+
+    domain = competitor["domain"]
+    store_path = os.path.join(output_dir, STORE_FILENAME)
+    state = checkpoint.load(domain) or {}
+
+    # A crawl that reached the store before the interruption only needs scoring (pages are
+    # stored when the crawl finishes, so a CRAWLING checkpoint either has all of them or none)
+    if state.get("status") == CRAWLING and state.get("run_id"):
+        stored = _analyze_stored_run(competitor, store_path, state["run_id"])
+        if stored:
+            logger.info(f"[SWEEP] {domain}: crawl already stored, analyzed run {state['run_id']}")
+            result, pages, characters = stored
+            return checkpoint.update(domain, status=DONE, result=result, pages=pages,
+                                     characters=characters, finished_at=time.time())
+
+    if state.get("status") == DONE:
+        # Forced rerun of a finished domain: discover its links afresh
+        checkpoint.clear_frontier(domain)
+    run_id = f"{sanitize_filename(domain)}-{int(time.time())}"
+    attempts = state.get("attempts", 0) + 1
+    checkpoint.update(domain, name=competitor["name"], url=competitor["url"], status=CRAWLING,
+                      run_id=run_id, attempts=attempts, started_at=time.time(), error=None)
+    analysis = IncrementalAnalysis(competitor["url"])
+
+    def on_page(url, text):
+        if text.strip():
+            analysis.add(url, text)
+
+    try:
+        pages = crawl_website(
+            base_url=competitor["url"],
+            output_dir=output_dir,
+            store_path=store_path,
+            run_id=run_id,
+            save_text=True,
+            show_progress=False,
+            on_page=on_page,
+            frontier_path=checkpoint.frontier_path(domain),
+            stop_event=stop_event,
+            **crawl_params
+        )
+    except StopRequested:
+        logger.warning(f"[SWEEP] {domain}: crawl stopped")
+        return checkpoint.load(domain)
+    except Exception as e:
+        logger.error(f"[SWEEP_FAIL] {domain}: {e}")
+        return checkpoint.update(domain, status=FAILED, error=str(e), finished_at=time.time())
+
+    if not pages:
+        return checkpoint.update(domain, status=FAILED, error="no pages extracted", finished_at=time.time())
+
+    return checkpoint.update(domain, status=DONE, result=analysis.result(), pages=len(pages),
+                             characters=sum(len(t) for t in pages.values()), finished_at=time.time())
+
+
+def run_all(competitors, output_dir, crawl_params=None, concurrency=2, force=False):
+    """
+    Runs every competitor not finished in a previous run; returns all final checkpoints.
+    Concurrent crawls share the machine's free memory: each browser pool sizes itself
+    from its share, so the total follows available RAM, not concurrency x RAM.
+    """
+    checkpoint = SweepCheckpoint(os.path.join(output_dir, "checkpoints"))
+    states = {}
+    todo = []
+    for competitor in competitors:
+        state = checkpoint.load(competitor["domain"])
+        if state and state.get("status") == DONE and not force:
+            states[competitor["domain"]] = state
+        else:
+            todo.append(competitor)
+    logger.info(f"[SWEEP] {len(competitors)} competitors: {len(states)} already done, {len(todo)} to run")
+
+    executor = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="sweep")
+    stop_event = threading.Event()
+    try:
+        futures = {executor.submit(run_competitor, c, checkpoint, output_dir, crawl_params or {}, stop_event): c
+                   for c in todo}
+        for future in as_completed(futures):
+            competitor = futures[future]
+            try:
+                state = future.result()
+            except Exception as e:
+                logger.error(f"[SWEEP_FAIL] {competitor['domain']}: {e}")
+                state = checkpoint.update(competitor["domain"], status=FAILED, error=str(e))
+            states[competitor["domain"]] = state
+            done = sum(1 for s in states.values() if s.get("status") == DONE)
+            logger.info(f"[SWEEP] {competitor['domain']}: {state.get('status')} ({done}/{len(competitors)} done)")
+    except KeyboardInterrupt:
+        # Running crawls stop their browser workers at the next check (a few seconds, plus
+        # their cleanup grace); queued competitors never start
+        logger.warning("[SWEEP] Interrupted; stopping running crawls. Finished domains are checkpointed, rerun to resume")
+        stop_event.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+        raise
+    executor.shutdown()
+    return [states.get(c["domain"]) or checkpoint.load(c["domain"]) or {"domain": c["domain"], "status": PENDING}
+            for c in competitors]
+
+
+def write_outputs(states, output_dir):
+    """Writes results.json and results.csv; returns their paths."""
+    json_path = os.path.join(output_dir, "results.json")
+    csv_path = os.path.join(output_dir, "results.csv")
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(states, f, indent=2)
+
+    rows = []
+    for state in states:
+        result = state.get("result") or {"identifier": state.get("url"), "score": None, "buckets": {}}
+        row = results_to_rows([result])[0]
+        rows.append(dict({"name": state.get("name"), "domain": state["domain"], "status": state.get("status"),
+                          "pages": state.get("pages", 0)}, **row))
+    columns = list(dict.fromkeys(key for row in rows for key in row))
+    with open(csv_path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+    return json_path, csv_path
+
+
+def format_summary(states):
+    ranked = sorted(states, key=lambda s: ((s.get("result") or {}).get("score") is None,
+                                           -((s.get("result") or {}).get("score") or 0)))
+    lines = [f"{'#':>3}  {'competitor':<30}{'status':<9}{'pages':>6}{'score':>10}"]
+    for i, state in enumerate(ranked, start=1):
+        score = (state.get("result") or {}).get("score")
+        score_str = f"{score:10.2f}" if isinstance(score, (int, float)) else f"{'-':>10}"
+        lines.append(f"{i:>3}  {(state.get('name') or state['domain'])[:29]:<30}{state.get('status', ''):<9}"
+                     f"{state.get('pages', 0):>6}{score_str}")
+    failed = [s for s in states if s.get("status") == FAILED]
+    if failed:
+        lines.append("")
+        lines += [f"failed: {s['domain']}: {s.get('error')}" for s in failed]
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Crawl and analyze a list of competitors")
+    parser.add_argument("competitors", help="CSV (url[,name]) or JSON competitor list")
+    parser.add_argument("--output-dir", default=os.path.join("output", "sweep"))
+    parser.add_argument("--concurrency", type=int, default=2, help="competitors crawled at once")
+    parser.add_argument("--max-pages", type=int, default=20)
+    parser.add_argument("--max-processes", type=int, default=None, help="upper bound on browsers per crawl")
+    parser.add_argument("--tabs", type=int, default=1, help="pages rendered at once in each browser")
+    parser.add_argument("--min-content-length", type=int, default=400)
+    parser.add_argument("--lang", default="en")
+    parser.add_argument("--proxy", action="append", default=None, help="proxy URL; repeat for a pool")
+    parser.add_argument("--respect-robots", action="store_true")
+    parser.add_argument("--force", action="store_true", help="ignore checkpoints and run every competitor again")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    competitors = load_competitors(args.competitors)
+    if not competitors:
+        print(f"No competitor URLs found in {args.competitors}", file=sys.stderr)
+        return 1
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    crawl_params = {
+        "max_pages": args.max_pages,
+        "max_processes": args.max_processes,
+        "tabs_per_browser": args.tabs,
+        "min_content_length": args.min_content_length,
+        "lang": args.lang,
+        "proxy_list": args.proxy,
+        "respect_robots": args.respect_robots,
+    }
+    started = time.time()
+    try:
+        states = run_all(competitors, args.output_dir, crawl_params, args.concurrency, args.force)
+    except KeyboardInterrupt:
+        return 130
+    json_path, csv_path = write_outputs(states, args.output_dir)
+
+    print(format_summary(states))
+    print(f"\n[SWEEP] {time.time() - started:.0f}s | results: {json_path}, {csv_path}")
+    return 0 if all(s.get("status") == DONE for s in states) else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,10 @@
 # test_run.py
 import os
+import logging
 from extractor.crawl.core import crawl_website
-from analyzer.analyze import analyze_text
+from analyzer.analyze import analyze_text, IncrementalAnalysis
+
+logging.basicConfig(level=logging.INFO)
 
 # === PARAMETERS ===
 url = "https://www.kpoint.com"  # Replace with a real URL
@@ -9,13 +12,22 @@ output_folder = "test_output"
 
 # === Step 1: Crawl the Website ===
 print("\n[STEP 1] Crawling website...\n")
+live = IncrementalAnalysis(url)
+
+def print_page_score(page_url, text):
+    if not text.strip():
+        return
+    page = live.add(page_url, text)
+    print(f"[PAGE] {page_url}: score={page['score']} | running total={live.result()['score']}")
+
 extracted = crawl_website(
     base_url=url,
     output_dir=output_folder,
     max_pages=5,
     save_text=True,
     show_progress=True,
-    save_screenshot_on_fail=True
+    save_screenshot_on_fail=True,
+    on_page=print_page_score
 )
 
 # Save merged text for analysis